@@ -0,0 +1,13 @@
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+
+def use_testing_app() -> None:
+    """Make the testing app importable, as pytest does via pyproject.toml"""
+    for path in ("tests", os.path.join("tests", "testing_app")):
+        path = os.path.join(REPO_DIR, path)
+        if path not in sys.path:
+            sys.path.insert(0, path)
@@ -0,0 +1,47 @@
+"""Measure the memory retained by the ModelManager's AppModel metadata for a large
+synthetic schema, i.e. what every worker process holds after setup.
+
+    python -m benchmarks.bench_app_model_memory [n_models]
+
+Pydantic return models are not built (lazy setup), so only the AppModel
+structures, hierarchy index and reflection caches are counted.
+"""
+
+import gc
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.synthetic_schema import write_synthetic_app
+
+
+def main(n_models: int = 1000):
+    with tempfile.TemporaryDirectory() as directory:
+        settings = write_synthetic_app(directory, n_models)
+
+        from pros_core.setup_utils import import_models, import_traits
+        from pros_core.setup_utils.model_manager import (
+            ModelManager,
+            setup_model_manager,
+        )
+
+        models = import_models(settings)
+        traits = import_traits(settings)
+
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        setup_model_manager(models, traits, lazy=True)
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    retained = after - before
+    print(f"models:             {len(ModelManager.models)}")
+    print(f"retained:           {retained / 1024:.0f} KiB")
+    print(f"retained per model: {retained / len(ModelManager.models):.0f} B")
+    print(f"peak during setup:  {(peak - before) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
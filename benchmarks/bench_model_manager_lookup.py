@@ -0,0 +1,49 @@
+"""Compare the cost of ModelManager.get_model via the alias table against
+normalizing the identifier on every lookup (the previous behaviour).
+
+    python -m benchmarks.bench_model_manager_lookup
+"""
+
+import timeit
+
+from benchmarks import use_testing_app
+
+LOOKUPS = 200_000
+
+
+def main():
+    use_testing_app()
+
+    from pros_core.setup_utils import import_models, import_traits
+    from pros_core.setup_utils.model_manager import ModelManager, setup_model_manager
+    from test_app.models import NonOwnableBook
+    from testing_app.app.core.config import settings
+
+    setup_model_manager(import_models(settings), import_traits(settings), lazy=True)
+
+    identifiers = [
+        NonOwnableBook,
+        "NonOwnableBook",
+        "nonownablebook",
+        "non_ownable_book",
+        "TestApp.NonOwnableBook",
+        "test_app.non_ownable_book",
+    ]
+
+    print(f"{'identifier':<30}{'normalized (ns)':>18}{'alias table (ns)':>18}")
+    for identifier in identifiers:
+        before = timeit.timeit(
+            lambda: ModelManager.get_model_by_normalized_identifier(identifier),
+            number=LOOKUPS,
+        )
+        after = timeit.timeit(
+            lambda: ModelManager.get_model(identifier), number=LOOKUPS
+        )
+        print(
+            f"{str(getattr(identifier, '__name__', identifier)):<30}"
+            f"{before / LOOKUPS * 1e9:>18.0f}{after / LOOKUPS * 1e9:>18.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Measure per-worker memory of a pre-forking deployment, with and without
+building the schema in the master process before fork (PRELOAD_FOR_FORK).
+
+    python -m benchmarks.bench_preload_memory [--models N] [--workers W]
+
+Each mode runs in a fresh interpreter, which forks W workers. Without preloading,
+each worker runs setup_app itself; with preloading, the master runs setup_app
+with PRELOAD_FOR_FORK = True and the workers only inherit the result. For
+comparison, preload-without-freeze builds everything in the master but doesn't
+freeze it out of the GC. Every worker
+then does some work (touching every AppModel and running the GC, as a worker
+serving requests would) before its memory is read from /proc/<pid>/smaps_rollup.
+USS (unique set size) is the memory that would be freed if that worker exited,
+i.e. its real per-worker cost. Linux only.
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+from benchmarks.synthetic_schema import write_synthetic_app
+
+MODES = ("per-worker", "preload-without-freeze", "preload")
+SYNTHETIC_APP_NAME = "synthetic_app"
+
+
+def read_memory(pid: int) -> dict[str, int]:
+    """Rss, Pss and Uss of a process, in KiB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def build_app(settings):
+    from fastapi import FastAPI
+    from pros_core.setup_app import setup_app
+
+    return setup_app(FastAPI(), settings)
+
+
+def do_work(_app) -> None:
+    from pros_core.setup_utils import ModelManager
+
+    _app.openapi()
+    for app_model in ModelManager.models:
+        app_model.pydantic_return_model.__fields__
+        app_model.subclasses
+        app_model.relationships
+    for _ in range(3):
+        gc.collect()
+
+
+def run_mode(mode: str, directory: str, n_workers: int) -> None:
+    sys.path.insert(0, directory)
+    settings = SimpleNamespace(
+        INSTALLED_APPS=[SYNTHETIC_APP_NAME], PRELOAD_FOR_FORK=mode == "preload"
+    )
+
+    _app = None
+    if mode == "preload":
+        _app = build_app(settings)
+    elif mode == "preload-without-freeze":
+        _app = build_app(settings)
+        do_work(_app)
+
+    pids = []
+    ready_r, ready_w = os.pipe()
+    for _ in range(n_workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            worker_app = _app if _app is not None else build_app(settings)
+            do_work(worker_app)
+            os.write(ready_w, b".")
+            signal.pause()
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_w)
+
+    # Measure once every worker is up, so shared pages are shared between all of them
+    for _ in pids:
+        os.read(ready_r, 1)
+    workers = [read_memory(pid) for pid in pids]
+    master = read_memory(os.getpid())
+
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    print(json.dumps({"mode": mode, "master": master, "workers": workers}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.dir, args.workers)
+        return
+
+    print(f"{args.models} models, {args.workers} workers (KiB per worker)")
+    print(f"{'mode':<24}{'rss':>10}{'pss':>10}{'uss':>10}{'total pss':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic_app(directory, args.models, app_name=SYNTHETIC_APP_NAME)
+        for mode in MODES:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_preload_memory",
+                    "--mode",
+                    mode,
+                    "--dir",
+                    directory,
+                    "--workers",
+                    str(args.workers),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            workers = result["workers"]
+
+            def mean(key):
+                return sum(worker[key] for worker in workers) // len(workers)
+
+            total_pss = result["master"]["pss"] + sum(w["pss"] for w in workers)
+            print(
+                f"{mode:<24}{mean('rss'):>10}{mean('pss'):>10}{mean('uss'):>10}"
+                f"{total_pss:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
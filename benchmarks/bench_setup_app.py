@@ -0,0 +1,196 @@
+"""Time each phase of setup_app over synthetic schemas of increasing size.
+
+    python -m benchmarks.bench_setup_app [--sizes 10 100 1000] [--compare RESULTS]
+
+Each size runs in a fresh interpreter (neomodel classes can only be defined once
+per process). Results are written to benchmarks/results/ as JSON, along with the
+commit they were measured at; pass an earlier results file to --compare to see
+the change in each phase.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from benchmarks import BENCHMARKS_DIR, REPO_DIR
+from benchmarks.synthetic_schema import write_synthetic_app
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+PHASES = ("import", "model_manager", "pydantic", "query_templates", "routes", "openapi")
+
+
+def time_phases(n_models: int, options: dict) -> dict:
+    """Run the phases of setup_app over a synthetic schema, returning the wall
+    time of each in seconds"""
+
+    from fastapi import FastAPI
+    from pros_core.auth import build_auth
+    from pros_core.db import warm_up_query_templates
+    from pros_core.setup_utils import (
+        ModelManager,
+        build_routes,
+        import_models,
+        import_routers,
+        import_traits,
+        setup_model_manager,
+        warm_up_pydantic_return_models,
+    )
+
+    timings = {}
+
+    @contextmanager
+    def phase(name):
+        start = time.perf_counter()
+        yield
+        timings[name] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings = write_synthetic_app(directory, n_models, **options)
+        _app = FastAPI()
+
+        with phase("import"):
+            import_routers(_app, settings)
+            models = import_models(settings)
+            traits = import_traits(settings)
+        with phase("model_manager"):
+            setup_model_manager(models, traits, lazy=True)
+        with phase("pydantic"):
+            warm_up_pydantic_return_models(ModelManager)
+        with phase("query_templates"):
+            warm_up_query_templates(ModelManager)
+        with phase("routes"):
+            build_routes(_app, models, ModelManager)
+            build_auth(_app)
+        with phase("openapi"):
+            _app.openapi()
+
+    return {
+        "n_models": n_models,
+        "n_app_models": len(ModelManager.models),
+        "phases": timings,
+        "total": sum(timings.values()),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: list[dict], baseline: dict | None = None) -> None:
+    baseline_by_size = {
+        result["n_models"]: result for result in (baseline or {}).get("results", [])
+    }
+    print(f"{'models':>8}" + "".join(f"{p:>16}" for p in (*PHASES, "total")))
+    for result in results:
+        previous = baseline_by_size.get(result["n_models"])
+        cells = []
+        for p in (*PHASES, "total"):
+            seconds = result["total"] if p == "total" else result["phases"][p]
+            cell = f"{seconds:.3f}"
+            if previous is not None:
+                # Results from before a phase was added have no time for it
+                before = (
+                    previous["total"] if p == "total" else previous["phases"].get(p)
+                )
+                if before:
+                    cell += f" ({seconds / before - 1:+.0%})"
+            cells.append(f"{cell:>16}")
+        print(f"{result['n_models']:>8}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--traits", type=int, default=2)
+    parser.add_argument("--reifications", type=int, default=2)
+    parser.add_argument("--relations-per-model", type=int, default=1)
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--output", help="where to write results")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    options = {
+        "depth": args.depth,
+        "n_traits": args.traits,
+        "n_reifications": args.reifications,
+        "relations_per_model": args.relations_per_model,
+    }
+
+    if args.run is not None:
+        print(json.dumps(time_phases(args.run, options)))
+        return
+
+    results = []
+    for n_models in args.sizes:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_setup_app",
+                "--run",
+                str(n_models),
+                "--depth",
+                str(args.depth),
+                "--traits",
+                str(args.traits),
+                "--reifications",
+                str(args.reifications),
+                "--relations-per-model",
+                str(args.relations_per_model),
+            ],
+            cwd=REPO_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    now = datetime.datetime.now()
+    commit = git_commit()
+    output_path = args.output or os.path.join(
+        RESULTS_DIR, f"setup_app-{now:%Y%m%d-%H%M%S}-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(
+            {
+                "benchmark": "setup_app",
+                "commit": commit,
+                "timestamp": now.isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "options": options,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Load synthetic nodes of the models in the ModelManager into Neo4j, for benchmarks
+that need a database.
+
+Nodes are created as a model's nodes would be (with the inherited labels of their
+class, a uid, and real_type set to the class name), with labels made of random
+personal names, so that they are shaped like the names in a prosopography.
+Every node also has the BENCHMARK_LABEL, so they can be removed afterwards.
+"""
+
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Iterator
+
+from pros_core.db.projection import cypher_name
+
+BENCHMARK_LABEL = "ProsBenchmarkData"
+
+QueryRunner = Callable[[str, dict[str, Any]], list[dict[str, Any]]]
+
+SYLLABLES = (
+    "al an ar be bert da de el en fried ga gun hard hein helm her il in jo ka "
+    "kon la li ma mar mund na ne ni o ra rich ri ro ru sa sieg ta te the ul "
+    "wal win wolf ze"
+).split()
+
+
+def random_name(rng: random.Random) -> str:
+    def word():
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+    return " ".join(word().capitalize() for _ in range(rng.randint(1, 3)))
+
+
+def random_nodes(
+    classes: list[type], n_nodes: int, rng: random.Random, unlabelled: float = 0.0
+) -> Iterator[tuple[type, dict[str, Any]]]:
+    """(class, properties) of n_nodes nodes of random classes. A proportion
+    `unlabelled` have no label."""
+    for _ in range(n_nodes):
+        cls = rng.choice(classes)
+        yield cls, {
+            "uid": uuid.uuid4().hex,
+            "real_type": cls.__name__,
+            "label": None if rng.random() < unlabelled else random_name(rng),
+            "is_deleted": False,
+        }
+
+
+def load_synthetic_nodes(
+    run: QueryRunner,
+    classes: list[type],
+    n_nodes: int,
+    batch_size: int = 10_000,
+    seed: int = 0,
+    unlabelled: float = 0.0,
+) -> float:
+    """Create n_nodes nodes of the given (concrete) classes, in batches; returns
+    the time taken in seconds"""
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    batches: dict[type, list[dict[str, Any]]] = defaultdict(list)
+
+    def flush(cls):
+        labels = ":".join(
+            cypher_name(label) for label in [*cls.inherited_labels(), BENCHMARK_LABEL]
+        )
+        run(
+            f"UNWIND $rows AS row CREATE (n:{labels}) SET n = row",
+            {"rows": batches[cls]},
+        )
+        batches[cls] = []
+
+    for cls, properties in random_nodes(classes, n_nodes, rng, unlabelled):
+        batches[cls].append(properties)
+        if len(batches[cls]) >= batch_size:
+            flush(cls)
+    for cls in list(batches):
+        if batches[cls]:
+            flush(cls)
+    return time.perf_counter() - start
+
+
+def clear_synthetic_nodes(run: QueryRunner, batch_size: int = 10_000) -> None:
+    while True:
+        rows = run(
+            f"MATCH (n:{BENCHMARK_LABEL}) WITH n LIMIT $limit "
+            "DETACH DELETE n RETURN count(*) AS deleted",
+            {"limit": batch_size},
+        )
+        if not rows or rows[0]["deleted"] == 0:
+            return
+
+
+def percentile(timings: list[float], p: float) -> float:
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+def summarize(timings: list[float]) -> dict[str, float]:
+    """Mean, median and 95th percentile, in milliseconds"""
+    return {
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "p50_ms": 1000 * percentile(timings, 0.5),
+        "p95_ms": 1000 * percentile(timings, 0.95),
+    }
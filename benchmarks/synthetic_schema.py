@@ -0,0 +1,160 @@
+"""Generate installable pros apps with large synthetic schemas, for benchmarking setup.
+
+The generated models.py is shaped like a real schema: models form families of
+subclass hierarchies, each model has a few properties and relationships to models
+in other families (some with relation data, each producing a reverse relation on
+its target), and a proportion of models have traits, child nodes, inline
+createable relations and reifications.
+
+    python -m benchmarks.synthetic_schema 50 > models.py
+"""
+
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+FAMILY_SIZE = 10
+
+
+def generate_models_source(
+    n_models: int,
+    depth: int = 3,
+    n_traits: int = 2,
+    n_reifications: int = 2,
+    relations_per_model: int = 1,
+    trait_ratio: float = 0.2,
+    child_node_ratio: float = 0.1,
+    inline_createable_ratio: float = 0.1,
+    prefix: str = "Synthetic",
+    seed: int = 0,
+    family_size: int = FAMILY_SIZE,
+) -> str:
+    """Source of a models.py defining n_models node classes, plus n_traits traits,
+    n_reifications reifications and a child node.
+
+    Models are grouped into families of family_size, each a hierarchy of at most
+    depth levels below its root. Each model has relations_per_model relationships
+    to models in other families; the ratios are the proportions of models with a
+    trait, a child node, and an inline createable relation. Class names start with
+    prefix, as neomodel requires label sets to be unique within a process."""
+
+    rng = random.Random(seed)
+    models = [f"{prefix}Model{i}" for i in range(n_models)]
+    traits = [f"{prefix}Trait{i}" for i in range(n_traits)]
+    reifications = [f"{prefix}Reification{i}" for i in range(n_reifications)]
+
+    def other_family_model(i: int) -> str:
+        offset = rng.randrange(family_size, max(n_models, family_size + 1))
+        return models[(i + offset) % n_models]
+
+    lines = [
+        "from neomodel import IntegerProperty, StringProperty",
+        "from pros_core.models import (",
+        "    AbstractNode,",
+        "    AbstractReification,",
+        "    AbstractTrait,",
+        "    ChildNode,",
+        "    RelationshipBase,",
+        "    RelationshipTo,",
+        ")",
+        "",
+        "",
+        f"class {prefix}Date(ChildNode):",
+        "    date = StringProperty()",
+        "",
+        "",
+        f"class {prefix}Certainty(RelationshipBase):",
+        "    certainty = IntegerProperty()",
+        "",
+    ]
+
+    for i, trait in enumerate(traits):
+        lines += [
+            "",
+            f"class {trait}(AbstractTrait):",
+            f"    trait_property_{i} = StringProperty()",
+            f"    trait_relation_{i} = RelationshipTo("
+            f"'{rng.choice(models)}', 'trait_{i}_reverse')",
+            "",
+        ]
+
+    for i, reification in enumerate(reifications):
+        lines += [
+            "",
+            f"class {reification}(AbstractReification):",
+            f"    reification_property_{i} = StringProperty()",
+            f"    reifies_{i} = RelationshipTo("
+            f"'{rng.choice(models)}', 'is_reified_by_{i}')",
+            "",
+        ]
+
+    depths: list[int] = []
+    for i, model in enumerate(models):
+        family_start = i - i % family_size
+        parents = [j for j in range(family_start, i) if depths[j] < depth]
+        if i == family_start or not parents:
+            bases = ["AbstractNode"]
+            depths.append(0)
+        else:
+            parent = rng.choice(parents)
+            bases = [models[parent]]
+            depths.append(depths[parent] + 1)
+        if traits and rng.random() < trait_ratio:
+            bases.append(rng.choice(traits))
+
+        lines += [
+            "",
+            f"class {model}({', '.join(bases)}):",
+            f"    name_{i} = StringProperty()",
+            f"    count_{i} = IntegerProperty()",
+        ]
+        for r in range(relations_per_model):
+            relation_model = (
+                f", relationship_model={prefix}Certainty" if (i + r) % 3 == 0 else ""
+            )
+            lines.append(
+                f"    relates_to_{i}_{r} = RelationshipTo("
+                f"'{other_family_model(i)}', 'is_related_from_{i}_{r}'{relation_model})"
+            )
+        if rng.random() < child_node_ratio:
+            lines.append(f"    date_{i} = {prefix}Date.as_child_node()")
+        if i > 0 and rng.random() < inline_createable_ratio:
+            lines.append(
+                f"    creates_{i} = {models[rng.randrange(i)]}"
+                f".as_inline_createable('is_created_by_{i}')"
+            )
+        if reifications and i == family_start:
+            lines.append(
+                f"    reified_{i} = {rng.choice(reifications)}"
+                f".as_abstract_reification('is_reified_in_{i}')"
+            )
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def write_synthetic_app(
+    directory: str,
+    n_models: int,
+    app_name: str = "synthetic_app",
+    **options,
+) -> SimpleNamespace:
+    """Write a synthetic pros app into directory, make it importable, and return
+    settings with it as the only installed app. Options are passed on to
+    generate_models_source."""
+
+    app_dir = os.path.join(directory, app_name)
+    os.makedirs(app_dir, exist_ok=True)
+    with open(os.path.join(app_dir, "__init__.py"), "w"):
+        pass
+    with open(os.path.join(app_dir, "models.py"), "w") as f:
+        f.write(generate_models_source(n_models, **options))
+
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return SimpleNamespace(INSTALLED_APPS=[app_name])
+
+
+if __name__ == "__main__":
+    print(generate_models_source(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
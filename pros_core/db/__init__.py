@@ -0,0 +1,57 @@
+from .bulk_import import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_TRANSACTION_SIZE,
+    MAX_BATCH_SIZE,
+    MAX_TRANSACTION_SIZE,
+    BulkImportError,
+    ImportReport,
+    bulk_import,
+)
+from .executor import (
+    AsyncDriverQueryExecutor,
+    QueryExecutor,
+    QueryExecutorDependency,
+    ThreadpoolQueryExecutor,
+    get_query_executor,
+    set_query_executor,
+)
+from .label_index import LabelIndex, get_label_index, set_label_index
+from .pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    STREAM_BATCH_SIZE,
+    Cursor,
+    InvalidCursor,
+    fetch_page,
+    stream_batches,
+)
+from .projection import build_detail_query, compile_projection, fetch_node
+from .schema_sync import (
+    SchemaItem,
+    SchemaPlan,
+    build_required_schema,
+    plan_schema_sync,
+    sync_schema,
+)
+from .search import build_search_string, fetch_nodes_by_uid, search_nodes
+from .streaming_import import (
+    DEFAULT_CHUNK_SIZE,
+    ImportState,
+    StreamingImportError,
+    import_file,
+)
+from .sync_executor import (
+    SyncCallTimeout,
+    SyncExecutor,
+    SyncExecutorBusy,
+    SyncExecutorDependency,
+    SyncExecutorMetrics,
+    get_sync_executor,
+    set_sync_executor,
+    setup_sync_executor,
+)
+from .templates import (
+    QueryTemplateRegistry,
+    field_selection,
+    warm_up_query_templates,
+)
@@ -0,0 +1,671 @@
+"""Create many nodes at once, with their relations, child nodes and reifications.
+
+Items are validated against the create models of their classes, then written with
+a few UNWIND statements per class and relation, rather than a save() per node:
+first every node (merged on uid, so that importing the same items again updates
+them rather than duplicating them), then the relations between them (which may
+be to nodes already in the database), and the child nodes and reifications of
+each node (replacing any it had, in the same transaction). Each UNWIND statement
+writes up to batch_size rows, and each transaction up to transaction_size rows
+(the relations of an item are never split between transactions); a transaction
+that fails is rolled back and reported, and the import goes on with the next one.
+
+    python -m pros_core.db.bulk_import app.core.config:settings items.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+from camel_converter import to_camel
+from neomodel import RelationshipDefinition, StructuredRel
+from neomodel.exceptions import DeflateError
+from pros_core.db.executor import QueryExecutor, Statement
+from pros_core.db.label_index import get_label_index
+from pros_core.db.projection import cypher_name
+from pros_core.db.templates import QueryTemplateRegistry
+from pros_core.models import AbstractNode, BaseNode
+from pros_core.setup_utils.build_app_model_definitions import (
+    ModelManager,
+    ModelManagerClass,
+    ModelManagerException,
+    build_child_nodes,
+    build_properties,
+    build_related_reifications,
+    build_relationships,
+)
+from pros_core.setup_utils.build_pydantic_create_models import (
+    SERVER_SET_PROPERTIES,
+    build_pydantic_create_model,
+)
+from pros_core.setup_utils.build_pydantic_return_models import PydanticModelRegistry
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10_000
+DEFAULT_TRANSACTION_SIZE = 10_000
+MAX_TRANSACTION_SIZE = 100_000
+
+# Rows to write, by the template of the UNWIND statement that writes them
+RowGroups = dict[str, list[dict[str, Any]]]
+
+# Creation and modification properties, set only on nodes created, and only on
+# nodes already in the database, respectively
+CREATION_PROPERTIES = ("created_by", "created_when")
+MODIFICATION_PROPERTIES = ("modified_by", "modified_when")
+
+
+class BulkImportError(ValueError):
+    """Items failed validation; nothing was written"""
+
+    def __init__(self, errors: list[dict[str, Any]]):
+        super().__init__(f"{len(errors)} invalid items")
+        self.errors = errors
+
+
+@dataclass(slots=True)
+class BatchResult:
+    """The rows written by one transaction"""
+
+    phase: str  # "nodes", or "relations" (including child nodes and reifications)
+    rows: int
+    written: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ImportReport:
+    items: int = 0
+    batches: list[BatchResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def failures(self) -> list[BatchResult]:
+        return [batch for batch in self.batches if batch.error is not None]
+
+    @property
+    def rows_written(self) -> int:
+        return sum(batch.written for batch in self.batches)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_written / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "items": self.items,
+            "rowsWritten": self.rows_written,
+            "seconds": self.seconds,
+            "rowsPerSecond": self.rows_per_second,
+            "batches": [
+                {
+                    "phase": batch.phase,
+                    "rows": batch.rows,
+                    "written": batch.written,
+                    "seconds": batch.seconds,
+                    "error": batch.error,
+                }
+                for batch in self.batches
+            ],
+        }
+
+    def __str__(self) -> str:
+        lines = [
+            f"{self.items} items: {self.rows_written} rows written in "
+            f"{len(self.batches)} transactions, {self.seconds:.1f}s "
+            f"({self.rows_per_second:.0f} rows/s)"
+        ]
+        for number, batch in enumerate(self.batches):
+            if batch.error is not None:
+                lines.append(f"  {batch.phase} {number}: failed: {batch.error}")
+            elif batch.written < batch.rows:
+                # Relations to nodes that are in neither the import nor the database
+                lines.append(
+                    f"  {batch.phase} {number}: "
+                    f"{batch.rows - batch.written} of {batch.rows} rows not written"
+                )
+        return "\n".join(lines)
+
+
+class InvalidItem(ValueError):
+    def __init__(self, errors: list[dict[str, Any]]):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def validate_item(
+    item: dict[str, Any], model_manager: ModelManagerClass = ModelManager
+) -> BaseModel:
+    """Validate an item against the create model of the class named by its
+    realType"""
+
+    real_type = item.get("realType", item.get("real_type"))
+    try:
+        model_class = model_manager.get_model(real_type).model_class
+    except (ModelManagerException, KeyError, TypeError):
+        model_class = None
+    if (
+        model_class is None
+        or not issubclass(model_class, AbstractNode)
+        or not model_manager.is_concrete(model_class)
+    ):
+        raise InvalidItem(
+            [
+                {
+                    "loc": ("realType",),
+                    "msg": f"no model to create with realType {real_type!r}",
+                    "type": "value_error",
+                }
+            ]
+        )
+    try:
+        return build_pydantic_create_model(model_class).parse_obj(item)
+    except ValidationError as e:
+        raise InvalidItem(e.errors())
+
+
+def model_class_of(item: BaseModel) -> type[BaseNode]:
+    return PydanticModelRegistry.key_for(type(item))[1]
+
+
+def relation_model(
+    neomodel_class: type[BaseNode], relationship_name: str
+) -> type[StructuredRel]:
+    definition: RelationshipDefinition = dict(neomodel_class.__all_relationships__)[
+        relationship_name
+    ]
+    return definition.definition["model"]
+
+
+@functools.cache
+def relation_defaults(model: type[StructuredRel]) -> dict[str, Any]:
+    """Properties a relationship of this model is given when it is created (its
+    reverse_name, and the flags telling child nodes and the like apart)"""
+    return {
+        name: prop.deflate(prop.default_value())
+        for name, prop in model.defined_properties(aliases=False, rels=False).items()
+        if prop.has_default
+    }
+
+
+def deflate_properties(
+    neomodel_class: type[BaseNode], item: BaseModel
+) -> dict[str, Any]:
+    """The properties of a node, as neomodel would store them"""
+    properties = {}
+    for name, prop in build_properties(neomodel_class).items():
+        if name in SERVER_SET_PROPERTIES:
+            continue
+        value = getattr(item, name)
+        if value is None and prop.has_default:
+            value = prop.default_value()
+        properties[name] = None if value is None else prop.deflate(value)
+    return properties
+
+
+def server_set_properties(
+    neomodel_class: type[BaseNode], user: Optional[str], now: datetime.datetime
+) -> dict[str, Any]:
+    properties = build_properties(neomodel_class)
+    values = {
+        "real_type": neomodel_class.__name__,
+        "is_deleted": False,
+        "created_by": user,
+        "created_when": now,
+        "modified_by": user,
+        "modified_when": now,
+        "last_dependent_change": now,
+    }
+    return {
+        name: (
+            properties[name].deflate(value)
+            if isinstance(value, datetime.datetime)
+            else value
+        )
+        for name, value in values.items()
+        if name in properties
+    }
+
+
+def build_relation_rows(
+    neomodel_class: type[BaseNode], item: BaseModel
+) -> dict[str, list[dict[str, Any]]]:
+    """The uids of the nodes item is related to, and the properties of each
+    relationship, by relationship name"""
+    rows = {}
+    for name, relationship in build_relationships(neomodel_class).items():
+        defaults = relation_defaults(relationship.relation_model)
+        rows[name] = []
+        for related in getattr(item, name):
+            if isinstance(related, BaseModel):
+                data = {**defaults}
+                for prop_name, prop in relationship.relation_properties.items():
+                    value = getattr(related.relation_data, prop_name)
+                    data[prop_name] = None if value is None else prop.deflate(value)
+                rows[name].append({"to": related.uid.hex, "data": data})
+            else:
+                rows[name].append({"to": related.hex, "data": defaults})
+    return rows
+
+
+def build_node_template(neomodel_class: type[BaseNode]) -> str:
+    """Merge nodes of a class on uid, setting who created them and when only if
+    they are new, and who modified them and when only if they are not"""
+    label, *other_labels = neomodel_class.inherited_labels()
+    set_labels = "".join(f":{cypher_name(other)}" for other in other_labels)
+    return (
+        "UNWIND $rows AS row "
+        f"MERGE (n:{cypher_name(label)} {{uid: row.uid}}) "
+        "ON CREATE SET n += row.created "
+        "ON MATCH SET n += row.modified "
+        f"SET {f'n{set_labels}, ' if set_labels else ''}n += row.properties "
+        "RETURN count(DISTINCT n) AS written"
+    )
+
+
+def build_embedded_relation_labels(neomodel_class: type[BaseNode]) -> str:
+    return "|".join(
+        cypher_name(relationship.relation_label)
+        for relationship in [
+            *build_child_nodes(neomodel_class).values(),
+            *build_related_reifications(neomodel_class).values(),
+        ]
+    )
+
+
+def build_delete_embedded_template(neomodel_class: type[BaseNode]) -> str:
+    """Delete the child nodes and reifications of nodes of a class, so that
+    writing a node's again replaces them rather than adding to them. Run in the
+    same transaction as the statements creating them again."""
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (p:{cypher_name(neomodel_class.__label__)} {{uid: row.parent}}) "
+        f"OPTIONAL MATCH (p)-[:{build_embedded_relation_labels(neomodel_class)}]->"
+        "(old) "
+        "DETACH DELETE old "
+        "RETURN count(DISTINCT p) AS written"
+    )
+
+
+def build_relationship_template(
+    neomodel_class: type[BaseNode], relationship_name: str
+) -> str:
+    relationship = build_relationships(neomodel_class)[relationship_name]
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (a:{cypher_name(neomodel_class.__label__)} {{uid: row.from}}) "
+        f"MATCH (b:{cypher_name(relationship.target_model.__label__)} "
+        "{uid: row.to}) "
+        f"MERGE (a)-[r:{cypher_name(relationship.relation_label)}]->(b) "
+        "SET r = row.data "
+        "RETURN count(r) AS written"
+    )
+
+
+def build_embedded_template(
+    neomodel_class: type[BaseNode],
+    relationship_name: str,
+    relation_label: str,
+    embedded_class: type[BaseNode],
+) -> str:
+    """Create child nodes (or reifications) of one class, and their relations"""
+    labels = ":".join(cypher_name(label) for label in embedded_class.inherited_labels())
+    relations = "".join(
+        "WITH c, row "
+        "CALL { WITH c, row "
+        f"UNWIND row.relationships.{cypher_name(name)} AS related "
+        f"MATCH (t:{cypher_name(relationship.target_model.__label__)} "
+        "{uid: related.to}) "
+        f"CREATE (c)-[x:{cypher_name(relationship.relation_label)}]->(t) "
+        "SET x = related.data "
+        f"RETURN count(x) AS written_{index} }} "
+        for index, (name, relationship) in enumerate(
+            build_relationships(embedded_class).items()
+        )
+    )
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (p:{cypher_name(neomodel_class.__label__)} {{uid: row.parent}}) "
+        f"CREATE (p)-[r:{cypher_name(relation_label)}]->(c:{labels}) "
+        "SET r = row.relation, c = row.properties "
+        f"{relations}"
+        "RETURN count(c) AS written"
+    )
+
+
+def node_template(neomodel_class: type[BaseNode]) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (neomodel_class, "bulk_nodes", None),
+        lambda: build_node_template(neomodel_class),
+    )
+
+
+def delete_embedded_template(neomodel_class: type[BaseNode]) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (neomodel_class, "bulk_delete_embedded", None),
+        lambda: build_delete_embedded_template(neomodel_class),
+    )
+
+
+def relationship_template(neomodel_class: type[BaseNode], name: str) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (neomodel_class, f"bulk_relationship:{name}", None),
+        lambda: build_relationship_template(neomodel_class, name),
+    )
+
+
+def embedded_template(
+    neomodel_class: type[BaseNode],
+    name: str,
+    relation_label: str,
+    embedded_class: type[BaseNode],
+) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (neomodel_class, f"bulk_embedded:{name}:{embedded_class.__name__}", None),
+        lambda: build_embedded_template(
+            neomodel_class, name, relation_label, embedded_class
+        ),
+    )
+
+
+def add_item_rows(
+    item: BaseModel,
+    user: Optional[str],
+    now: datetime.datetime,
+    nodes: RowGroups,
+    relations: RowGroups,
+) -> None:
+    neomodel_class = model_class_of(item)
+    uid = item.uid.hex if item.uid is not None else uuid.uuid4().hex
+    properties = {
+        **deflate_properties(neomodel_class, item),
+        **server_set_properties(neomodel_class, user, now),
+        "uid": uid,
+    }
+    nodes[node_template(neomodel_class)].append(
+        {
+            "uid": uid,
+            "created": {
+                name: properties.pop(name)
+                for name in CREATION_PROPERTIES
+                if name in properties
+            },
+            "modified": {
+                name: properties.pop(name)
+                for name in MODIFICATION_PROPERTIES
+                if name in properties
+            },
+            "properties": properties,
+        }
+    )
+
+    for name, rows in build_relation_rows(neomodel_class, item).items():
+        if rows:
+            relations[relationship_template(neomodel_class, name)] += [
+                {"from": uid, **row} for row in rows
+            ]
+
+    embedded_relations = {
+        **build_child_nodes(neomodel_class),
+        **build_related_reifications(neomodel_class),
+    }
+    if embedded_relations:
+        relations[delete_embedded_template(neomodel_class)].append({"parent": uid})
+    for name, relationship in embedded_relations.items():
+        defaults = relation_defaults(relation_model(neomodel_class, name))
+        for embedded in getattr(item, name):
+            embedded_class = model_class_of(embedded)
+            template = embedded_template(
+                neomodel_class, name, relationship.relation_label, embedded_class
+            )
+            relations[template].append(
+                {
+                    "parent": uid,
+                    "relation": defaults,
+                    # Embedded nodes are recreated, so get a new uid each time
+                    "properties": {
+                        **deflate_properties(embedded_class, embedded),
+                        "uid": uuid.uuid4().hex,
+                    },
+                    "relationships": build_relation_rows(embedded_class, embedded),
+                }
+            )
+
+
+def build_rows(
+    items: Iterable[dict[str, Any]],
+    user: Optional[str] = None,
+    model_manager: ModelManagerClass = ModelManager,
+) -> tuple[RowGroups, list[RowGroups], int]:
+    """Validate the items, and build the rows for the nodes, grouped by the
+    statement that writes them, and for the relations, child nodes and
+    reifications of each item, grouped likewise; with the number of items.
+    Raises BulkImportError with the errors of every invalid item."""
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    nodes: RowGroups = defaultdict(list)
+    relations: list[RowGroups] = []
+    errors = []
+    count = 0
+    for index, item in enumerate(items):
+        count += 1
+        item_relations: RowGroups = defaultdict(list)
+        try:
+            add_item_rows(
+                validate_item(item, model_manager), user, now, nodes, item_relations
+            )
+            if item_relations:
+                relations.append(item_relations)
+        except InvalidItem as e:
+            errors.append({"index": index, "errors": e.errors})
+        except DeflateError as e:
+            # Checks pydantic does not make, such as a property's choices
+            errors.append(
+                {
+                    "index": index,
+                    "errors": [
+                        {
+                            "loc": (to_camel(e.property_name),),
+                            "msg": e.msg,
+                            "type": "value_error",
+                        }
+                    ],
+                }
+            )
+    if errors:
+        raise BulkImportError(errors)
+    return nodes, relations, count
+
+
+def index_node_rows(statements: list[Statement]) -> None:
+    """Add nodes written to the label index, as saving them would"""
+    label_index = get_label_index()
+    if label_index is None:
+        return
+    for _, params in statements:
+        for row in params["rows"]:
+            properties = row["properties"]
+            label_index.add(
+                row["uid"], properties.get("label"), properties.get("real_type")
+            )
+
+
+async def commit_statements(
+    executor: QueryExecutor,
+    statements: list[Statement],
+    phase: str,
+    rows: int,
+    report: ImportReport,
+) -> None:
+    """Run the statements in one transaction, and report it"""
+    start = time.perf_counter()
+    result = BatchResult(phase=phase, rows=rows)
+    try:
+        results = await executor.run_transaction(statements)
+        result.written = sum(rows[0]["written"] for rows in results if rows)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        logger.warning(f"Bulk import transaction failed: {result.error}")
+    else:
+        if phase == "nodes":
+            index_node_rows(statements)
+    result.seconds = time.perf_counter() - start
+    report.batches.append(result)
+
+
+async def write_row_groups(
+    executor: QueryExecutor,
+    groups: RowGroups,
+    phase: str,
+    report: ImportReport,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    transaction_size: int = DEFAULT_TRANSACTION_SIZE,
+) -> None:
+    """Write the rows in UNWIND statements of up to batch_size rows, in
+    transactions of up to transaction_size rows (or one statement, if larger)"""
+
+    statements: list[Statement] = []
+    rows_in_transaction = 0
+    for template, rows in groups.items():
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            if statements and rows_in_transaction + len(batch) > transaction_size:
+                await commit_statements(
+                    executor, statements, phase, rows_in_transaction, report
+                )
+                statements, rows_in_transaction = [], 0
+            statements.append((template, {"rows": batch}))
+            rows_in_transaction += len(batch)
+    if statements:
+        await commit_statements(
+            executor, statements, phase, rows_in_transaction, report
+        )
+
+
+def merge_row_groups(groups: Iterable[RowGroups]) -> RowGroups:
+    merged: RowGroups = defaultdict(list)
+    for group in groups:
+        for template, rows in group.items():
+            merged[template] += rows
+    return merged
+
+
+async def write_item_row_groups(
+    executor: QueryExecutor,
+    item_groups: list[RowGroups],
+    phase: str,
+    report: ImportReport,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    transaction_size: int = DEFAULT_TRANSACTION_SIZE,
+) -> None:
+    """Write the rows of each item in UNWIND statements of up to batch_size rows,
+    in transactions of up to transaction_size rows (or one item, if larger) that
+    have all the rows of their items: so that the child nodes and reifications
+    an item had are only deleted if the new ones are created"""
+
+    async def commit(transaction: list[RowGroups], rows: int):
+        statements = [
+            (template, {"rows": template_rows[start : start + batch_size]})
+            for template, template_rows in merge_row_groups(transaction).items()
+            for start in range(0, len(template_rows), batch_size)
+        ]
+        await commit_statements(executor, statements, phase, rows, report)
+
+    transaction: list[RowGroups] = []
+    rows_in_transaction = 0
+    for groups in item_groups:
+        rows = sum(map(len, groups.values()))
+        if transaction and rows_in_transaction + rows > transaction_size:
+            await commit(transaction, rows_in_transaction)
+            transaction, rows_in_transaction = [], 0
+        transaction.append(groups)
+        rows_in_transaction += rows
+    if transaction:
+        await commit(transaction, rows_in_transaction)
+
+
+async def bulk_import(
+    executor: QueryExecutor,
+    items: Iterable[dict[str, Any]],
+    user: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    transaction_size: int = DEFAULT_TRANSACTION_SIZE,
+    model_manager: ModelManagerClass = ModelManager,
+) -> ImportReport:
+    """Validate the items, and if all are valid, write them; returns a report of
+    the transactions, including any that failed"""
+
+    start = time.perf_counter()
+    nodes, relations, count = build_rows(items, user, model_manager)
+
+    report = ImportReport(items=count)
+    await write_row_groups(
+        executor, nodes, "nodes", report, batch_size, transaction_size
+    )
+    await write_item_row_groups(
+        executor, relations, "relations", report, batch_size, transaction_size
+    )
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from pros_core.db.executor import ThreadpoolQueryExecutor
+    from pros_core.db.schema_sync import import_settings
+    from pros_core.setup_utils import discover_apps, setup_model_manager
+
+    parser = argparse.ArgumentParser(
+        prog="python -m pros_core.db.bulk_import",
+        description="Create the nodes in a JSON file: a list of items, each with "
+        "the realType of the model to create",
+    )
+    parser.add_argument("settings", help="the app settings, as module:attribute")
+    parser.add_argument("path", help="the JSON file of items")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--transaction-size", type=int, default=DEFAULT_TRANSACTION_SIZE
+    )
+    parser.add_argument("--user", help="to record as having created the nodes")
+    args = parser.parse_args(argv)
+
+    installed_apps = discover_apps(import_settings(args.settings))
+    setup_model_manager(installed_apps.models, installed_apps.traits, lazy=True)
+    with open(args.path) as f:
+        items = json.load(f)
+    if isinstance(items, dict):
+        items = items["items"]
+
+    try:
+        report = asyncio.run(
+            bulk_import(
+                ThreadpoolQueryExecutor(),
+                items,
+                user=args.user,
+                batch_size=args.batch_size,
+                transaction_size=args.transaction_size,
+            )
+        )
+    except BulkImportError as e:
+        for error in e.errors:
+            print(f"item {error['index']}: {error['errors']}")
+        raise SystemExit(f"{e}: nothing written")
+    print(report)
+    if report.failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
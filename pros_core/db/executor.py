@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from pros_core.db.sync_executor import SyncExecutor
+
+# A parameterized query, as (query, params)
+Statement = tuple[str, dict[str, Any]]
+
+# Defaults of the neo4j driver
+DEFAULT_MAX_CONNECTION_POOL_SIZE = 100
+DEFAULT_CONNECTION_ACQUISITION_TIMEOUT = 60.0
+DEFAULT_FETCH_SIZE = 1000
+
+
+class QueryExecutor(ABC):
+    """Runs parameterized Cypher queries for request handlers, returning each
+    row as a dict of column name to value"""
+
+    @abstractmethod
+    async def run(self, query: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def run_transaction(
+        self, statements: list[Statement]
+    ) -> list[list[dict[str, Any]]]:
+        """Run the statements in one write transaction, returning the rows of each;
+        if any fails, none of them are committed"""
+
+
+class ThreadpoolQueryExecutor(QueryExecutor):
+    """Runs queries through neomodel's (synchronous) connection, in the threadpool
+    so as not to block the event loop: starlette's, or the bounded pool of a
+    SyncExecutor if given one"""
+
+    def __init__(self, sync_executor: Optional[SyncExecutor] = None):
+        self.sync_executor = sync_executor
+
+    async def _offload(self, fn, *args):
+        if self.sync_executor is not None:
+            return await self.sync_executor.run(fn, *args)
+        return await run_in_threadpool(fn, *args)
+
+    async def run(self, query: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+        return await self._offload(self.run_sync, query, params)
+
+    def run_sync(self, query: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+        from neomodel import db
+
+        results, columns = db.cypher_query(query, params)
+        return [dict(zip(columns, row)) for row in results]
+
+    async def run_transaction(
+        self, statements: list[Statement]
+    ) -> list[list[dict[str, Any]]]:
+        return await self._offload(self.run_transaction_sync, statements)
+
+    def run_transaction_sync(
+        self, statements: list[Statement]
+    ) -> list[list[dict[str, Any]]]:
+        from neomodel import db
+
+        with db.write_transaction:
+            return [self.run_sync(query, params) for query, params in statements]
+
+
+async def _fetch_rows(tx, query: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+    result = await tx.run(query, params)
+    return [dict(record.items()) async for record in result]
+
+
+async def _fetch_statements(
+    tx, statements: list[Statement]
+) -> list[list[dict[str, Any]]]:
+    return [await _fetch_rows(tx, query, params) for query, params in statements]
+
+
+class AsyncDriverQueryExecutor(QueryExecutor):
+    """Runs queries with the neo4j driver's async API, on the event loop, so that
+    a request waiting for the database holds a pooled connection rather than a
+    thread. Queries are run in managed transactions, which the driver retries on
+    transient errors: run() in a read transaction (so, in a cluster, on a reader),
+    run_transaction() in a write transaction."""
+
+    def __init__(
+        self,
+        driver,
+        database: Optional[str] = None,
+        fetch_size: int = DEFAULT_FETCH_SIZE,
+    ):
+        self.driver = driver
+        self.database = database
+        self.fetch_size = fetch_size
+
+    @classmethod
+    def from_settings(cls, settings) -> "AsyncDriverQueryExecutor":
+        """A driver for NEO4J_BOLT_URL (by default, neomodel's DATABASE_URL, with
+        the credentials in it), with a pool of NEO4J_MAX_CONNECTION_POOL_SIZE
+        connections, waiting at most NEO4J_CONNECTION_ACQUISITION_TIMEOUT seconds
+        for one, and fetching NEO4J_FETCH_SIZE rows at a time"""
+        from neo4j import AsyncGraphDatabase
+        from neomodel import config
+
+        url = urlparse(getattr(settings, "NEO4J_BOLT_URL", None) or config.DATABASE_URL)
+        auth = (url.username, url.password) if url.username else None
+        netloc = url.netloc.rsplit("@", 1)[-1]
+        driver = AsyncGraphDatabase.driver(
+            f"{url.scheme}://{netloc}",
+            auth=auth,
+            max_connection_pool_size=getattr(
+                settings,
+                "NEO4J_MAX_CONNECTION_POOL_SIZE",
+                DEFAULT_MAX_CONNECTION_POOL_SIZE,
+            ),
+            connection_acquisition_timeout=getattr(
+                settings,
+                "NEO4J_CONNECTION_ACQUISITION_TIMEOUT",
+                DEFAULT_CONNECTION_ACQUISITION_TIMEOUT,
+            ),
+        )
+        return cls(
+            driver,
+            database=getattr(settings, "NEO4J_DATABASE", None),
+            fetch_size=getattr(settings, "NEO4J_FETCH_SIZE", DEFAULT_FETCH_SIZE),
+        )
+
+    def session(self):
+        return self.driver.session(database=self.database, fetch_size=self.fetch_size)
+
+    async def run(self, query: str, params: dict[str, Any]) -> list[dict[str, Any]]:
+        async with self.session() as session:
+            return await session.execute_read(_fetch_rows, query, params)
+
+    async def run_transaction(
+        self, statements: list[Statement]
+    ) -> list[list[dict[str, Any]]]:
+        async with self.session() as session:
+            return await session.execute_write(_fetch_statements, statements)
+
+    async def close(self) -> None:
+        await self.driver.close()
+
+
+_query_executor: Optional[QueryExecutor] = None
+
+
+def set_query_executor(executor: QueryExecutor) -> None:
+    global _query_executor
+    _query_executor = executor
+
+
+def get_query_executor() -> QueryExecutor:
+    global _query_executor
+    if _query_executor is None:
+        _query_executor = ThreadpoolQueryExecutor()
+    return _query_executor
+
+
+QueryExecutorDependency = Depends(get_query_executor)
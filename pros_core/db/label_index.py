@@ -0,0 +1,246 @@
+"""An in-memory index of node labels, for autocomplete without a database query.
+
+Each indexed node is an entry of (uid, label, real_type). Labels are split into
+words, and each word into trigrams (with a leading space marking the start of a
+word, so that " ab" is only found at the start of a word), and each trigram maps
+to the set of entries having it. A query word is looked up by its own trigrams,
+and the entries having all of them are checked to have a word starting with it.
+
+The index is filled from the database when the app starts, and then kept up to
+date by hooks on saving and deleting nodes. Only writes made in this process are
+seen: with several workers, each has its own index, which is as up to date as
+its last start for writes made by other workers.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Collection, Iterable, Optional
+
+from pros_core.db.executor import QueryExecutor
+from pros_core.db.projection import cypher_name, not_deleted
+from pros_core.db.templates import QueryTemplateRegistry
+from pros_core.models import NODE_DELETE_HOOKS, NODE_SAVE_HOOKS, AbstractNode
+from pros_core.setup_utils.build_app_model_definitions import (
+    AppModel,
+    ModelManagerClass,
+)
+
+logger = logging.getLogger(__name__)
+
+# Only the start of longer labels is indexed (and returned), so that the memory
+# of each entry, and its number of trigrams, is bounded
+MAX_INDEXED_LABEL_LENGTH = 128
+
+LOAD_BATCH_SIZE = 10_000
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def word_grams(word: str) -> set[str]:
+    """Trigrams of a word, starting with " " and its first letter (so that single
+    letter queries can be looked up too)"""
+    padded = " " + word
+    return {padded[:2]} | {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def query_word_grams(word: str) -> set[str]:
+    """The trigrams a label must have for one of its words to start with word"""
+    padded = " " + word
+    if len(padded) < 3:
+        return {padded}
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class LabelIndex:
+    """Trigram index over (uid, label, real_type) of the nodes of some classes"""
+
+    def __init__(self, real_types: Iterable[str]):
+        # Class names of the nodes to index
+        self.real_types = frozenset(real_types)
+        # Entries by id; a removed entry's id is reused
+        self._entries: list[Optional[tuple[str, str, str, tuple[str, ...]]]] = []
+        self._free_ids: list[int] = []
+        self._ids_by_uid: dict[str, int] = {}
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_models(
+        cls, model_manager: ModelManagerClass, model_names: Iterable[str]
+    ) -> LabelIndex:
+        """An index of the nodes of the named models and their subclasses"""
+        return cls(
+            concrete.__name__
+            for name in model_names
+            for concrete in model_manager.concrete_descendants(name)
+        )
+
+    def covers(self, real_types: Collection[str]) -> bool:
+        return self.real_types.issuperset(real_types)
+
+    def add(self, uid: str, label: Optional[str], real_type: Optional[str]) -> None:
+        """Add a node to the index, or update it. Nodes of classes not indexed,
+        or without a label, are not added."""
+        with self._lock:
+            self.remove(uid)
+            if not label or real_type not in self.real_types:
+                return
+            label = label[:MAX_INDEXED_LABEL_LENGTH]
+            words = tuple(normalize(label).split())
+            if self._free_ids:
+                entry_id = self._free_ids.pop()
+                self._entries[entry_id] = (uid, label, real_type, words)
+            else:
+                entry_id = len(self._entries)
+                self._entries.append((uid, label, real_type, words))
+            self._ids_by_uid[uid] = entry_id
+            for gram in set().union(*map(word_grams, words)):
+                self._postings[gram].add(entry_id)
+
+    def remove(self, uid: str) -> None:
+        with self._lock:
+            entry_id = self._ids_by_uid.pop(uid, None)
+            if entry_id is None:
+                return
+            _, _, _, words = self._entries[entry_id]
+            for gram in set().union(*map(word_grams, words)):
+                postings = self._postings[gram]
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[gram]
+            self._entries[entry_id] = None
+            self._free_ids.append(entry_id)
+
+    def search(
+        self, q: str, real_types: Collection[str], limit: int
+    ) -> list[dict[str, Any]]:
+        """The (up to) limit nodes of the given classes with a word starting with
+        each word of q: labels starting with q first, then shortest first"""
+
+        query_words = normalize(q).split()
+        if not query_words:
+            return []
+        grams = set().union(*map(query_word_grams, query_words))
+        normalized_q = " ".join(query_words)
+
+        with self._lock:
+            postings = sorted(
+                (self._postings.get(gram, set()) for gram in grams), key=len
+            )
+            candidates = set(postings[0]).intersection(*postings[1:])
+            matches = []
+            for entry_id in candidates:
+                uid, label, real_type, words = self._entries[entry_id]
+                if real_type in real_types and all(
+                    any(word.startswith(query_word) for word in words)
+                    for query_word in query_words
+                ):
+                    matches.append((uid, label, real_type, " ".join(words)))
+
+        best = heapq.nsmallest(
+            limit,
+            matches,
+            key=lambda m: (not m[3].startswith(normalized_q), len(m[1]), m[1]),
+        )
+        return [
+            {"uid": uid, "label": label, "real_type": real_type.lower()}
+            for uid, label, real_type, _ in best
+        ]
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._ids_by_uid),
+            "grams": len(self._postings),
+            "postings": sum(map(len, self._postings.values())),
+        }
+
+    def __len__(self) -> int:
+        return len(self._ids_by_uid)
+
+    async def load(
+        self,
+        executor: QueryExecutor,
+        model_manager: ModelManagerClass,
+        batch_size: int = LOAD_BATCH_SIZE,
+    ) -> None:
+        """Add the nodes of the indexed classes from the database, reading them in
+        batches in uid order so that memory used is bounded by the batch size"""
+
+        for cls in load_classes(model_manager, self.real_types):
+            app_model = model_manager.get_model(cls)
+            after = ""
+            while True:
+                rows = await executor.run(
+                    load_template(app_model), {"after": after, "limit": batch_size}
+                )
+                for row in rows:
+                    self.add(row["uid"], row["label"], row["real_type"])
+                if len(rows) < batch_size:
+                    break
+                after = rows[-1]["uid"]
+        logger.info(f"Label index loaded: {self.stats}")
+
+
+def load_classes(
+    model_manager: ModelManagerClass, real_types: Collection[str]
+) -> list[type[AbstractNode]]:
+    """The classes whose labels are on every node of real_types, each node
+    having exactly one of them: i.e. the indexed classes without an indexed
+    ancestor"""
+    classes = [model_manager.get_model(name).model_class for name in sorted(real_types)]
+    return [
+        cls
+        for cls in classes
+        if not any(
+            other is not cls and issubclass(cls, other) for other in classes
+        )
+    ]
+
+
+def load_template(app_model: AppModel) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (app_model.model_class, "label_index_load", None),
+        lambda: (
+            f"MATCH (n:{cypher_name(app_model.model_class.__label__)}) "
+            f"WHERE n.uid > $after AND {not_deleted('n')} "
+            "RETURN n.uid AS uid, n.label AS label, n.real_type AS real_type "
+            "ORDER BY n.uid LIMIT $limit"
+        ),
+    )
+
+
+_label_index: Optional[LabelIndex] = None
+
+
+def set_label_index(label_index: Optional[LabelIndex]) -> None:
+    global _label_index
+    _label_index = label_index
+
+
+def get_label_index() -> Optional[LabelIndex]:
+    return _label_index
+
+
+def index_saved_node(node: AbstractNode) -> None:
+    if _label_index is None:
+        return
+    if node.is_deleted:
+        _label_index.remove(node.uid)
+    else:
+        _label_index.add(node.uid, node.label, node.real_type)
+
+
+def index_deleted_node(node: AbstractNode) -> None:
+    if _label_index is not None:
+        _label_index.remove(node.uid)
+
+
+NODE_SAVE_HOOKS.append(index_saved_node)
+NODE_DELETE_HOOKS.append(index_deleted_node)
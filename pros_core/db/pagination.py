@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from pros_core.db.executor import QueryExecutor
+from pros_core.db.projection import compile_projection, cypher_name, not_deleted
+from pros_core.db.templates import (
+    FieldSelection,
+    QueryTemplateRegistry,
+    field_selection,
+)
+from pros_core.setup_utils.build_app_model_definitions import AppModel
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# Number of nodes read by each query when streaming a whole list
+STREAM_BATCH_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class Cursor:
+    """Position after the last node of a page, in (label, uid) order.
+
+    Nodes without a label sort after all labelled nodes, so a cursor with
+    label None is a position among the unlabelled nodes"""
+
+    label: Optional[str]
+    uid: str
+
+    def encode(self) -> str:
+        return (
+            base64.urlsafe_b64encode(json.dumps([self.label, self.uid]).encode())
+            .rstrip(b"=")
+            .decode()
+        )
+
+    @classmethod
+    def decode(cls, cursor: str) -> Cursor:
+        try:
+            label, uid = json.loads(
+                base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            )
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise InvalidCursor(f"Invalid cursor '{cursor}'")
+        if not isinstance(uid, str) or not isinstance(label, (str, type(None))):
+            raise InvalidCursor(f"Invalid cursor '{cursor}'")
+        return cls(label=label, uid=uid)
+
+
+def list_operation(seek: bool, unlabelled: bool) -> str:
+    """Name of the list query variant, as an operation of QueryTemplateRegistry"""
+    return "list" + ("_unlabelled" if unlabelled else "") + ("_after" if seek else "")
+
+
+def build_list_template(
+    app_model: AppModel, seek: bool, unlabelled: bool, fields: FieldSelection = None
+) -> str:
+    conditions = [not_deleted("n")]
+    if unlabelled:
+        conditions.append("n.label IS NULL")
+        if seek:
+            conditions.append("n.uid > $after_uid")
+        order_by = "n.uid"
+    else:
+        conditions.append("n.label IS NOT NULL")
+        if seek:
+            conditions.append("n.label >= $after_label")
+            conditions.append("(n.label > $after_label OR n.uid > $after_uid)")
+        order_by = "n.label, n.uid"
+
+    return (
+        f"MATCH (n:{cypher_name(app_model.model_class.__label__)}) "
+        f"WHERE {' AND '.join(conditions)} "
+        f"RETURN {compile_projection(app_model, fields)} AS item "
+        f"ORDER BY {order_by} "
+        "LIMIT $limit"
+    )
+
+
+def list_template(
+    app_model: AppModel, seek: bool, unlabelled: bool, fields: FieldSelection = None
+) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (app_model.model_class, list_operation(seek, unlabelled), fields),
+        lambda: build_list_template(app_model, seek, unlabelled, fields),
+    )
+
+
+def build_list_query(
+    app_model: AppModel,
+    after: Optional[Cursor],
+    unlabelled: bool = False,
+    fields: FieldSelection = None,
+) -> tuple[str, dict[str, Any]]:
+    """Query for a page of nodes of app_model after the cursor, in (label, uid)
+    order, which reads only the nodes on the page.
+
+    Labelled and unlabelled nodes are queried separately, so that each query
+    can seek to the cursor position using the index on label (or uid), rather
+    than skipping every node before it."""
+
+    seek = after is not None
+    query = list_template(app_model, seek, unlabelled, fields)
+    params: dict[str, Any] = {}
+    if seek:
+        params["after_uid"] = after.uid
+        if not unlabelled:
+            params["after_label"] = after.label
+    return query, params
+
+
+async def fetch_after(
+    executor: QueryExecutor,
+    app_model: AppModel,
+    after: Optional[Cursor],
+    limit: int,
+    fields: FieldSelection = None,
+) -> list[dict[str, Any]]:
+    """Get the (up to) limit nodes of app_model following the cursor"""
+
+    items: list[dict[str, Any]] = []
+    if after is None or after.label is not None:
+        query, params = build_list_query(app_model, after, fields=fields)
+        rows = await executor.run(query, {**params, "limit": limit})
+        items = [row["item"] for row in rows]
+    if len(items) < limit:
+        query, params = build_list_query(
+            app_model,
+            after if after is not None and after.label is None else None,
+            unlabelled=True,
+            fields=fields,
+        )
+        rows = await executor.run(query, {**params, "limit": limit - len(items)})
+        items += [row["item"] for row in rows]
+    return items
+
+
+def cursor_after(item: dict[str, Any]) -> Cursor:
+    return Cursor(label=item["label"], uid=item["uid"])
+
+
+async def fetch_page(
+    executor: QueryExecutor,
+    app_model: AppModel,
+    cursor: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[Iterable[str]] = None,
+) -> dict[str, Any]:
+    """Get a page of nodes of app_model (including subclasses), and the cursor
+    of the following page (None if this is the last page)"""
+
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    after = Cursor.decode(cursor) if cursor else None
+
+    # Fetch one more item than needed, to find out if there is a next page
+    items = await fetch_after(
+        executor, app_model, after, page_size + 1, field_selection(fields)
+    )
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = cursor_after(items[-1]).encode()
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def stream_batches(
+    executor: QueryExecutor,
+    app_model: AppModel,
+    after: Optional[Cursor] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+    fields: Optional[Iterable[str]] = None,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Get all the nodes of app_model (including subclasses) following the cursor,
+    in (label, uid) order, in batches of batch_size.
+
+    Each batch is read by its own query, seeking to the end of the previous one, and
+    only when the previous batch has been consumed: so at most one batch is held at
+    a time, and no transaction is kept open while a slow consumer catches up.
+    The cursor is decoded by the caller, so that an invalid one is found before
+    anything is streamed."""
+
+    fields = field_selection(fields)
+    while True:
+        items = await fetch_after(executor, app_model, after, batch_size, fields)
+        if items:
+            yield items
+        if len(items) < batch_size:
+            return
+        after = cursor_after(items[-1])
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Optional
+
+from pros_core.db.executor import QueryExecutor
+from pros_core.db.templates import (
+    FieldSelection,
+    QueryTemplateRegistry,
+    field_selection,
+)
+from pros_core.models import AbstractNode, BaseNode
+from pros_core.setup_utils.build_app_model_definitions import AppModel
+from pros_core.setup_utils.build_pydantic_return_models import (
+    build_classes_with_trait,
+    build_concrete_subtypes,
+)
+
+# Fields projected whatever the selection of fields, as they identify a node
+# and order pages of nodes
+ALWAYS_PROJECTED = frozenset({"uid", "real_type", "label"})
+
+
+def cypher_name(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def not_deleted(variable: str) -> str:
+    return f"NOT coalesce({variable}.is_deleted, false)"
+
+
+def build_real_type_expression(
+    variable: str, classes: list[type[BaseNode]]
+) -> str:
+    """Cypher expression for the lowercased real_type of a node, which can be any
+    of classes. Child nodes are not saved with a real_type, so theirs is found
+    from the node's labels."""
+
+    if all(issubclass(cls, AbstractNode) for cls in classes):
+        return f"toLower({variable}.real_type)"
+    # Most derived first, as a node also has the labels of its parent classes
+    cases = " ".join(
+        f"WHEN {variable}:{cypher_name(cls.__label__)} THEN '{cls.__name__.lower()}'"
+        for cls in sorted(classes, key=lambda cls: len(cls.__mro__), reverse=True)
+    )
+    return f"CASE {cases} END"
+
+
+def build_stub_projection(
+    variable: str,
+    classes: list[type[BaseNode]],
+    relation_variable: Optional[str] = None,
+    relation_properties: tuple[str, ...] = (),
+) -> str:
+    """Map projection of a related node to the fields of a related item model"""
+
+    entries = [
+        ".uid",
+        ".label",
+        f"real_type: {build_real_type_expression(variable, classes)}",
+    ]
+    if relation_variable is not None and relation_properties:
+        relation_data = ", ".join(f".{cypher_name(p)}" for p in relation_properties)
+        entries.append(f"relation_data: {relation_variable} {{{relation_data}}}")
+    return f"{variable} {{{', '.join(entries)}}}"
+
+
+def build_node_projection(
+    app_model: AppModel, variable: str, fields: FieldSelection = None
+) -> str:
+    """Map projection of a node of app_model (not a subclass) to the fields of its
+    pydantic return model: its properties, plus stubs of the nodes it is related
+    to, and its child nodes in full, each gathered by a pattern comprehension so
+    the whole node is read in a single query. If fields is given, only those
+    fields (and uid, real_type and label) are projected."""
+
+    def selected(name: str) -> bool:
+        return fields is None or name in fields or name in ALWAYS_PROJECTED
+
+    related = f"{variable}_m"
+    relation = f"{variable}_r"
+    child = f"{variable}_c"
+
+    entries = [".uid"]
+    if issubclass(app_model.model_class, AbstractNode):
+        entries.append(f"real_type: toLower({variable}.real_type)")
+    else:
+        entries.append(f"real_type: '{app_model.model_name.lower()}'")
+
+    for name, prop in app_model.properties.items():
+        if name == "real_type" or not selected(name):
+            continue
+        db_property = getattr(prop, "db_property", None) or name
+        if db_property == name:
+            entries.append(f".{cypher_name(name)}")
+        else:
+            entries.append(
+                f"{cypher_name(name)}: {variable}.{cypher_name(db_property)}"
+            )
+
+    for name, relationship in app_model.relationships.items():
+        if not selected(name):
+            continue
+        target = relationship.target_model
+        if target.__is_trait__:
+            classes = build_classes_with_trait(target)
+        else:
+            classes = build_concrete_subtypes(target)
+        relation_properties = tuple(relationship.relation_properties)
+        pattern = (
+            f"({variable})-[{relation if relation_properties else ''}:"
+            f"{cypher_name(relationship.relation_label)}]->"
+            f"({related}:{cypher_name(target.__label__)})"
+        )
+        stub = build_stub_projection(related, classes, relation, relation_properties)
+        entries.append(
+            f"{cypher_name(name)}: [{pattern} WHERE {not_deleted(related)} | {stub}]"
+        )
+
+    for name, child_node in app_model.child_nodes.items():
+        if not selected(name):
+            continue
+        child_model = child_node.child_model
+        pattern = (
+            f"({variable})-[:{cypher_name(child_node.relation_label)}]->"
+            f"({child}:{cypher_name(child_model.__label__)})"
+        )
+        projection = build_projection(child_node.child_app_model, child)
+        entries.append(f"{cypher_name(name)}: [{pattern} | {projection}]")
+
+    for name, reverse_relationship in app_model.reverse_relationships.items():
+        if not selected(name):
+            continue
+        source = reverse_relationship.relationship_from_model
+        if source.__is_trait__:
+            classes = build_classes_with_trait(source)
+        else:
+            classes = build_concrete_subtypes(source)
+        relation_label = reverse_relationship.forward_relationship_label
+        pattern = (
+            f"({variable})<-[:{cypher_name(relation_label)}]-"
+            f"({related}:{cypher_name(source.__label__)})"
+        )
+        stub = build_stub_projection(related, classes)
+        entries.append(
+            f"{cypher_name(name)}: [{pattern} WHERE {not_deleted(related)} | {stub}]"
+        )
+
+    return f"{variable} {{{', '.join(entries)}}}"
+
+
+def build_projection(
+    app_model: AppModel, variable: str = "n", fields: FieldSelection = None
+) -> str:
+    """Cypher expression projecting a node of app_model, or any of its subclasses,
+    to the fields of the pydantic return model of its real type"""
+
+    classes = build_concrete_subtypes(app_model.model_class)
+    if not classes:
+        return "null"
+    if len(classes) == 1:
+        return build_node_projection(
+            app_model._mm.get_model(classes[0]), variable, fields
+        )
+
+    branches = {
+        cls: build_node_projection(app_model._mm.get_model(cls), variable, fields)
+        for cls in classes
+    }
+    if all(issubclass(cls, AbstractNode) for cls in classes):
+        cases = " ".join(
+            f"WHEN '{cls.__name__}' THEN {projection}"
+            for cls, projection in branches.items()
+        )
+        return f"CASE {variable}.real_type {cases} END"
+    # Child nodes have no real_type, so are told apart by their labels, most
+    # derived first
+    cases = " ".join(
+        f"WHEN {variable}:{cypher_name(cls.__label__)} THEN {branches[cls]}"
+        for cls in sorted(branches, key=lambda cls: len(cls.__mro__), reverse=True)
+    )
+    return f"CASE {cases} END"
+
+
+def compile_projection(app_model: AppModel, fields: FieldSelection = None) -> str:
+    """Get the projection of app_model's nodes, compiling it on first use"""
+    return QueryTemplateRegistry.get_or_build(
+        (app_model.model_class, "projection", fields),
+        lambda: build_projection(app_model, fields=fields),
+    )
+
+
+def build_detail_query(app_model: AppModel, fields: FieldSelection = None) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (app_model.model_class, "detail", fields),
+        lambda: (
+            f"MATCH (n:{cypher_name(app_model.model_class.__label__)} {{uid: $uid}}) "
+            f"WHERE {not_deleted('n')} "
+            f"RETURN {compile_projection(app_model, fields)} AS item"
+        ),
+    )
+
+
+async def fetch_node(
+    executor: QueryExecutor,
+    app_model: AppModel,
+    uid: str,
+    fields: Optional[Iterable[str]] = None,
+) -> Optional[dict[str, Any]]:
+    """Get a node of app_model (or a subclass) with its relations, or None if there
+    is no such node"""
+
+    query = build_detail_query(app_model, field_selection(fields))
+    rows = await executor.run(query, {"uid": uid})
+    return rows[0]["item"] if rows else None
@@ -0,0 +1,273 @@
+"""Create the indexes and constraints the queries of pros_core rely on.
+
+The required schema is derived from the models in the ModelManager: for the label
+of every model (abstract or not) and trait that queries match on,
+- a uniqueness constraint on uid, used to find a node by uid
+- an index on label, used to order and seek through lists of nodes
+- an index on real_type
+and a fulltext index on the label of all of them, for autocomplete. These are
+compared with the indexes and constraints in the database, and only the
+missing ones are created.
+
+    python -m pros_core.db.schema_sync app.core.config:settings [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from pros_core.db.projection import cypher_name
+from pros_core.models import BaseNode
+from pros_core.setup_utils.build_app_model_definitions import (
+    AppModel,
+    ModelManager,
+    ModelManagerClass,
+)
+
+logger = logging.getLogger(__name__)
+
+LABEL_FULLTEXT_INDEX = "pros_label_fulltext"
+
+# Runs a query, returning each row as a dict of column name to value
+QueryRunner = Callable[[str, dict[str, Any]], list[dict[str, Any]]]
+
+
+@dataclass(frozen=True, slots=True)
+class SchemaItem:
+    """An index or constraint, on one or more labels and properties"""
+
+    kind: str  # "unique", "range" or "fulltext"
+    name: str
+    labels: tuple[str, ...]
+    properties: tuple[str, ...]
+
+    @property
+    def is_constraint(self) -> bool:
+        return self.kind == "unique"
+
+    @property
+    def definition(self) -> tuple:
+        """What the item does, whatever it is called: items with the same
+        definition are interchangeable"""
+        labels = frozenset(self.labels) if self.kind == "fulltext" else self.labels
+        return (self.kind, labels, self.properties)
+
+    def create_statement(self) -> str:
+        name = cypher_name(self.name)
+        if self.kind == "unique":
+            return (
+                f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+                f"FOR (n:{cypher_name(self.labels[0])}) "
+                f"REQUIRE n.{cypher_name(self.properties[0])} IS UNIQUE"
+            )
+        if self.kind == "range":
+            properties = ", ".join(f"n.{cypher_name(p)}" for p in self.properties)
+            return (
+                f"CREATE INDEX {name} IF NOT EXISTS "
+                f"FOR (n:{cypher_name(self.labels[0])}) ON ({properties})"
+            )
+        labels = "|".join(cypher_name(label) for label in self.labels)
+        properties = ", ".join(f"n.{cypher_name(p)}" for p in self.properties)
+        return (
+            f"CREATE FULLTEXT INDEX {name} IF NOT EXISTS "
+            f"FOR (n:{labels}) ON EACH [{properties}]"
+        )
+
+    def drop_statement(self) -> str:
+        if self.is_constraint:
+            return f"DROP CONSTRAINT {cypher_name(self.name)} IF EXISTS"
+        return f"DROP INDEX {cypher_name(self.name)} IF EXISTS"
+
+
+@dataclass(frozen=True, slots=True)
+class SchemaPlan:
+    """Indexes and constraints to drop and create, in that order"""
+
+    drop: tuple[SchemaItem, ...]
+    create: tuple[SchemaItem, ...]
+
+    @property
+    def statements(self) -> list[str]:
+        return [item.drop_statement() for item in self.drop] + [
+            item.create_statement() for item in self.create
+        ]
+
+    def __bool__(self) -> bool:
+        return bool(self.drop or self.create)
+
+    def __str__(self) -> str:
+        if not self:
+            return "Database schema is up to date"
+        return "\n".join(
+            [f"{len(self.drop)} to drop, {len(self.create)} to create:"]
+            + [f"  {statement};" for statement in self.statements]
+        )
+
+
+def build_node_property_names(app_model: AppModel) -> set[str]:
+    """Names of the properties of nodes with the model's label. A trait's own
+    label is on nodes of the classes it is applied to, which have their
+    properties as well as the trait's."""
+    classes: list[type[BaseNode]] = [app_model.model_class]
+    if app_model.model_class.__is_trait__:
+        classes += app_model._mm.classes_with_trait(app_model.model_class)
+    return {name for cls in classes for name, _ in cls.__all_properties__}
+
+
+def build_required_schema(
+    model_manager: ModelManagerClass = ModelManager,
+) -> list[SchemaItem]:
+    """The indexes and constraints needed by the queries on the models"""
+
+    items = []
+    fulltext_labels = []
+    for app_model in model_manager.models:
+        label = app_model.model_class.__label__
+        properties = build_node_property_names(app_model)
+        if "uid" in properties:
+            items.append(
+                SchemaItem("unique", f"pros_{label}_uid", (label,), ("uid",))
+            )
+        for name in ("label", "real_type"):
+            if name in properties:
+                items.append(
+                    SchemaItem("range", f"pros_{label}_{name}", (label,), (name,))
+                )
+        if "label" in properties:
+            fulltext_labels.append(label)
+
+    if fulltext_labels:
+        items.append(
+            SchemaItem(
+                "fulltext",
+                LABEL_FULLTEXT_INDEX,
+                tuple(sorted(fulltext_labels)),
+                ("label",),
+            )
+        )
+    return items
+
+
+def parse_existing_item(
+    row: dict[str, Any], is_constraint: bool
+) -> Optional[SchemaItem]:
+    """Convert a row of SHOW INDEXES or SHOW CONSTRAINTS, which differ a little
+    between Neo4j versions, to a SchemaItem; or None if it is of a kind not
+    managed here (e.g. on relationships, or a token lookup index)"""
+
+    if row.get("entityType", "NODE") != "NODE":
+        return None
+    type_ = str(row.get("type", "")).upper()
+    if is_constraint:
+        if "UNIQUE" not in type_:
+            return None
+        kind = "unique"
+    elif type_ == "FULLTEXT":
+        kind = "fulltext"
+    elif type_ in {"RANGE", "BTREE"}:
+        # Indexes backing a uniqueness constraint are listed with the constraint
+        if row.get("owningConstraint") or row.get("uniqueness") == "UNIQUE":
+            return None
+        kind = "range"
+    else:
+        return None
+    return SchemaItem(
+        kind=kind,
+        name=row["name"],
+        labels=tuple(row.get("labelsOrTypes") or ()),
+        properties=tuple(row.get("properties") or ()),
+    )
+
+
+def read_existing_schema(run: QueryRunner) -> list[SchemaItem]:
+    items = []
+    for query, is_constraint in [
+        ("SHOW CONSTRAINTS", True),
+        ("SHOW INDEXES", False),
+    ]:
+        for row in run(query, {}):
+            item = parse_existing_item(row, is_constraint)
+            if item is not None:
+                items.append(item)
+    return items
+
+
+def plan_schema_sync(
+    required: list[SchemaItem], existing: list[SchemaItem]
+) -> SchemaPlan:
+    """Find the required items that don't exist. An existing item with the name of
+    a required one that does something different (the fulltext index, after models
+    have been added) is dropped, to be created again."""
+
+    existing_definitions = {item.definition for item in existing}
+    existing_by_name = {item.name: item for item in existing}
+    drop, create = [], []
+    for item in required:
+        if item.definition in existing_definitions:
+            continue
+        if item.name in existing_by_name:
+            drop.append(existing_by_name[item.name])
+        create.append(item)
+    # Constraints first, so that uids are guaranteed unique as soon as possible
+    create.sort(key=lambda item: not item.is_constraint)
+    return SchemaPlan(drop=tuple(drop), create=tuple(create))
+
+
+def apply_schema_plan(plan: SchemaPlan, run: QueryRunner) -> None:
+    for statement in plan.statements:
+        logger.info(statement)
+        run(statement, {})
+
+
+def sync_schema(
+    model_manager: ModelManagerClass = ModelManager,
+    run: Optional[QueryRunner] = None,
+    dry_run: bool = False,
+) -> SchemaPlan:
+    """Create the indexes and constraints the models need that are not in the
+    database, returning the plan. With dry_run, only returns the plan."""
+
+    if run is None:
+        from pros_core.db.executor import ThreadpoolQueryExecutor
+
+        run = ThreadpoolQueryExecutor().run_sync
+
+    plan = plan_schema_sync(
+        build_required_schema(model_manager), read_existing_schema(run)
+    )
+    if not dry_run:
+        apply_schema_plan(plan, run)
+    return plan
+
+
+def import_settings(path: str):
+    """Import settings from 'module:attribute'"""
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "settings")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from pros_core.setup_utils import discover_apps, setup_model_manager
+
+    parser = argparse.ArgumentParser(
+        prog="python -m pros_core.db.schema_sync",
+        description="Create the indexes and constraints needed by the installed apps",
+    )
+    parser.add_argument("settings", help="the app settings, as module:attribute")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the plan without applying it"
+    )
+    args = parser.parse_args(argv)
+
+    installed_apps = discover_apps(import_settings(args.settings))
+    setup_model_manager(installed_apps.models, installed_apps.traits, lazy=True)
+    plan = sync_schema(ModelManager, dry_run=args.dry_run)
+    print(plan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Iterable, Optional
+
+from pros_core.db.executor import QueryExecutor
+from pros_core.db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from pros_core.db.projection import compile_projection, cypher_name, not_deleted
+from pros_core.db.schema_sync import LABEL_FULLTEXT_INDEX
+from pros_core.db.templates import (
+    FieldSelection,
+    QueryTemplateRegistry,
+    field_selection,
+)
+from pros_core.setup_utils.build_app_model_definitions import AppModel
+
+# Characters with a meaning in Lucene query syntax
+LUCENE_SPECIAL_CHARACTERS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+
+def build_search_string(q: str) -> Optional[str]:
+    """Lucene query matching labels containing every word of q, the last word
+    being matched as a prefix as it may not have been finished yet. Whole-word
+    matches of the last word rank above prefix matches. None if q has no words."""
+
+    words = [
+        LUCENE_SPECIAL_CHARACTERS.sub(r"\\\1", word)
+        for word in q.lower().split()
+    ]
+    if not words:
+        return None
+    *complete, last = words
+    return " ".join([f"+{word}" for word in complete] + [f"+({last}^2 {last}*)"])
+
+
+def build_search_template(app_model: AppModel, fields: FieldSelection = None) -> str:
+    # Nodes come from the index in order of relevance, and are filtered as they
+    # come: with no ORDER BY, the query stops once it has $limit nodes, rather
+    # than reading every node that matches
+    return (
+        "CALL db.index.fulltext.queryNodes($index, $search) YIELD node AS n "
+        f"WHERE n:{cypher_name(app_model.model_class.__label__)} "
+        f"AND {not_deleted('n')} "
+        f"RETURN {compile_projection(app_model, fields)} AS item "
+        "LIMIT $limit"
+    )
+
+
+def search_template(app_model: AppModel, fields: FieldSelection = None) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (app_model.model_class, "search", fields),
+        lambda: build_search_template(app_model, fields),
+    )
+
+
+async def search_nodes(
+    executor: QueryExecutor,
+    app_model: AppModel,
+    q: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[Iterable[str]] = None,
+) -> dict[str, Any]:
+    """Get the nodes of app_model (including subclasses) whose label best matches
+    q, for autocomplete, as a page with no following page"""
+
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    search = build_search_string(q)
+    if search is None:
+        return {"items": [], "next_cursor": None}
+
+    rows = await executor.run(
+        search_template(app_model, field_selection(fields)),
+        {"index": LABEL_FULLTEXT_INDEX, "search": search, "limit": limit},
+    )
+    return {"items": [row["item"] for row in rows], "next_cursor": None}
+
+
+def build_fetch_by_uid_template(
+    app_model: AppModel, fields: FieldSelection = None
+) -> str:
+    # UNWIND keeps the nodes in the order of $uids
+    return (
+        "UNWIND $uids AS uid "
+        f"MATCH (n:{cypher_name(app_model.model_class.__label__)} {{uid: uid}}) "
+        f"WHERE {not_deleted('n')} "
+        f"RETURN {compile_projection(app_model, fields)} AS item"
+    )
+
+
+def fetch_by_uid_template(app_model: AppModel, fields: FieldSelection = None) -> str:
+    return QueryTemplateRegistry.get_or_build(
+        (app_model.model_class, "fetch_by_uid", fields),
+        lambda: build_fetch_by_uid_template(app_model, fields),
+    )
+
+
+async def fetch_nodes_by_uid(
+    executor: QueryExecutor,
+    app_model: AppModel,
+    uids: list[str],
+    fields: Optional[Iterable[str]] = None,
+) -> dict[str, Any]:
+    """Get the nodes of app_model (including subclasses) with the given uids, in
+    their order, as a page with no following page: e.g. the best matches for q
+    found by the label index"""
+
+    if not uids:
+        return {"items": [], "next_cursor": None}
+    rows = await executor.run(
+        fetch_by_uid_template(app_model, field_selection(fields)), {"uids": uids}
+    )
+    return {"items": [row["item"] for row in rows], "next_cursor": None}
@@ -0,0 +1,477 @@
+"""Import nodes from a JSON Lines or CSV file of any size, with checkpoints to
+resume from.
+
+Each row is an item as for bulk import, which may have an externalId, its id in
+the database it comes from. Relations refer to other rows by their externalId (or
+to nodes already in the database, by uid). In CSV files, the columns are realType,
+externalId, uid and the model's properties and relations, several related rows
+being separated by "|"; child nodes and reifications can only be given in JSON
+Lines.
+
+The file is read three times, a chunk of rows at a time, so the memory used does
+not grow with its size:
+- index: each row is given a uid, kept with its externalId in a SQLite database
+  on disk, so that references can be looked up without holding every id in memory
+- nodes: rows are validated and the nodes written
+- relations: the relations, child nodes and reifications of each node are
+  written; every node having been written, a row can refer to any other row.
+Writes are batched as for bulk import. After each chunk, the number of rows done is
+saved in the SQLite database, with the uids; an import that stops can be run again
+to resume from the last chunk done. Writes merge on uid, and replace child nodes
+and reifications, so writing a chunk again (if the import stopped while writing
+it) changes nothing.
+
+    python -m pros_core.db.streaming_import app.core.config:settings dump.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from camel_converter import to_camel, to_snake
+from pros_core.db.bulk_import import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_TRANSACTION_SIZE,
+    BulkImportError,
+    ImportReport,
+    build_rows,
+    write_item_row_groups,
+    write_row_groups,
+)
+from pros_core.db.executor import QueryExecutor
+from pros_core.setup_utils.build_app_model_definitions import (
+    AppModel,
+    ModelManager,
+    ModelManagerClass,
+    ModelManagerException,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+PHASES = ("index", "nodes", "relations")
+
+# Separates several values in a CSV relation column
+CSV_LIST_SEPARATOR = "|"
+
+# Most variables in a SQLite query, in all versions
+SQLITE_MAX_VARIABLES = 900
+
+
+class StreamingImportError(ValueError):
+    """Rows failed validation, or their transactions failed; rows before their
+    chunk have been imported"""
+
+    def __init__(self, message: str, errors: Optional[list[dict[str, Any]]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def read_jsonl(path: Path) -> Iterator[dict[str, Any]]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def csv_row_to_item(
+    row: dict[str, str], model_manager: ModelManagerClass = ModelManager
+) -> dict[str, Any]:
+    """An item from a CSV row: empty cells are left out, and relation columns split
+    into lists"""
+    try:
+        relationships = model_manager.get_model(row.get("realType")).relationships
+    except (ModelManagerException, KeyError, TypeError):
+        relationships = {}
+    item: dict[str, Any] = {}
+    for column, value in row.items():
+        if value == "" or column is None:
+            continue
+        if to_snake(column) in relationships:
+            item[column] = value.split(CSV_LIST_SEPARATOR)
+        else:
+            item[column] = value
+    return item
+
+
+def read_csv(
+    path: Path, model_manager: ModelManagerClass = ModelManager
+) -> Iterator[dict[str, Any]]:
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield csv_row_to_item(row, model_manager)
+
+
+def read_items(
+    path: Path, format: str, model_manager: ModelManagerClass = ModelManager
+) -> Iterator[dict[str, Any]]:
+    if format == "csv":
+        return read_csv(path, model_manager)
+    return read_jsonl(path)
+
+
+def file_format(path: Path) -> str:
+    return "csv" if path.suffix.lower() == ".csv" else "jsonl"
+
+
+def chunked(
+    items: Iterable[dict[str, Any]], chunk_size: int, start: int = 0
+) -> Iterator[tuple[int, list[dict[str, Any]]]]:
+    """(number of the first row, rows) of each chunk of rows, from row start on"""
+    items = itertools.islice(items, start, None)
+    while chunk := list(itertools.islice(items, chunk_size)):
+        yield start, chunk
+        start += len(chunk)
+
+
+class ImportState:
+    """The uid and externalId of each row, and the progress of each phase, in a
+    SQLite database"""
+
+    def __init__(self, path: Path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "row INTEGER PRIMARY KEY, external_id TEXT UNIQUE, uid TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "phase TEXT PRIMARY KEY, rows INTEGER NOT NULL, "
+            "complete INTEGER NOT NULL DEFAULT 0);"
+        )
+
+    def checkpoint(self, phase: str) -> Optional[tuple[int, bool]]:
+        """Rows done in the phase, and whether it is complete, if it has started"""
+        row = self.connection.execute(
+            "SELECT rows, complete FROM checkpoints WHERE phase = ?", (phase,)
+        ).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def save_checkpoint(self, phase: str, rows: int, complete: bool = False) -> None:
+        self.connection.execute(
+            "INSERT INTO checkpoints (phase, rows, complete) VALUES (?, ?, ?) "
+            "ON CONFLICT (phase) DO UPDATE SET rows = excluded.rows, "
+            "complete = excluded.complete",
+            (phase, rows, int(complete)),
+        )
+        self.connection.commit()
+
+    def add_rows(self, start: int, items: list[dict[str, Any]]) -> None:
+        """Give each row a uid (its own, if it has one), and keep it with its
+        externalId"""
+        values = [
+            (
+                start + offset,
+                item.get("externalId", item.get("external_id")),
+                str(item.get("uid") or uuid.uuid4()),
+            )
+            for offset, item in enumerate(items)
+        ]
+        try:
+            # Rows already added, before an import was resumed, keep their uid
+            self.connection.executemany(
+                "INSERT INTO rows (row, external_id, uid) VALUES (?, ?, ?) "
+                "ON CONFLICT (row) DO NOTHING",
+                values,
+            )
+        except sqlite3.IntegrityError as e:
+            self.connection.rollback()
+            raise StreamingImportError(
+                f"Duplicate externalId in rows {start} to {start + len(items) - 1}: "
+                f"{e}"
+            )
+
+    def row_uids(self, start: int, count: int) -> list[str]:
+        return [
+            uid
+            for (uid,) in self.connection.execute(
+                "SELECT uid FROM rows WHERE row >= ? AND row < ? ORDER BY row",
+                (start, start + count),
+            )
+        ]
+
+    def uids_by_external_id(self, external_ids: Iterable[str]) -> dict[str, str]:
+        external_ids = list(set(external_ids))
+        uids = {}
+        for i in range(0, len(external_ids), SQLITE_MAX_VARIABLES):
+            batch = external_ids[i : i + SQLITE_MAX_VARIABLES]
+            uids.update(
+                self.connection.execute(
+                    "SELECT external_id, uid FROM rows WHERE external_id IN "
+                    f"({', '.join('?' * len(batch))})",
+                    batch,
+                )
+            )
+        return uids
+
+    def row_count(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM rows").fetchone()[0]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# A reference to another row: the list it is in, and its position
+ReferenceSlot = tuple[list, int]
+
+
+def field_value(item: dict[str, Any], name: str) -> Any:
+    """The value of a field of an item, given by name or alias"""
+    return item.get(to_camel(name), item.get(name))
+
+
+def find_references(
+    item: dict[str, Any], model_manager: ModelManagerClass = ModelManager
+) -> list[ReferenceSlot]:
+    """The positions of the values of an item's relations, and of those of its
+    child nodes and reifications, that may be references to other rows"""
+    try:
+        app_model: AppModel = model_manager.get_model(
+            item.get("realType", item.get("real_type"))
+        )
+    except (ModelManagerException, KeyError, TypeError):
+        # Not a valid item, which validation will report
+        return []
+
+    slots = []
+    for name in app_model.relationships:
+        related = field_value(item, name)
+        if isinstance(related, list):
+            slots += [(related, index) for index in range(len(related))]
+    for name in [*app_model.child_nodes, *app_model.related_reifications]:
+        embedded = field_value(item, name)
+        if isinstance(embedded, list):
+            for embedded_item in embedded:
+                if isinstance(embedded_item, dict):
+                    slots += find_references(embedded_item, model_manager)
+    return slots
+
+
+def reference_key(value: Any) -> Optional[str]:
+    """The externalId a relation value refers to: a string, or the externalId of
+    {"externalId": ..., "relationData": ...}"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return value.get("externalId", value.get("external_id"))
+    return None
+
+
+def resolve_references(
+    items: list[dict[str, Any]],
+    state: ImportState,
+    model_manager: ModelManagerClass = ModelManager,
+) -> None:
+    """Replace the externalIds that items refer to with the uids of their rows.
+    Values that are not the externalId of any row are left for validation: they
+    may be the uids of nodes already in the database."""
+    slots = [slot for item in items for slot in find_references(item, model_manager)]
+    uids = state.uids_by_external_id(
+        key for related, index in slots if (key := reference_key(related[index]))
+    )
+    for related, index in slots:
+        value = related[index]
+        uid = uids.get(reference_key(value))
+        if uid is None:
+            continue
+        if isinstance(value, dict):
+            value = {
+                key: data
+                for key, data in value.items()
+                if key not in ("externalId", "external_id")
+            }
+            related[index] = {**value, "uid": uid}
+        else:
+            related[index] = uid
+
+
+def prepare_chunk(
+    start: int,
+    items: list[dict[str, Any]],
+    state: ImportState,
+    model_manager: ModelManagerClass = ModelManager,
+) -> list[dict[str, Any]]:
+    """Give the rows of a chunk their uids, and resolve their references"""
+    for item, uid in zip(items, state.row_uids(start, len(items))):
+        item.pop("externalId", None)
+        item.pop("external_id", None)
+        item["uid"] = uid
+    resolve_references(items, state, model_manager)
+    return items
+
+
+async def import_file(
+    executor: QueryExecutor,
+    path: Path | str,
+    state_path: Optional[Path | str] = None,
+    format: Optional[str] = None,
+    user: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    transaction_size: int = DEFAULT_TRANSACTION_SIZE,
+    model_manager: ModelManagerClass = ModelManager,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> ImportReport:
+    """Import the rows of a JSON Lines or CSV file, resuming from the checkpoints
+    in the state file (by default, the file's path with .import-state added) if an
+    earlier import of it stopped. Raises StreamingImportError at the first chunk
+    with invalid rows, with the errors of each, or with a transaction that failed,
+    once the chunks before it have been imported."""
+
+    path = Path(path)
+    state = ImportState(
+        Path(state_path) if state_path else path.with_name(path.name + ".import-state")
+    )
+    format = format or file_format(path)
+    report = ImportReport()
+    start_time = time.perf_counter()
+
+    try:
+        for phase in PHASES:
+            checkpoint = state.checkpoint(phase)
+            if checkpoint is None:
+                done = 0
+                state.save_checkpoint(phase, done)
+            elif checkpoint[1]:
+                continue
+            else:
+                done = checkpoint[0]
+                logger.info(f"Resuming {phase} at row {done}")
+            rows = read_items(path, format, model_manager)
+            for start, items in chunked(rows, chunk_size, done):
+                if phase == "index":
+                    state.add_rows(start, items)
+                else:
+                    failures = len(report.failures)
+                    await write_chunk(
+                        executor,
+                        phase,
+                        start,
+                        prepare_chunk(start, items, state, model_manager),
+                        user,
+                        batch_size,
+                        transaction_size,
+                        model_manager,
+                        report,
+                    )
+                    # The checkpoint is not moved past a chunk not fully written,
+                    # so that resuming writes it again
+                    if failed := report.failures[failures:]:
+                        raise StreamingImportError(
+                            f"{len(failed)} transactions failed writing the "
+                            f"{phase} of rows {start} to {start + len(items) - 1}: "
+                            f"{failed[0].error}"
+                        )
+                done = start + len(items)
+                state.save_checkpoint(phase, done)
+                if progress is not None:
+                    progress(phase, done)
+            state.save_checkpoint(phase, done, complete=True)
+        report.items = state.row_count()
+    finally:
+        state.close()
+
+    report.seconds = time.perf_counter() - start_time
+    return report
+
+
+async def write_chunk(
+    executor: QueryExecutor,
+    phase: str,
+    start: int,
+    items: list[dict[str, Any]],
+    user: Optional[str],
+    batch_size: int,
+    transaction_size: int,
+    model_manager: ModelManagerClass,
+    report: ImportReport,
+) -> None:
+    try:
+        nodes, relations, _ = build_rows(items, user, model_manager)
+    except BulkImportError as e:
+        errors = [
+            {"row": start + error["index"], "errors": error["errors"]}
+            for error in e.errors
+        ]
+        raise StreamingImportError(
+            f"{len(errors)} invalid rows in rows {start} to {start + len(items) - 1}",
+            errors,
+        )
+    if phase == "nodes":
+        await write_row_groups(
+            executor, nodes, phase, report, batch_size, transaction_size
+        )
+    if phase == "relations":
+        await write_item_row_groups(
+            executor, relations, phase, report, batch_size, transaction_size
+        )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from pros_core.db.executor import ThreadpoolQueryExecutor
+    from pros_core.db.schema_sync import import_settings
+    from pros_core.setup_utils import discover_apps, setup_model_manager
+
+    parser = argparse.ArgumentParser(
+        prog="python -m pros_core.db.streaming_import",
+        description="Import the rows of a JSON Lines or CSV file, resuming an "
+        "earlier import of it that stopped",
+    )
+    parser.add_argument("settings", help="the app settings, as module:attribute")
+    parser.add_argument("path", help="the file to import")
+    parser.add_argument("--format", choices=["jsonl", "csv"])
+    parser.add_argument(
+        "--state", help="where to keep the state of the import, to resume from"
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--transaction-size", type=int, default=DEFAULT_TRANSACTION_SIZE
+    )
+    parser.add_argument("--user", help="to record as having created the nodes")
+    args = parser.parse_args(argv)
+
+    installed_apps = discover_apps(import_settings(args.settings))
+    setup_model_manager(installed_apps.models, installed_apps.traits, lazy=True)
+    start = time.perf_counter()
+
+    def progress(phase: str, rows: int) -> None:
+        print(
+            f"{phase}: {rows} rows done ({time.perf_counter() - start:.0f}s)",
+            flush=True,
+        )
+
+    try:
+        report = asyncio.run(
+            import_file(
+                ThreadpoolQueryExecutor(),
+                args.path,
+                state_path=args.state,
+                format=args.format,
+                user=args.user,
+                chunk_size=args.chunk_size,
+                batch_size=args.batch_size,
+                transaction_size=args.transaction_size,
+                progress=progress,
+            )
+        )
+    except StreamingImportError as e:
+        for error in e.errors:
+            print(f"row {error['row']}: {error['errors']}")
+        raise SystemExit(f"{e}; run again once fixed to resume")
+    print(report)
+    if report.failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
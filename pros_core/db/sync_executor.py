@@ -0,0 +1,245 @@
+"""Run synchronous neomodel calls (node.save(), queries in custom routers) from
+async request handlers, in a thread pool of their own.
+
+Starlette's threadpool is shared by every sync endpoint and dependency, and its
+queue is unbounded, so a burst of slow writes can hold all its threads, and all
+the database connections, while the requests behind them wait indefinitely. A
+SyncExecutor has a fixed number of threads (sized below the database connection
+pool), and a bounded queue in front of them: calls beyond it are rejected at once
+(SyncExecutorBusy, a 503), and calls that are not done within their timeout are
+abandoned (SyncCallTimeout, a 504).
+
+    sync_executor = get_sync_executor()
+    await sync_executor.run(person.save)
+
+A call that has started cannot be stopped by its timeout: its thread carries on
+until it returns, and is counted as running meanwhile. A call that times out while
+still queued is not started.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi import Depends, FastAPI, Request, status
+from fastapi.responses import JSONResponse
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_TIMEOUT = 30.0
+
+
+class SyncExecutorBusy(RuntimeError):
+    """Every thread is busy and the queue is full"""
+
+
+class SyncCallTimeout(TimeoutError):
+    """A call was not done within its timeout"""
+
+
+@dataclass(slots=True)
+class SyncExecutorMetrics:
+    max_workers: int
+    max_queue: int
+    running: int = 0
+    queued: int = 0
+    # The most calls queued at once
+    max_queued: int = 0
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    rejected: int = 0
+    # Of calls started, the total time spent queued
+    wait_seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class SyncExecutor:
+    """A bounded thread pool for synchronous calls, with a timeout per call and
+    metrics of its queue"""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="pros-sync"
+        )
+        self._lock = threading.Lock()
+        self._metrics = SyncExecutorMetrics(max_workers, max_queue)
+
+    @classmethod
+    def from_settings(cls, settings) -> "SyncExecutor":
+        return cls(
+            max_workers=getattr(
+                settings, "SYNC_EXECUTOR_MAX_WORKERS", DEFAULT_MAX_WORKERS
+            ),
+            max_queue=getattr(settings, "SYNC_EXECUTOR_MAX_QUEUE", DEFAULT_MAX_QUEUE),
+            timeout=getattr(settings, "SYNC_EXECUTOR_TIMEOUT", DEFAULT_TIMEOUT),
+        )
+
+    @property
+    def metrics(self) -> SyncExecutorMetrics:
+        """A snapshot of the metrics"""
+        with self._lock:
+            return SyncExecutorMetrics(**self._metrics.as_dict())
+
+    def _submit(self) -> None:
+        with self._lock:
+            metrics = self._metrics
+            if metrics.running + metrics.queued >= self.max_workers + self.max_queue:
+                metrics.rejected += 1
+                raise SyncExecutorBusy(
+                    f"{metrics.running} calls running and {metrics.queued} queued"
+                )
+            metrics.submitted += 1
+            metrics.queued += 1
+            metrics.max_queued = max(metrics.max_queued, metrics.queued)
+
+    def _call(
+        self,
+        submitted: float,
+        context: contextvars.Context,
+        fn: Callable[..., T],
+        *args,
+        **kwargs,
+    ) -> T:
+        with self._lock:
+            self._metrics.queued -= 1
+            self._metrics.running += 1
+            self._metrics.wait_seconds += time.perf_counter() - submitted
+        try:
+            result = context.run(fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._metrics.failed += 1
+            raise
+        else:
+            with self._lock:
+                self._metrics.completed += 1
+            return result
+        finally:
+            with self._lock:
+                self._metrics.running -= 1
+
+    def _cancelled(self, future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self._metrics.queued -= 1
+
+    async def run(
+        self,
+        fn: Callable[..., T],
+        *args,
+        timeout: Optional[float] = ...,  # type: ignore
+        **kwargs,
+    ) -> T:
+        """Call fn(*args, **kwargs) in the pool, waiting at most timeout seconds (by
+        default, the executor's timeout; None to wait as long as it takes) for it
+        to be started and done"""
+        if timeout is ...:
+            timeout = self.timeout
+        self._submit()
+        try:
+            future = self._pool.submit(
+                self._call,
+                time.perf_counter(),
+                contextvars.copy_context(),
+                fn,
+                *args,
+                **kwargs,
+            )
+        except RuntimeError:
+            # Shut down
+            with self._lock:
+                self._metrics.queued -= 1
+            raise
+        future.add_done_callback(self._cancelled)
+        try:
+            # On timeout (or if the request is cancelled), the call is cancelled if
+            # it is still queued
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._metrics.timed_out += 1
+            raise SyncCallTimeout(
+                f"{getattr(fn, '__qualname__', fn)} not done within {timeout}s"
+            )
+
+    def wrap(self, fn: Callable[..., T]) -> Callable[..., Any]:
+        """An async version of fn, run in the pool"""
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(fn, *args, **kwargs)
+
+        return wrapper
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_sync_executor: Optional[SyncExecutor] = None
+
+
+def set_sync_executor(executor: Optional[SyncExecutor]) -> None:
+    global _sync_executor
+    _sync_executor = executor
+
+
+def get_sync_executor() -> SyncExecutor:
+    global _sync_executor
+    if _sync_executor is None:
+        _sync_executor = SyncExecutor()
+    return _sync_executor
+
+
+SyncExecutorDependency = Depends(get_sync_executor)
+
+
+async def sync_executor_busy_handler(request: Request, exc: SyncExecutorBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+
+async def sync_call_timeout_handler(request: Request, exc: SyncCallTimeout):
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": str(exc)}
+    )
+
+
+def setup_sync_executor(_app: FastAPI, settings) -> SyncExecutor:
+    """Create the app's sync executor from the settings, answering requests it
+    rejects or that time out with 503 and 504, and shutting it down with the app"""
+    executor = SyncExecutor.from_settings(settings)
+    set_sync_executor(executor)
+    _app.add_exception_handler(SyncExecutorBusy, sync_executor_busy_handler)
+    _app.add_exception_handler(SyncCallTimeout, sync_call_timeout_handler)
+
+    def shutdown_sync_executor():
+        executor.shutdown()
+        if _sync_executor is executor:
+            set_sync_executor(None)
+
+    _app.add_event_handler("shutdown", shutdown_sync_executor)
+    return executor
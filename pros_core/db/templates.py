@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Iterable, Optional
+
+from pros_core.models import BaseNode
+
+# Names of the fields to project, or None for all of them
+FieldSelection = Optional[frozenset[str]]
+
+QueryTemplateKey = tuple[type[BaseNode], str, FieldSelection]
+
+
+def field_selection(fields: Optional[Iterable[str]]) -> FieldSelection:
+    """Normalize a selection of fields, so that the same selection always
+    has the same key"""
+    return None if fields is None else frozenset(fields)
+
+
+class QueryTemplateRegistryClass:
+    """Registry of Cypher query text, keyed by (model class, operation, fields).
+
+    Queries are built once for each key, and take all values as parameters,
+    so the same query text is sent to Neo4j for every request for a model:
+    it is then planned once and found in the plan cache thereafter."""
+
+    def __init__(self):
+        self._templates: dict[QueryTemplateKey, str] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: QueryTemplateKey, builder: Callable[[], str]) -> str:
+        """Return the query registered under key, calling builder to create
+        and register it if there is none"""
+        with self._lock:
+            try:
+                template = self._templates[key]
+                self.hits += 1
+                return template
+            except KeyError:
+                self.misses += 1
+            template = self._templates[key] = builder()
+            return template
+
+    def get(self, key: QueryTemplateKey) -> Optional[str]:
+        return self._templates.get(key)
+
+    def clear(self) -> None:
+        """Remove all queries, as they are built from the ModelManager's models
+        and must be rebuilt when it is set up again"""
+        with self._lock:
+            self._templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "templates": len(self._templates),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def __contains__(self, key: QueryTemplateKey) -> bool:
+        return key in self._templates
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+
+QueryTemplateRegistry = QueryTemplateRegistryClass()
+
+
+def warm_up_query_templates(model_manager, profiler=None) -> None:
+    """Build the queries of every operation on every model, so that no query
+    text has to be built while serving a request"""
+
+    # Imported here, as the query builders register their queries with this module
+    from pros_core.db.pagination import list_template
+    from pros_core.db.projection import build_detail_query
+    from pros_core.db.search import fetch_by_uid_template, search_template
+    from pros_core.setup_utils.startup_profiler import StartupProfiler
+
+    profiler = profiler or StartupProfiler(enabled=False)
+    QueryTemplateRegistry.clear()
+    for app_model in model_manager.models:
+        with profiler.model("query_templates", app_model.model_name):
+            build_detail_query(app_model)
+            search_template(app_model)
+            fetch_by_uid_template(app_model)
+            for seek in (False, True):
+                for unlabelled in (False, True):
+                    list_template(app_model, seek, unlabelled)
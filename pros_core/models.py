@@ -3,7 +3,7 @@ from __future__ import annotations
 import datetime
 import inspect
 from collections import defaultdict
-from typing import TYPE_CHECKING, DefaultDict, Optional, Type
+from typing import TYPE_CHECKING, Any, Callable, DefaultDict, Optional, Type
 
 from neomodel import (
     BooleanProperty,
@@ -30,6 +30,23 @@ REVERSE_RELATIONS: DefaultDict[str, DefaultDict[str, dict]] = defaultdict(
     lambda: defaultdict(dict)
 )
 
+# Results of inherited_labels, defined_properties and traits_as_direct_base, keyed
+# by (class, method, *args). Class hierarchies are fixed once models are defined,
+# so these only need computing once per class; defining any new node class clears
+# the cache, in case it changes the hierarchy of classes already cached.
+REFLECTION_CACHE: dict[tuple, Any] = {}
+
+# Called with each newly defined node class
+CLASS_DEFINITION_HOOKS: list[Callable[[type], None]] = []
+
+# Called with each node after it is saved, and after it is deleted
+NODE_SAVE_HOOKS: list[Callable[[AbstractNode], None]] = []
+NODE_DELETE_HOOKS: list[Callable[[AbstractNode], None]] = []
+
+
+def clear_reflection_cache() -> None:
+    REFLECTION_CACHE.clear()
+
 
 class OverriddenStructuredNode(StructuredNode):
     __abstract_node__ = True
@@ -64,6 +81,11 @@ class OverriddenStructuredNode(StructuredNode):
 
     @classmethod
     def traits_as_direct_base(cls) -> set[AbstractTrait]:
+        try:
+            return set(REFLECTION_CACHE[(cls, "traits_as_direct_base")])
+        except KeyError:
+            pass
+
         traits_as_direct_bases = []
         if getattr(cls, "__is_trait__", False):
             traits_as_direct_bases.append(cls)
@@ -75,6 +97,10 @@ class OverriddenStructuredNode(StructuredNode):
                     traits_as_direct_bases.append(base)
                 else:
                     continue
+
+        REFLECTION_CACHE[(cls, "traits_as_direct_base")] = frozenset(
+            traits_as_direct_bases
+        )
         return set(traits_as_direct_bases)
 
     @classmethod
@@ -85,16 +111,27 @@ class OverriddenStructuredNode(StructuredNode):
         :return: list
         """
         # Overrides the neomodel StructuredNode method to exclude labels from
-        # inherited traits
+        # inherited traits. A trait keeps its own label, as neomodel requires
+        # every node class to have a distinct set of labels.
+
+        try:
+            return list(REFLECTION_CACHE[(cls, "inherited_labels")])
+        except KeyError:
+            pass
 
         inherited = []
         for scls in cls.__mro__:
             if hasattr(scls, "__label__"):
-                if cls.is_abstract_trait(scls) and scls not in cls.__bases__:
+                if (
+                    cls.is_abstract_trait(scls)
+                    and scls is not cls
+                    and scls not in cls.__bases__
+                ):
                     continue
 
                 inherited.append(scls.__label__)
 
+        REFLECTION_CACHE[(cls, "inherited_labels")] = tuple(inherited)
         return inherited
 
     @classmethod
@@ -102,14 +139,21 @@ class OverriddenStructuredNode(StructuredNode):
         # Overrides the neomodel StructureNode method to get only properties/relationships
         # that come from current class, parent BaseNodes and direct traits
 
+        cache_key = (cls, "defined_properties", aliases, properties, rels)
+        try:
+            return dict(REFLECTION_CACHE[cache_key])
+        except KeyError:
+            pass
+
         from neomodel import AliasProperty, Property
         from neomodel.relationship_manager import RelationshipDefinition
 
+        traits_as_direct_base = cls.traits_as_direct_base()
         props = {}
         for baseclass in reversed(cls.__mro__):
             if (
                 cls.is_abstract_trait(baseclass)
-                and baseclass not in cls.traits_as_direct_base()
+                and baseclass not in traits_as_direct_base
             ):
                 continue
             props.update(
@@ -126,13 +170,18 @@ class OverriddenStructuredNode(StructuredNode):
                 )
             )
 
-        return props
+        REFLECTION_CACHE[cache_key] = props
+        return dict(props)
 
     def __init_subclass__(cls) -> None:
         # Add to REVERSE_RELATIONS dict the info from the side of the possessing class
 
         super().__init_subclass__()
 
+        clear_reflection_cache()
+        for hook in CLASS_DEFINITION_HOOKS:
+            hook(cls)
+
         # Introspect the class for relations, and add the relation information
         # to the REVERSE_RELATIONS dict
         for k, v in cls.__dict__.items():
@@ -293,6 +342,16 @@ class AbstractNode(BaseNode):
         self.real_type = type(self).__name__
         super().save(*args, **kwargs)
 
+    def post_save(self):
+        # Called by neomodel
+        for hook in NODE_SAVE_HOOKS:
+            hook(self)
+
+    def post_delete(self):
+        # Called by neomodel
+        for hook in NODE_DELETE_HOOKS:
+            hook(self)
+
     @classmethod
     def as_inline_createable(
         cls,
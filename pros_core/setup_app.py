@@ -1,21 +1,105 @@
 from fastapi import FastAPI
 from pros_core.auth import build_auth
+from pros_core.db import (
+    AsyncDriverQueryExecutor,
+    LabelIndex,
+    ThreadpoolQueryExecutor,
+    get_query_executor,
+    set_label_index,
+    set_query_executor,
+    setup_sync_executor,
+    sync_schema,
+    warm_up_query_templates,
+)
 from pros_core.setup_utils import (
     ModelManager,
+    SchemaCache,
+    StartupProfiler,
     build_routes,
-    import_models,
+    discover_apps,
     import_routers,
-    import_traits,
+    preload_for_fork,
     setup_model_manager,
+    warm_up_pydantic_return_models,
 )
 from pydantic import BaseSettings
 
 
+def setup_label_index(_app: FastAPI, model_names: list[str]) -> None:
+    """Create the in-memory label index of the models, to be filled from the
+    database when the app starts"""
+    label_index = LabelIndex.for_models(ModelManager, model_names)
+    set_label_index(label_index)
+
+    async def load_label_index():
+        await label_index.load(get_query_executor(), ModelManager)
+
+    _app.add_event_handler("startup", load_label_index)
+
+
+def setup_async_driver(_app: FastAPI, settings: BaseSettings) -> None:
+    """Run the queries of routes with the neo4j driver's async API, closing its
+    connections when the app shuts down"""
+    executor = AsyncDriverQueryExecutor.from_settings(settings)
+    set_query_executor(executor)
+    _app.add_event_handler("shutdown", executor.close)
+
+
 def setup_app(_app: FastAPI, settings: BaseSettings) -> FastAPI:
-    import_routers(_app, settings)
-    models = import_models(settings)
-    traits = import_traits(settings)
-    setup_model_manager(models, traits)
-    build_routes(_app, models, ModelManager)
-    build_auth(_app)
+    profiler = StartupProfiler.from_settings(settings)
+
+    with profiler.phase("discover_apps"):
+        installed_apps = discover_apps(settings)
+    models = installed_apps.models
+    traits = installed_apps.traits
+    with profiler.phase("import_routers"):
+        import_routers(_app, settings)
+
+    schema_cache = SchemaCache.from_settings(settings)
+    loaded = False
+    if schema_cache is not None:
+        with profiler.phase("schema_cache_load"):
+            loaded = schema_cache.load(models + traits, ModelManager)
+    if not loaded:
+        with profiler.phase("setup_model_manager"):
+            setup_model_manager(models, traits, lazy=True)
+        if not getattr(settings, "LAZY_PYDANTIC_MODELS", False):
+            with profiler.phase("pydantic_return_models"):
+                warm_up_pydantic_return_models(ModelManager, profiler)
+        if schema_cache is not None:
+            with profiler.phase("schema_cache_save"):
+                schema_cache.save(models + traits, ModelManager)
+
+    if getattr(settings, "SYNC_SCHEMA_ON_STARTUP", False):
+        with profiler.phase("sync_schema"):
+            sync_schema(ModelManager)
+
+    sync_executor = setup_sync_executor(_app, settings)
+    query_executor = getattr(settings, "QUERY_EXECUTOR", "threadpool")
+    if query_executor == "async_driver":
+        with profiler.phase("query_executor"):
+            setup_async_driver(_app, settings)
+    elif query_executor == "sync_executor":
+        set_query_executor(ThreadpoolQueryExecutor(sync_executor))
+
+    with profiler.phase("query_templates"):
+        warm_up_query_templates(ModelManager, profiler)
+    label_index_models = getattr(settings, "LABEL_INDEX_MODELS", None)
+    if label_index_models:
+        with profiler.phase("label_index"):
+            setup_label_index(_app, label_index_models)
+    else:
+        set_label_index(None)
+
+    with profiler.phase("build_routes"):
+        build_routes(_app, models, ModelManager, profiler)
+    with profiler.phase("build_auth"):
+        build_auth(_app)
+
+    if getattr(settings, "PRELOAD_FOR_FORK", False):
+        with profiler.phase("preload_for_fork"):
+            preload_for_fork(_app, ModelManager)
+
+    profiler.finish()
+    profiler.log_report(getattr(settings, "STARTUP_PROFILE_PATH", None))
     return _app
@@ -1,4 +1,12 @@
 from .build_routers import build_routes
+from .discover_apps import discover_apps
 from .import_models import import_models, import_traits
 from .import_routers import import_routers
-from .model_manager import ModelManager, setup_model_manager
+from .model_manager import (
+    ModelManager,
+    setup_model_manager,
+    warm_up_pydantic_return_models,
+)
+from .preload import preload_for_fork
+from .schema_cache import SchemaCache
+from .startup_profiler import StartupProfiler
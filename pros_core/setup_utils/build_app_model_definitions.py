@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import inspect
+from collections.abc import Mapping
 from dataclasses import dataclass
-from typing import Self
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, Optional, Self, TypeVar
 
-from camel_converter import to_pascal
-from dotted_dict import DottedDict
+from camel_converter import to_camel, to_pascal, to_snake
 from neomodel import (
     Property,
     RelationshipDefinition,
@@ -16,14 +17,43 @@ from ordered_set import OrderedSet
 from pros_core.models import (
     REVERSE_RELATIONS,
     AbstractNode,
+    AbstractTrait,
     AbstractReificationRelation,
     BaseNode,
     ChildNodeRelation,
 )
+from pros_core.setup_utils.class_hierarchy import ClassHierarchy, ClassHierarchyIndex
 from pydantic import BaseModel
 
+T = TypeVar("T")
 
-@dataclass
+# Metadata items that would otherwise be duplicated between AppModels: e.g. the
+# AppModelItem for a class, which is in the subclasses of each of its ancestors,
+# or the RelationshipType of a relationship inherited by every subclass. Keyed by
+# (kind, object), and cleared by setup_model_manager, as the class hierarchy
+# may have changed since the last setup.
+INTERNED_ITEMS: dict[tuple, Any] = {}
+
+
+def clear_interned_items() -> None:
+    INTERNED_ITEMS.clear()
+
+
+def declares_abstract(model: type[BaseNode]) -> bool:
+    """Whether __abstract__ is set on the model itself: unlike is_abstract, which
+    subclasses of an abstract model inherit, this leaves them concrete"""
+    return model.__dict__.get("__abstract__", False)
+
+
+def intern_item(key: tuple, build: Callable[[], T]) -> T:
+    try:
+        return INTERNED_ITEMS[key]
+    except KeyError:
+        item = INTERNED_ITEMS[key] = build()
+        return item
+
+
+@dataclass(slots=True, frozen=True)
 class AppModelItem:
     model_name: str
     model: type[AbstractNode]
@@ -39,7 +69,7 @@ class AppModelItem:
         return f"<HashedAppModelItem model_name='{self.model_name}' model={repr(self.model)} app_name='{self.app_name}'>"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SubclassHierarchyItem:
     app_name: str
     model_name: str
@@ -53,13 +83,54 @@ class SubclassHierarchyItem:
         return hash(self.model_name)
 
 
+class PropertyMap(Mapping):
+    """Read-only mapping of property names to neomodel properties, which
+    also allows access to properties as attributes"""
+
+    __slots__ = ("_properties",)
+
+    def __init__(self, properties: dict[str, Property]):
+        object.__setattr__(self, "_properties", properties)
+
+    def __getitem__(self, name: str) -> Property:
+        return self._properties[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._properties)
+
+    def __len__(self) -> int:
+        return len(self._properties)
+
+    def __getattr__(self, name: str) -> Property:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._properties[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __reduce__(self):
+        return (type(self), (self._properties,))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._properties!r})"
+
+
 class AppModelSet(OrderedSet):
     def __getitem__(self, item) -> AppModel:
         return ModelManager(item)
 
     def __contains__(self, obj: str | type[AbstractNode]) -> bool:
         if isinstance(obj, str):
-            obj = to_pascal(obj)
+            # Resolve any accepted spelling of a model name to the model name
+            # using the ModelManager's alias table, rather than normalizing it
+            if (app_model := ModelManager.aliases.get(obj)) is not None:
+                obj = app_model.model_name
+            else:
+                obj = to_pascal(obj)
             return super().__contains__(obj)
         else:
             return super().__contains__(obj.__name__)
@@ -68,7 +139,7 @@ class AppModelSet(OrderedSet):
         return f"<{__class__.__name__} {', '.join(repr(item) for item in self)}>"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RelationshipType:
     target_model_name: str
     relation_model: type[RelationshipDefinition]
@@ -80,14 +151,14 @@ class RelationshipType:
 
     @property
     def target_app_model(self) -> AppModel:
-        return ModelManager.get_model(self.target_model_name)
+        return ModelManager.get_linked_model(self.target_model_name)
 
     @property
     def target_model(self) -> type[AbstractNode]:
-        return ModelManager.get_model(self.target_model_name).model_class
+        return self.target_app_model.model_class
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ChildNodeRelationType:
     child_model_name: str
     relation_label: str
@@ -95,14 +166,14 @@ class ChildNodeRelationType:
 
     @property
     def child_app_model(self):
-        return ModelManager.get_model(self.child_model_name)
+        return ModelManager.get_linked_model(self.child_model_name)
 
     @property
     def child_model(self):
-        return ModelManager.get_model(self.child_model_name).model_class
+        return self.child_app_model.model_class
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ReificationRelationshipType:
     target_model_name: str
     relation_model: type[RelationshipDefinition]
@@ -111,21 +182,21 @@ class ReificationRelationshipType:
 
     @property
     def target_app_model(self) -> AppModel:
-        return ModelManager.get_model(self.target_model_name)
+        return ModelManager.get_linked_model(self.target_model_name)
 
     @property
     def target_model(self) -> type[AbstractNode]:
-        return ModelManager.get_model(self.target_model_name).model_class
+        return self.target_app_model.model_class
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class AppModel:
     app_name: str
     model_class: BaseNode
     model_name: str
     _mm: ModelManagerClass
     meta: dict
-    properties: dict
+    properties: PropertyMap
     relationships: dict[str, RelationshipType]
     child_nodes: dict[str, ChildNodeRelationType]
     related_reifications: dict[str, ReificationRelationshipType]
@@ -133,7 +204,17 @@ class AppModel:
     subclasses: AppModelSet[AppModelItem]
     parent_classes: AppModelSet[AppModelItem]
     reverse_relationships: dict[str, dict]
-    pydantic_return_model: type[BaseModel] = None
+
+    @property
+    def pydantic_return_model(self) -> type[BaseModel]:
+        """The pydantic return model for this model, built on first access"""
+        from pros_core.setup_utils.build_pydantic_return_models import (
+            build_pydantic_return_model,
+        )
+
+        # Kept in the pydantic model registry rather than on the AppModel, which
+        # guarantees that concurrent first accesses all get the same model
+        return build_pydantic_return_model(self.model_class)
 
 
 class ModelManagerException(Exception):
@@ -146,8 +227,28 @@ class ModelManagerClass:
         self.pros_models_by_model_name = {}
         self.pros_models_by_model_class = {}
 
+        # Every accepted spelling of every model identifier, so that get_model
+        # is a single dict lookup (see build_aliases)
+        self.aliases: dict[str | type[BaseNode], AppModel] = {}
+
+        # The AppModel each relationship, child node and reification target
+        # name resolves to (see link_app_models)
+        self.links: Mapping[str, AppModel] = MappingProxyType({})
+
+        # Compact integer ids for each model class, and bitsets over those ids
+        # (see build_type_index)
+        self._model_ids: dict[type[BaseNode], int] = {}
+        self._ancestor_bits: list[int] = []
+        self._descendant_bits: list[int] = []
+        self._trait_bits: list[int] = []
+        self._concrete_bits: int = 0
+        self._concrete_descendants: list[tuple[type[BaseNode], ...]] = []
+        self._classes_with_trait: list[tuple[type[BaseNode], ...]] = []
+
     def add_model(self, app_model: AppModel) -> None:
         """Adds an AppModel to the ModelManager"""
+        if app_model.model_class not in self._model_ids:
+            self._model_ids[app_model.model_class] = len(self._model_ids)
         self.pros_models_by_app_name_model_name[
             f"{to_pascal(app_model.app_name).lower()}.{to_pascal(app_model.model_name).lower()}"
         ] = app_model
@@ -155,9 +256,20 @@ class ModelManagerClass:
             to_pascal(app_model.model_name).lower()
         ] = app_model
         self.pros_models_by_model_class[app_model.model_class] = app_model
+        self.aliases.update(dict.fromkeys(build_aliases(app_model), app_model))
 
     def get_model(self, model_identifier: BaseNode | str) -> AppModel:
         """Get an AppModel by model class, qualified name ('<AppName>.<ModelName>'), or unqualified name"""
+        try:
+            return self.aliases[model_identifier]
+        except (KeyError, TypeError):
+            return self.get_model_by_normalized_identifier(model_identifier)
+
+    def get_model_by_normalized_identifier(
+        self, model_identifier: BaseNode | str
+    ) -> AppModel:
+        """Get an AppModel by normalizing the identifier, for spellings
+        not in the alias table"""
 
         # Get by class
         if inspect.isclass(model_identifier):
@@ -184,6 +296,14 @@ class ModelManagerClass:
             except KeyError:
                 raise ModelManagerException(f"Model <{model_identifier}> not found.")
 
+    def get_linked_model(self, model_name: str) -> AppModel:
+        """Get the AppModel a relation target name was linked to, looking it up
+        if it was not linked (e.g. before link_app_models has run)"""
+        try:
+            return self.links[model_name]
+        except KeyError:
+            return self.get_model(model_name)
+
     # Make subscriptable using all options
     __getitem__ = get_model
     __call__ = get_model
@@ -193,6 +313,133 @@ class ModelManagerClass:
         """Get list of all AppModels in Model Manager"""
         return list(cls.pros_models_by_app_name_model_name.values())
 
+    def build_type_index(self, hierarchy: ClassHierarchyIndex) -> None:
+        """Precompute, for each model id, bitsets of its ancestors, descendants
+        and directly applied traits, so that subtype and trait checks are
+        constant-time bit operations rather than MRO walks"""
+
+        count = len(self._model_ids)
+        ancestor_bits = [1 << i for i in range(count)]
+        descendant_bits = [1 << i for i in range(count)]
+        trait_bits = [0] * count
+        concrete_bits = 0
+
+        for model, model_id in self._model_ids.items():
+            if not (entry := hierarchy.get(model)):
+                continue
+            for ancestor in entry.ancestors:
+                if (ancestor_id := self._model_ids.get(ancestor)) is not None:
+                    ancestor_bits[model_id] |= 1 << ancestor_id
+                    descendant_bits[ancestor_id] |= 1 << model_id
+            for trait in entry.traits:
+                if (trait_id := self._model_ids.get(trait)) is not None:
+                    trait_bits[model_id] |= 1 << trait_id
+            if not declares_abstract(model) and not model.__is_trait__:
+                concrete_bits |= 1 << model_id
+
+        concrete_descendants = [()] * count
+        classes_with_trait = [()] * count
+        for model, model_id in self._model_ids.items():
+            if not (entry := hierarchy.get(model)):
+                continue
+            concrete_descendants[model_id] = tuple(
+                m
+                for m in (model, *entry.descendants)
+                if (m_id := self._model_ids.get(m)) is not None
+                and concrete_bits >> m_id & 1
+            )
+            classes_with_trait[model_id] = tuple(
+                m for m in entry.classes_with_trait if m in self._model_ids
+            )
+
+        self._ancestor_bits = ancestor_bits
+        self._descendant_bits = descendant_bits
+        self._trait_bits = trait_bits
+        self._concrete_bits = concrete_bits
+        self._concrete_descendants = concrete_descendants
+        self._classes_with_trait = classes_with_trait
+
+    def _model_id(self, model_identifier: type[BaseNode] | str) -> int:
+        try:
+            model_id = self._model_ids[model_identifier]
+        except (KeyError, TypeError):
+            model_id = self._model_ids[self.get_model(model_identifier).model_class]
+        if model_id >= len(self._ancestor_bits):
+            raise ModelManagerException(
+                f"Model {model_identifier} was added after the type index was built."
+            )
+        return model_id
+
+    def is_subclass(
+        self,
+        model_identifier: type[BaseNode] | str,
+        parent_identifier: type[BaseNode] | str,
+    ) -> bool:
+        """Whether a model is the parent model or one of its subclasses (not including traits)"""
+        return bool(
+            self._ancestor_bits[self._model_id(model_identifier)]
+            >> self._model_id(parent_identifier)
+            & 1
+        )
+
+    def has_trait(
+        self,
+        model_identifier: type[BaseNode] | str,
+        trait_identifier: type[AbstractTrait] | str,
+    ) -> bool:
+        """Whether a trait is applied directly to a model"""
+        return bool(
+            self._trait_bits[self._model_id(model_identifier)]
+            >> self._model_id(trait_identifier)
+            & 1
+        )
+
+    def is_concrete(self, model_identifier: type[BaseNode] | str) -> bool:
+        """Whether a model is neither abstract nor a trait"""
+        return bool(self._concrete_bits >> self._model_id(model_identifier) & 1)
+
+    def concrete_descendants(
+        self, model_identifier: type[BaseNode] | str
+    ) -> tuple[type[BaseNode], ...]:
+        """The model (unless abstract) and all its non-abstract subclasses"""
+        return self._concrete_descendants[self._model_id(model_identifier)]
+
+    def classes_with_trait(
+        self, trait_identifier: type[AbstractTrait] | str
+    ) -> tuple[type[BaseNode], ...]:
+        """The models to which a trait is directly applied"""
+        return self._classes_with_trait[self._model_id(trait_identifier)]
+
+
+def build_name_spellings(name: str) -> set[str]:
+    snake = to_snake(name)
+    return {
+        name,
+        name.lower(),
+        snake,
+        to_camel(snake),
+        to_pascal(snake),
+        to_pascal(name).lower(),
+    }
+
+
+def build_aliases(app_model: AppModel) -> list[str | type[BaseNode]]:
+    """All the identifiers by which an AppModel can be looked up: its class,
+    and its model name (optionally qualified with its app name) in snake,
+    camel, pascal and lower case"""
+
+    model_names = build_name_spellings(app_model.model_name)
+    app_names = build_name_spellings(app_model.app_name)
+    return [
+        app_model.model_class,
+        *model_names,
+        *(
+            f"{app_name}.{model_name}"
+            for app_name in app_names
+            for model_name in model_names
+        ),
+    ]
+
 
 def build_related_reification_dict(
     rel: type[RelationshipDefinition],
@@ -209,7 +456,9 @@ def build_related_reifications(
     model: type[AbstractNode],
 ) -> dict[str, ReificationRelationshipType]:
     related_reifications: dict[str, ReificationRelationshipType] = {
-        n: build_related_reification_dict(p)
+        n: intern_item(
+            ("related_reification", p), lambda p=p: build_related_reification_dict(p)
+        )
         for n, p in model.__all_relationships__
         if p.definition["direction"] == 1
         and issubclass(p.definition["model"], AbstractReificationRelation)
@@ -220,31 +469,49 @@ def build_related_reifications(
 def build_subclasses_hierarchy(
     model: type[AbstractNode],
 ) -> list[SubclassHierarchyItem]:
+    if entry := ClassHierarchy.get(model):
+        subclasses = entry.direct_subclasses
+    else:
+        subclasses = model.__subclasses__()
+
     return AppModelSet(
-        SubclassHierarchyItem(
-            model_name=m.__name__.lower(),
-            model=m,
-            app_name=".".join(m.__module__.split(".")[:-1]),
-            subclasses=build_subclasses_hierarchy(m),
+        intern_item(
+            ("subclass_hierarchy_item", m),
+            lambda m=m: SubclassHierarchyItem(
+                model_name=m.__name__.lower(),
+                model=m,
+                app_name=".".join(m.__module__.split(".")[:-1]),
+                subclasses=build_subclasses_hierarchy(m),
+            ),
         )
-        for m in model.__subclasses__()
+        for m in subclasses
+    )
+
+
+def build_app_model_item(model: type[AbstractNode]) -> AppModelItem:
+    return intern_item(
+        ("app_model_item", model),
+        lambda: AppModelItem(
+            model_name=model.__name__,
+            model=model,
+            app_name=".".join(model.__module__.split(".")[:-1]),
+        ),
     )
 
 
 def build_subclasses_set(model: type[AbstractNode]) -> list[AppModelItem]:
+    if entry := ClassHierarchy.get(model):
+        return AppModelSet(
+            build_app_model_item(subclass) for subclass in entry.descendants
+        )
+
     subclasses = AppModelSet()
 
     if not model.__subclasses__():
         return subclasses
 
     for subclass in model.__subclasses__():
-        subclasses.add(
-            AppModelItem(
-                model_name=subclass.__name__,
-                model=subclass,
-                app_name=".".join(subclass.__module__.split(".")[:-1]),
-            )
-        )
+        subclasses.add(build_app_model_item(subclass))
         subclasses |= build_subclasses_set(subclass)
     return subclasses
 
@@ -252,17 +519,16 @@ def build_subclasses_set(model: type[AbstractNode]) -> list[AppModelItem]:
 def build_parent_classes_set(
     model: type[AbstractNode],
 ) -> AppModelSet[AppModelItem]:
-    return AppModelSet(
-        [
-            AppModelItem(
-                model_name=m.__name__,
-                model=m,
-                app_name=".".join(m.__module__.split(".")[:-1]),
-            )
+    if entry := ClassHierarchy.get(model):
+        parents = entry.ancestors
+    else:
+        parents = [
+            m
             for m in inspect.getmro(model)
             if issubclass(m, AbstractNode) and m is not AbstractNode and m is not model
         ]
-    )
+
+    return AppModelSet([build_app_model_item(m) for m in parents])
 
 
 def build_relation_dict(rel: type[RelationshipDefinition]):
@@ -290,7 +556,7 @@ def build_relation_dict(rel: type[RelationshipDefinition]):
 
 def build_relationships(model: type[AbstractNode]) -> dict[str, RelationshipType]:
     relations: dict[str, RelationshipType] = {
-        n: build_relation_dict(p)
+        n: intern_item(("relationship", p), lambda p=p: build_relation_dict(p))
         for n, p in model.__all_relationships__
         if p.definition["direction"] == 1
         and not issubclass(
@@ -300,7 +566,7 @@ def build_relationships(model: type[AbstractNode]) -> dict[str, RelationshipType
     return relations
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ReverseRelationshipType:
     relationship_from_model_name: str
     relationship_from_model: BaseNode
@@ -315,10 +581,17 @@ def build_reverse_relationships(model) -> dict[str, ReverseRelationshipType]:
     """Reverse relations are defined in REVERSE RELATIONS but we need
     to also get the parent reverse relations"""
 
+    if entry := ClassHierarchy.get(model):
+        lineage = entry.lineage
+    else:
+        lineage = []
+        for parent_model in inspect.getmro(model):
+            if parent_model is AbstractNode:
+                break
+            lineage.append(parent_model)
+
     parent_reverse_relations = {}
-    for parent_model in inspect.getmro(model):
-        if parent_model is AbstractNode:
-            break
+    for parent_model in lineage:
         parent_reverse_relations = {
             **parent_reverse_relations,
             **REVERSE_RELATIONS[parent_model.__name__],
@@ -331,32 +604,39 @@ def build_reverse_relationships(model) -> dict[str, ReverseRelationshipType]:
 
     packed_reverse_relations = {}
     for rel_name, relation in reverse_relations.items():
-        relation_properties = [
-            property_name
-            for property_name, property in relation["relation"]
-            .definition["model"]
-            .__dict__.items()
-            if isinstance(property, Property)
-            and property_name not in {"reverse_name", "to_inline_createable"}
-        ]
-
-        rel = ReverseRelationshipType(
-            relationship_from_model_name=relation["relation_to"],
-            relationship_from_model=relation["relation_to_class"],
-            reverse_relationship_label=rel_name,
-            forward_relationship_label=relation["relationship_forward_name"],
-            relation_manager=relation["relationship_manager"],
-            has_relation_data=relation["relation"].definition["model"].__name__
-            != "Relation",
-            relation_properties=relation_properties,
+        packed_reverse_relations[rel_name] = intern_item(
+            ("reverse_relationship", relation["relation"], rel_name),
+            lambda rel_name=rel_name, relation=relation: build_reverse_relation_dict(
+                rel_name, relation
+            ),
         )
-
-        packed_reverse_relations[rel_name] = rel
     return packed_reverse_relations
 
 
-def build_properties(model: type[AbstractNode]) -> DottedDict[str, Property]:
-    return DottedDict(
+def build_reverse_relation_dict(rel_name: str, relation: dict) -> ReverseRelationshipType:
+    relation_properties = [
+        property_name
+        for property_name, property in relation["relation"]
+        .definition["model"]
+        .__dict__.items()
+        if isinstance(property, Property)
+        and property_name not in {"reverse_name", "to_inline_createable"}
+    ]
+
+    return ReverseRelationshipType(
+        relationship_from_model_name=relation["relation_to"],
+        relationship_from_model=relation["relation_to_class"],
+        reverse_relationship_label=rel_name,
+        forward_relationship_label=relation["relationship_forward_name"],
+        relation_manager=relation["relationship_manager"],
+        has_relation_data=relation["relation"].definition["model"].__name__
+        != "Relation",
+        relation_properties=relation_properties,
+    )
+
+
+def build_properties(model: type[AbstractNode]) -> PropertyMap:
+    return PropertyMap(
         {
             n: p
             for n, p in model.__all_properties__
@@ -377,7 +657,7 @@ def build_child_node_dict(rel: type[RelationshipDefinition]):
 
 def build_child_nodes(model: type[AbstractNode]) -> dict[str, ChildNodeRelationType]:
     child_nodes: dict[str, ChildNodeRelationType] = {
-        n: build_child_node_dict(p)
+        n: intern_item(("child_node", p), lambda p=p: build_child_node_dict(p))
         for n, p in model.__all_relationships__
         if p.definition["direction"] == 1
         and issubclass(p.definition["model"], ChildNodeRelation)
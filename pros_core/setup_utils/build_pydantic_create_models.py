@@ -0,0 +1,153 @@
+from typing import Any, Literal, Optional, Union
+
+from camel_converter import to_pascal
+from fastapi_camelcase import CamelModel
+from neomodel import One, OneOrMore, Property
+from pros_core.models import AbstractNode, BaseNode
+from pros_core.setup_utils.build_app_model_definitions import (
+    build_child_nodes,
+    build_properties,
+    build_related_reifications,
+    build_relationships,
+)
+from pros_core.setup_utils.build_pydantic_return_models import (
+    PydanticModelRegistry,
+    build_concrete_subtypes,
+    build_list_constraints_from_relation_manager,
+    build_relation_data_model,
+    map_prop_and_default,
+)
+from pydantic import UUID4, BaseModel, create_model
+
+# Properties set when a node is written, rather than given by the client
+SERVER_SET_PROPERTIES = frozenset(
+    {
+        "real_type",
+        "is_deleted",
+        "created_by",
+        "created_when",
+        "modified_by",
+        "modified_when",
+        "last_dependent_change",
+    }
+)
+
+
+def build_pydantic_create_properties(
+    neomodel_class: type[BaseNode],
+) -> dict[str, tuple[type, Any]]:
+    pydantic_properties = {}
+    for name, neomodel_property in build_properties(neomodel_class).items():
+        if name in SERVER_SET_PROPERTIES:
+            continue
+        prop, default = map_prop_and_default(neomodel_property)
+        # A default computed when the node is written
+        if default is ... and not neomodel_property.required:
+            default = None
+        pydantic_properties[name] = (prop, default)
+    return pydantic_properties
+
+
+def build_relation_field(item_type: type, relationship_manager) -> tuple[type, Any]:
+    """Field of a list of related items, required if the relation must have at
+    least one"""
+    required = relationship_manager is One or relationship_manager is OneOrMore
+    return (
+        build_list_constraints_from_relation_manager(item_type, relationship_manager),
+        ... if required else [],
+    )
+
+
+def build_relation_create_model(
+    neomodel_class: type[BaseNode],
+    relationship_name: str,
+    relation_properties: dict[str, Property],
+) -> type[BaseModel]:
+    """Build pydantic model for a relation to an existing node, by its uid, with
+    the properties stored on the relationship"""
+
+    def build():
+        class_name = (
+            f"{neomodel_class.__name__}_{to_pascal(relationship_name)}_CreateRelation"
+        )
+        return create_model(
+            class_name,
+            __base__=CamelModel,
+            uid=(UUID4, ...),
+            relation_data=(
+                build_relation_data_model(relation_properties, class_name),
+                ...,
+            ),
+        )
+
+    return PydanticModelRegistry.get_or_build(
+        ("create_relation", neomodel_class, relationship_name, None), build
+    )
+
+
+def build_pydantic_create_relations(
+    neomodel_class: type[BaseNode],
+) -> dict[str, tuple[type, Any]]:
+    """Relations are given as the uids of the related nodes (or, where the relation
+    has properties of its own, as uid and relationData)"""
+    pydantic_relations = {}
+    for relationship_name, relationship in build_relationships(neomodel_class).items():
+        if relationship.relation_properties:
+            item_type = build_relation_create_model(
+                neomodel_class, relationship_name, relationship.relation_properties
+            )
+        else:
+            item_type = UUID4
+        pydantic_relations[relationship_name] = build_relation_field(
+            item_type, relationship.relation_manager
+        )
+    return pydantic_relations
+
+
+def build_pydantic_create_embedded_nodes(
+    neomodel_class: type[BaseNode],
+) -> dict[str, tuple[type, Any]]:
+    """Child nodes and reifications are created along with their parent node"""
+    embedded = {
+        **build_child_nodes(neomodel_class),
+        **build_related_reifications(neomodel_class),
+    }
+    pydantic_nodes = {}
+    for relationship_name, relationship in embedded.items():
+        target = getattr(relationship, "child_model", None) or relationship.target_model
+        types = tuple(
+            build_pydantic_create_model(cls) for cls in build_concrete_subtypes(target)
+        )
+        pydantic_nodes[relationship_name] = build_relation_field(
+            Union[*types], relationship.relation_manager  # type: ignore
+        )
+    return pydantic_nodes
+
+
+def build_pydantic_create_model(neomodel_class: type[BaseNode]) -> type[BaseModel]:
+    """Build pydantic model for creating a node: its properties, the uids of the
+    nodes it is related to, and its child nodes and reifications in full. The uid
+    of a node may be given, so that other nodes created with it can refer to it."""
+    return PydanticModelRegistry.get_or_build(
+        ("create", neomodel_class, None, None),
+        lambda: _build_pydantic_create_model(neomodel_class),
+    )
+
+
+def _build_pydantic_create_model(neomodel_class: type[BaseNode]) -> type[BaseModel]:
+    fields: dict[str, tuple[type, Any]] = {}
+    if issubclass(neomodel_class, AbstractNode):
+        fields["uid"] = (Optional[UUID4], None)
+        fields.update(build_pydantic_create_embedded_nodes(neomodel_class))
+
+    return create_model(
+        f"{neomodel_class.__name__}_Create",
+        __base__=CamelModel,
+        real_type=(
+            Literal[neomodel_class.__name__.lower()],  # type: ignore
+            ...,
+        ),
+        **build_pydantic_create_properties(neomodel_class),
+        **build_pydantic_create_relations(neomodel_class),
+        **fields,
+    )
@@ -1,7 +1,7 @@
 import datetime
+import threading
 from enum import Enum
-from functools import cache
-from typing import Any, Literal, Optional, TypeVar, Union
+from typing import Any, Callable, Hashable, Literal, Optional, TypeVar, Union
 
 import pydantic.main
 from camel_converter import to_pascal
@@ -24,14 +24,17 @@ from neomodel import (
 )
 from pros_core.models import BaseNode
 from pros_core.setup_utils.build_app_model_definitions import (
+    ModelManager,
+    ModelManagerException,
     build_child_nodes,
     build_properties,
     build_related_reifications,
     build_relationships,
     build_reverse_relationships,
     build_subclasses_set,
+    declares_abstract,
 )
-from pydantic import UUID4, BaseModel, Field, conlist, create_model
+from pydantic import UUID4, BaseModel, Field, conlist, create_model, parse_obj_as
 
 AnyItemType = TypeVar("AnyItemType")
 
@@ -86,12 +89,85 @@ def build_pydantic_properties(
     return pydantic_properties
 
 
-def get_existing_base_model_class(name):
-    all_subclasses = BaseModel.__subclasses__()
-    filtered_subclasses = [cls for cls in all_subclasses if cls.__name__ == name]
-    if filtered_subclasses:
-        return filtered_subclasses[0]
-    return None
+PydanticModelKey = tuple[str, type[BaseNode], Optional[str], Optional[type[BaseNode]]]
+
+
+class PydanticModelRegistryClass:
+    """Registry of generated pydantic models, keyed by
+    (kind, source class, relation name, target class).
+
+    Guarantees each model is built only once, even if requested
+    concurrently from several threads."""
+
+    def __init__(self):
+        self._models: dict[PydanticModelKey, type[BaseModel]] = {}
+        self._keys_by_model: dict[type[BaseModel], PydanticModelKey] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(
+        self, key: PydanticModelKey, builder: Callable[[], type[BaseModel]]
+    ) -> type[BaseModel]:
+        """Return the model registered under key, calling builder to create
+        and register it if there is none"""
+        with self._lock:
+            try:
+                model = self._models[key]
+                self.hits += 1
+                return model
+            except KeyError:
+                self.misses += 1
+            model = builder()
+            self.register(key, model)
+            return model
+
+    def register(self, key: PydanticModelKey, model: type[BaseModel]) -> None:
+        with self._lock:
+            self._models[key] = model
+            self._keys_by_model[model] = key
+
+    def get(self, key: PydanticModelKey) -> Optional[type[BaseModel]]:
+        return self._models.get(key)
+
+    def key_for(self, model: type[BaseModel]) -> Optional[PydanticModelKey]:
+        return self._keys_by_model.get(model)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"models": len(self._models), "hits": self.hits, "misses": self.misses}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._models
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+PydanticModelRegistry = PydanticModelRegistryClass()
+
+
+def build_concrete_subtypes(neomodel_class: type[BaseNode]) -> list[type[BaseNode]]:
+    """Get the class itself (unless abstract) and all its non-abstract subclasses:
+    i.e. all the types a node related as this class can actually be"""
+    try:
+        return list(ModelManager.concrete_descendants(neomodel_class))
+    except ModelManagerException:
+        return [
+            cls
+            for cls in [
+                neomodel_class,
+                *(item.model for item in build_subclasses_set(neomodel_class)),
+            ]
+            if not declares_abstract(cls)
+        ]
+
+
+def build_classes_with_trait(trait: type[BaseNode]) -> list[type[BaseNode]]:
+    try:
+        return list(ModelManager.classes_with_trait(trait))
+    except ModelManagerException:
+        return list(trait.__classes_with_trait__)
 
 
 def build_relation_return_name(
@@ -105,6 +181,7 @@ def build_relation_return_name(
 def build_relation_data_model(
     relation_properties: dict[str, Property], data_model_name
 ):
+    """Build pydantic model for the properties stored on a relationship"""
     pydantic_properties = {}
     for neomodel_property_name, neomodel_property in relation_properties.items():
         if neomodel_property_name == "real_type":
@@ -128,20 +205,46 @@ def build_relation_return_model(
     relationship_to_neomodel_class: type[BaseNode],
     relation_properties: Optional[dict[str, Property]] = None,
     base=None,
+) -> type[BaseModel]:
+    return PydanticModelRegistry.get_or_build(
+        (
+            "related_item",
+            relationship_from_neomodel_class,
+            relationship_name,
+            relationship_to_neomodel_class,
+        ),
+        lambda: _build_relation_return_model(
+            relationship_from_neomodel_class=relationship_from_neomodel_class,
+            relationship_name=relationship_name,
+            relationship_to_neomodel_class=relationship_to_neomodel_class,
+            relation_properties=relation_properties,
+        ),
+    )
+
+
+def _build_relation_return_model(
+    relationship_from_neomodel_class: type[BaseNode],
+    relationship_name: str,
+    relationship_to_neomodel_class: type[BaseNode],
+    relation_properties: Optional[dict[str, Property]] = None,
 ) -> type[BaseModel]:
     class_name = build_relation_return_name(
         relationship_from_neomodel_class=relationship_from_neomodel_class,
         relationship_name=relationship_name,
         relationship_to_neomodel_class=relationship_to_neomodel_class,
     )
-    if existing_pydantic_class := get_existing_base_model_class(class_name):
-        return existing_pydantic_class
 
     additional_model_properties = {}
 
     if relation_properties:
-        relation_property_model = build_relation_data_model(
-            relation_properties, class_name
+        relation_property_model = PydanticModelRegistry.get_or_build(
+            (
+                "relation_data",
+                relationship_from_neomodel_class,
+                relationship_name,
+                relationship_to_neomodel_class,
+            ),
+            lambda: build_relation_data_model(relation_properties, class_name),
         )
         additional_model_properties["relation_data"] = (relation_property_model, ...)
 
@@ -193,7 +296,7 @@ def build_pydantic_return_relations(
                     relationship_to_neomodel_class=cls,
                     relation_properties=relation_app_model.relation_properties,
                 )
-                for cls in relation_app_model.target_model.__classes_with_trait__
+                for cls in build_classes_with_trait(relation_app_model.target_model)
             ]
 
             pydantic_relations[relationship_name] = (
@@ -205,32 +308,16 @@ def build_pydantic_return_relations(
 
         # Otherwise, build the relation for the related node type
         else:
-            # If a relationship is to a class, it can be related to any subtype!
-            types = []
-
-            # Get the return pydantic model for the base related model
-            pydantic_base_model = build_relation_return_model(
-                relationship_from_neomodel_class=neomodel_class,
-                relationship_name=relationship_name,
-                relationship_to_neomodel_class=relation_app_model.target_model,
-                relation_properties=relation_app_model.relation_properties,
-            )
-
-            # If base model is not abstract, add its pydantic model to the possible types
-            if not relation_app_model.target_model.is_abstract:
-                types.append(pydantic_base_model)
-
-            # Get all the subclasses and create a
-            for subclass_app_model in build_subclasses_set(
-                relation_app_model.target_model
-            ):
-                subclass_pydantic_model = build_relation_return_model(
+            # If a relationship is to a class, it can be related to any (non-abstract) subtype!
+            types = [
+                build_relation_return_model(
                     relationship_from_neomodel_class=neomodel_class,
                     relationship_name=relationship_name,
-                    relationship_to_neomodel_class=subclass_app_model.model,
+                    relationship_to_neomodel_class=cls,
                     relation_properties=relation_app_model.relation_properties,
                 )
-                types.append(subclass_pydantic_model)
+                for cls in build_concrete_subtypes(relation_app_model.target_model)
+            ]
 
             t_tuple = tuple(types)
             pydantic_relations[relationship_name] = (
@@ -253,17 +340,10 @@ def build_pydantic_return_related_reifications(
         reification_name,
         reificiation_app_model,
     ) in neomodel_abstract_reifications.items():
-        types = []
-
-        if not reificiation_app_model.target_model.is_abstract:
-            base_model = build_pydantic_model(reificiation_app_model.target_model)
-            types.append(base_model)
-
-        for subclass_app_model in build_subclasses_set(
-            reificiation_app_model.target_model
-        ):
-            subclass_pydantic_model = build_pydantic_model(subclass_app_model.model)
-            types.append(subclass_pydantic_model)
+        types = [
+            build_pydantic_model(cls)
+            for cls in build_concrete_subtypes(reificiation_app_model.target_model)
+        ]
 
         t_tuple = tuple(types)
         pydantic_relations[reification_name] = (
@@ -282,15 +362,10 @@ def build_pydantic_return_child_nodes(
     pydantic_properties = {}
 
     for relationship_name, relation_app_model in neomodel_child_nodes.items():
-        types = []
-
-        if not relation_app_model.child_model.is_abstract:
-            base_model = build_pydantic_model(relation_app_model.child_model)
-            types.append(base_model)
-
-        for subclass_app_model in build_subclasses_set(relation_app_model.child_model):
-            subclass_pydantic_model = build_pydantic_model(subclass_app_model.model)
-            types.append(subclass_pydantic_model)
+        types = [
+            build_pydantic_model(cls)
+            for cls in build_concrete_subtypes(relation_app_model.child_model)
+        ]
 
         t_tuple = tuple(types)
         pydantic_properties[relationship_name] = (
@@ -312,7 +387,6 @@ def build_pydantic_return_reverse_relations(
         reverse_relation_name,
         reverse_relation_app_model,
     ) in neomodel_reverse_relation_nodes.items():
-        types = []
         if reverse_relation_app_model.relationship_from_model.__is_trait__:
             pydantic_models_with_trait = [
                 build_relation_return_model(
@@ -320,32 +394,29 @@ def build_pydantic_return_reverse_relations(
                     relationship_name=reverse_relation_app_model.reverse_relationship_label,
                     relationship_to_neomodel_class=cls,
                 )
-                for cls in reverse_relation_app_model.relationship_from_model.__classes_with_trait__
+                for cls in build_classes_with_trait(
+                    reverse_relation_app_model.relationship_from_model
+                )
             ]
 
-            pydantic_relations[reverse_relation_name] = (
-                Optional[list[Union[*tuple(pydantic_models_with_trait)]]],  # type: ignore
-                None,
-            )
+            # A trait not (yet) applied to any class has nothing to relate from
+            if pydantic_models_with_trait:
+                t = list[Union[*tuple(pydantic_models_with_trait)]]  # type: ignore
+            else:
+                t = list
+            pydantic_relations[reverse_relation_name] = (Optional[t], None)
 
         else:
-            if not reverse_relation_app_model.relationship_from_model.is_abstract:
-                base_model = build_relation_return_model(
+            types = [
+                build_relation_return_model(
                     relationship_from_neomodel_class=neomodel_class,
                     relationship_name=reverse_relation_app_model.reverse_relationship_label,
-                    relationship_to_neomodel_class=reverse_relation_app_model.relationship_from_model,
+                    relationship_to_neomodel_class=cls,
                 )
-                types.append(base_model)
-
-            for subclass_app_model in build_subclasses_set(
-                reverse_relation_app_model.relationship_from_model
-            ):
-                subclass_pydantic_model = build_relation_return_model(
-                    relationship_from_neomodel_class=neomodel_class,
-                    relationship_name=reverse_relation_app_model.reverse_relationship_label,
-                    relationship_to_neomodel_class=subclass_app_model.model,
+                for cls in build_concrete_subtypes(
+                    reverse_relation_app_model.relationship_from_model
                 )
-                types.append(subclass_pydantic_model)
+            ]
 
             if types:
                 t_tuple = tuple(types)
@@ -362,9 +433,13 @@ def build_pydantic_return_reverse_relations(
 
 def build_pydantic_model(neomodel_class: type[BaseNode]) -> type[BaseModel]:
     """Build a standard pydantic model (all fields, rels)"""
-    if existing_pydantic_model := get_existing_base_model_class(neomodel_class):
-        return existing_pydantic_model
+    return PydanticModelRegistry.get_or_build(
+        ("model", neomodel_class, None, None),
+        lambda: _build_pydantic_model(neomodel_class),
+    )
+
 
+def _build_pydantic_model(neomodel_class: type[BaseNode]) -> type[BaseModel]:
     pydantic_properties = build_pydantic_properties(neomodel_class)
     pydantic_relations = build_pydantic_return_relations(neomodel_class)
     pydantic_child_nodes = build_pydantic_return_child_nodes(neomodel_class)
@@ -393,3 +468,77 @@ def build_pydantic_return_model(neomodel_class: type[BaseNode]) -> type[BaseMode
     model = build_pydantic_model(neomodel_class)
 
     return model
+
+
+def get_built_pydantic_return_model(
+    neomodel_class: type[BaseNode],
+) -> Optional[type[BaseModel]]:
+    """Get the return model of a class if it has been built, without building it"""
+    return PydanticModelRegistry.get(("model", neomodel_class, None, None))
+
+
+def build_pydantic_return_type(neomodel_class: type[BaseNode]) -> type:
+    """Build the type of a node of a class, which can be of any of its (non-abstract)
+    subtypes: a Union of their return models, told apart by real_type"""
+    types = tuple(
+        build_pydantic_return_model(cls)
+        for cls in build_concrete_subtypes(neomodel_class)
+    )
+    if not types:
+        return dict
+    return Union[*types]  # type: ignore
+
+
+def build_return_models_by_real_type(
+    neomodel_class: type[BaseNode],
+) -> dict[str, type[BaseModel]]:
+    """Build the return model of each (non-abstract) subtype of a class, keyed by
+    its real_type, so that a node can be validated against the model of its own
+    type, rather than against each member of the Union in turn"""
+    return {
+        cls.__name__.lower(): build_pydantic_return_model(cls)
+        for cls in build_concrete_subtypes(neomodel_class)
+    }
+
+
+def parse_return_item(
+    models_by_real_type: dict[str, type[BaseModel]],
+    return_type: type,
+    item: Any,
+) -> Any:
+    """Validate a node against the return model of its real_type, or, if it has
+    none, against the return type"""
+    if isinstance(item, dict):
+        model = models_by_real_type.get(item.get("real_type", item.get("realType")))
+        if model is not None:
+            return model.parse_obj(item)
+    return parse_obj_as(return_type, item)
+
+
+def build_page_model(neomodel_class: type[BaseNode]) -> type[BaseModel]:
+    """Build pydantic model for a page of a list of nodes, with the cursor
+    of the next page"""
+    return PydanticModelRegistry.get_or_build(
+        ("page", neomodel_class, None, None),
+        lambda: create_model(
+            f"{neomodel_class.__name__}_Page",
+            __base__=CamelModel,
+            items=(list[build_pydantic_return_type(neomodel_class)], ...),
+            next_cursor=(Optional[str], None),
+        ),
+    )
+
+
+def build_autocomplete_item_model(neomodel_class: type[BaseNode]) -> type[BaseModel]:
+    """Build pydantic model for an autocomplete suggestion: a node of the class or
+    one of its subclasses, with only what is needed to show and refer to it"""
+    return PydanticModelRegistry.get_or_build(
+        ("autocomplete_item", neomodel_class, None, None),
+        lambda: create_model(
+            f"{neomodel_class.__name__}_AutocompleteItem",
+            __base__=CamelModel,
+            real_type=(str, ...),
+            uid=(UUID4, ...),
+            label=(str, ...),
+        ),
+    )
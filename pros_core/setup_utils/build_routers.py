@@ -1,46 +1,298 @@
-from typing import Optional
+from typing import Any, AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Header, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
 from pros_core.auth import LoggedInUser
+from pros_core.db import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_TRANSACTION_SIZE,
+    MAX_BATCH_SIZE,
+    MAX_PAGE_SIZE,
+    MAX_TRANSACTION_SIZE,
+    BulkImportError,
+    Cursor,
+    InvalidCursor,
+    QueryExecutor,
+    QueryExecutorDependency,
+    bulk_import,
+    fetch_node,
+    fetch_nodes_by_uid,
+    fetch_page,
+    get_label_index,
+    search_nodes,
+    stream_batches,
+)
+from pros_core.models import AbstractNode
+from pros_core.setup_utils.build_app_model_definitions import AppModel
+from pros_core.setup_utils.build_pydantic_return_models import (
+    build_autocomplete_item_model,
+    build_page_model,
+    build_pydantic_return_type,
+    build_return_models_by_real_type,
+    parse_return_item,
+)
+from pros_core.setup_utils.startup_profiler import StartupProfiler
+from pydantic import UUID4, BaseModel, parse_obj_as
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
-def build_routes(_app, models, ModelManager):
-    router = APIRouter()
-    for app_model in ModelManager.models:
 
-        async def get_list(
-            user=LoggedInUser,
-            q: Optional[str] = Query(
-                None, description="Filter parameter for autocomplete query"
-            ),
-        ) -> list[app_model.pydantic_return_model]:
-            return [
-                {
-                    "uid": "550e8400-e29b-41d4-a716-446655440000",
-                    "real_type": "animal",
-                    "label": "Mister Gorilla",
-                    "created_by": "rhadden",
-                    "created_when": "2023-06-07T10:18:45.871Z",
-                    "modified_by": "rhadden",
-                    "modified_when": "2023-06-07T10:18:45.871Z",
-                    "is_deleted": False,
-                    "last_dependent_change": "2023-06-07T10:18:45.871Z",
-                    "is_involved_in_happening": [
-                        {
-                            "real_type": "happening",
-                            "label": "The Gorilla's Gathering",
-                            "uid": "550e8400-e29b-41d4-a716-446655440001",
-                        }
-                    ],
-                }
-            ]
-
-        router.add_api_route(
-            "/entities/" + app_model.model_name.lower() + "/",
-            endpoint=get_list,
-            name=f"{app_model.model_name}.list",
+async def stream_ndjson(
+    batches: AsyncIterator[list[dict[str, Any]]],
+    models_by_real_type: dict[str, type[BaseModel]],
+    return_type,
+) -> AsyncIterator[str]:
+    """Each item as a line of JSON, validated against the return model of its
+    real_type, one batch of lines at a time"""
+    async for batch in batches:
+        yield "".join(
+            parse_return_item(models_by_real_type, return_type, item).json(
+                by_alias=True
+            )
+            + "\n"
+            for item in batch
         )
 
-        # TODO: remove this at some stage when there's real data, and we can protect actual routes
 
-    _app.include_router(router)
+def parse_page(
+    page_model: type[BaseModel],
+    models_by_real_type: dict[str, type[BaseModel]],
+    return_type,
+    page: dict[str, Any],
+) -> BaseModel:
+    """A page of nodes, each validated against the return model of its real_type.
+    The page is constructed from them without validating them again, which would
+    try each member of the return type's Union in turn."""
+    return page_model.construct(
+        items=[
+            parse_return_item(models_by_real_type, return_type, item)
+            for item in page["items"]
+        ],
+        next_cursor=page.get("next_cursor"),
+    )
+
+
+def build_get_list(app_model: AppModel):
+    page_model = build_page_model(app_model.model_class)
+    return_type = build_pydantic_return_type(app_model.model_class)
+    models_by_real_type = build_return_models_by_real_type(app_model.model_class)
+    concrete = app_model._mm.concrete_descendants(app_model.model_class)
+    real_types = frozenset(cls.__name__ for cls in concrete)
+
+    async def get_list(
+        user=LoggedInUser,
+        q: Optional[str] = Query(
+            None,
+            description="Filter parameter for autocomplete query: gets the nodes "
+            "whose labels best match, rather than a page of all nodes",
+        ),
+        cursor: Optional[str] = Query(
+            None, description="Cursor of the page to get, from the previous page"
+        ),
+        page_size: int = Query(
+            DEFAULT_PAGE_SIZE, alias="pageSize", ge=1, le=MAX_PAGE_SIZE
+        ),
+        executor: QueryExecutor = QueryExecutorDependency,
+        accept: Optional[str] = Header(None),
+    ):
+        if accept is not None and NDJSON_MEDIA_TYPE in accept:
+            # Every node from the cursor on, one per line, however many there are
+            if q:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"q cannot be used with {NDJSON_MEDIA_TYPE}",
+                )
+            try:
+                after = Cursor.decode(cursor) if cursor else None
+            except InvalidCursor as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+                )
+            return StreamingResponse(
+                stream_ndjson(
+                    stream_batches(executor, app_model, after),
+                    models_by_real_type,
+                    return_type,
+                ),
+                media_type=NDJSON_MEDIA_TYPE,
+            )
+        if q and not q.isspace():
+            # Autocomplete: the best matches only, so there are no further pages
+            if cursor is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="A cursor cannot be used with q",
+                )
+            label_index = get_label_index()
+            if label_index is not None and label_index.covers(real_types):
+                # The best matches from the index, and then their nodes in full
+                matches = label_index.search(q, real_types, page_size)
+                page = await fetch_nodes_by_uid(
+                    executor, app_model, [match["uid"] for match in matches]
+                )
+            else:
+                page = await search_nodes(executor, app_model, q, page_size)
+            return parse_page(page_model, models_by_real_type, return_type, page)
+        try:
+            page = await fetch_page(executor, app_model, cursor, page_size)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return parse_page(page_model, models_by_real_type, return_type, page)
+
+    return get_list
+
+
+def build_get_autocomplete(app_model: AppModel):
+    item_model = build_autocomplete_item_model(app_model.model_class)
+    concrete = app_model._mm.concrete_descendants(app_model.model_class)
+    real_types = frozenset(cls.__name__ for cls in concrete)
+
+    async def get_autocomplete(
+        user=LoggedInUser,
+        q: str = Query(..., description="Start of the words of the label"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        executor: QueryExecutor = QueryExecutorDependency,
+    ):
+        label_index = get_label_index()
+        if label_index is not None and label_index.covers(real_types):
+            items = label_index.search(q, real_types, limit)
+        else:
+            page = await search_nodes(executor, app_model, q, limit, fields=["label"])
+            items = page["items"]
+        return parse_obj_as(list[item_model], items)
+
+    return get_autocomplete
+
+
+def build_get_detail(app_model: AppModel):
+    return_type = build_pydantic_return_type(app_model.model_class)
+    models_by_real_type = build_return_models_by_real_type(app_model.model_class)
+
+    async def get_detail(
+        user=LoggedInUser,
+        uid: UUID4 = Path(..., description="uid of the node to get"),
+        executor: QueryExecutor = QueryExecutorDependency,
+    ):
+        node = await fetch_node(executor, app_model, uid.hex)
+        if node is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"{app_model.model_name} with uid '{uid}' not found",
+            )
+        return parse_return_item(models_by_real_type, return_type, node)
+
+    return get_detail
+
+
+class BulkImportRequest(BaseModel):
+    items: list[dict[str, Any]]
+
+
+def build_bulk_import():
+    async def post_bulk_import(
+        body: BulkImportRequest,
+        user=LoggedInUser,
+        batch_size: int = Query(
+            DEFAULT_BATCH_SIZE,
+            alias="batchSize",
+            ge=1,
+            le=MAX_BATCH_SIZE,
+            description="Rows written by each UNWIND statement",
+        ),
+        transaction_size: int = Query(
+            DEFAULT_TRANSACTION_SIZE,
+            alias="transactionSize",
+            ge=1,
+            le=MAX_TRANSACTION_SIZE,
+            description="Rows written by each transaction",
+        ),
+        executor: QueryExecutor = QueryExecutorDependency,
+    ):
+        """Create nodes of any models, each item with the realType of its model.
+        If any item is invalid, nothing is written."""
+        try:
+            report = await bulk_import(
+                executor,
+                body.items,
+                user=user.username,
+                batch_size=batch_size,
+                transaction_size=transaction_size,
+            )
+        except BulkImportError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors
+            )
+        return report.as_dict()
+
+    return post_bulk_import
+
+
+def add_model_route(
+    router: APIRouter,
+    path: str,
+    endpoint,
+    name: str,
+    model,
+    media_types: tuple[str, ...] = (),
+) -> None:
+    """Add a route returning model. Endpoints validate what they return against
+    the model themselves: given it as response_model, FastAPI would make a deep
+    copy of the model and every model it refers to for each route, which for
+    return models (a Union of the model and all its subclasses, with their child
+    nodes) dominated the time taken to build the routes. media_types are other
+    types the endpoint can respond with, as well as JSON."""
+    response: dict[str, Any] = {"model": model}
+    if media_types:
+        response["content"] = {media_type: {} for media_type in media_types}
+    router.add_api_route(
+        path,
+        endpoint=endpoint,
+        name=name,
+        response_model=None,
+        responses={status.HTTP_200_OK: response},
+    )
+
+
+def build_routes(
+    _app, models, ModelManager, profiler: Optional[StartupProfiler] = None
+):
+    profiler = profiler or StartupProfiler(enabled=False)
+    # Added to the app's own router: including a separate router would build
+    # every route a second time
+    router = _app.router
+    for app_model in ModelManager.models:
+        # Child nodes and reifications have no uid or label to get or page them
+        # by, and are returned as part of the nodes they belong to
+        if not issubclass(app_model.model_class, AbstractNode):
+            continue
+        with profiler.model("build_routes", app_model.model_name):
+            add_model_route(
+                router,
+                "/entities/" + app_model.model_name.lower() + "/",
+                endpoint=build_get_list(app_model),
+                name=f"{app_model.model_name}.list",
+                model=build_page_model(app_model.model_class),
+                media_types=(NDJSON_MEDIA_TYPE,),
+            )
+            # Before the detail route, whose path would also match
+            add_model_route(
+                router,
+                "/entities/" + app_model.model_name.lower() + "/autocomplete/",
+                endpoint=build_get_autocomplete(app_model),
+                name=f"{app_model.model_name}.autocomplete",
+                model=list[build_autocomplete_item_model(app_model.model_class)],
+            )
+            add_model_route(
+                router,
+                "/entities/" + app_model.model_name.lower() + "/{uid}/",
+                endpoint=build_get_detail(app_model),
+                name=f"{app_model.model_name}.detail",
+                model=build_pydantic_return_type(app_model.model_class),
+            )
+    router.add_api_route(
+        "/bulk-import/",
+        endpoint=build_bulk_import(),
+        name="bulk_import",
+        methods=["POST"],
+    )
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import inspect
+import weakref
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from pros_core.models import (
+    CLASS_DEFINITION_HOOKS,
+    AbstractNode,
+    AbstractTrait,
+    OverriddenStructuredNode,
+)
+
+
+@dataclass
+class HierarchyEntry:
+    model: type[OverriddenStructuredNode]
+    app_name: str
+    # AbstractNode subclasses above this class, in MRO order
+    ancestors: tuple[type[AbstractNode], ...]
+    # All subclasses below this class, depth-first in definition order
+    descendants: tuple[type[OverriddenStructuredNode], ...]
+    direct_subclasses: tuple[type[OverriddenStructuredNode], ...]
+    # The class itself and its MRO up to (not including) AbstractNode;
+    # i.e. the classes whose reverse relations this class inherits
+    lineage: tuple[type, ...]
+    depth: int
+    traits: frozenset[type[AbstractTrait]]
+    classes_with_trait: tuple[type[OverriddenStructuredNode], ...] = field(
+        default_factory=tuple
+    )
+
+
+class ClassHierarchyIndex:
+    """Precomputed ancestors, descendants, depth and trait membership of every model,
+    built in a single traversal of the class graph by setup_model_manager.
+
+    This is a snapshot of the hierarchy at setup time: classes defined afterwards
+    are not in the index, and callers should fall back to introspection for them.
+    Defining a subclass of an indexed class discards the index entirely."""
+
+    def __init__(self):
+        self._entries: dict[type, HierarchyEntry] = {}
+        HIERARCHY_INDEXES.add(self)
+
+    def _class_defined(self, model: type) -> None:
+        if any(base in self._entries for base in model.__mro__[1:]):
+            self._entries = {}
+
+    def build(self, models: Iterable[type[OverriddenStructuredNode]]) -> None:
+        descendants_cache: dict[type, tuple[type, ...]] = {}
+
+        def collect_descendants(model: type) -> tuple[type, ...]:
+            try:
+                return descendants_cache[model]
+            except KeyError:
+                pass
+            descendants: dict[type, None] = {}
+            for subclass in model.__subclasses__():
+                descendants[subclass] = None
+                descendants.update(dict.fromkeys(collect_descendants(subclass)))
+            descendants_cache[model] = tuple(descendants)
+            return descendants_cache[model]
+
+        entries: dict[type, HierarchyEntry] = {}
+        for model in models:
+            mro = inspect.getmro(model)
+            lineage = []
+            for parent in mro:
+                if parent is AbstractNode:
+                    break
+                lineage.append(parent)
+
+            ancestors = tuple(
+                m
+                for m in mro
+                if issubclass(m, AbstractNode) and m is not AbstractNode and m is not model
+            )
+            entries[model] = HierarchyEntry(
+                model=model,
+                app_name=".".join(model.__module__.split(".")[:-1]),
+                ancestors=ancestors,
+                descendants=collect_descendants(model),
+                direct_subclasses=tuple(model.__subclasses__()),
+                lineage=tuple(lineage),
+                depth=len(ancestors),
+                traits=frozenset(model.traits_as_direct_base()),
+            )
+
+        classes_with_trait: dict[type, list[type]] = {}
+        for model, entry in entries.items():
+            for trait in entry.traits:
+                if trait is not model:
+                    classes_with_trait.setdefault(trait, []).append(model)
+        for trait, classes in classes_with_trait.items():
+            if trait in entries:
+                entries[trait].classes_with_trait = tuple(classes)
+
+        self._entries = entries
+
+    def get(
+        self, model: type[OverriddenStructuredNode]
+    ) -> Optional[HierarchyEntry]:
+        return self._entries.get(model)
+
+    def __getitem__(self, model: type[OverriddenStructuredNode]) -> HierarchyEntry:
+        return self._entries[model]
+
+    def __contains__(self, model: type[OverriddenStructuredNode]) -> bool:
+        return model in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Every index, held weakly so that one no longer used is not kept alive by the
+# single class definition hook below
+HIERARCHY_INDEXES: weakref.WeakSet[ClassHierarchyIndex] = weakref.WeakSet()
+
+
+def discard_hierarchy_indexes(model: type) -> None:
+    for index in list(HIERARCHY_INDEXES):
+        index._class_defined(model)
+
+
+CLASS_DEFINITION_HOOKS.append(discard_hierarchy_indexes)
+
+
+ClassHierarchy = ClassHierarchyIndex()
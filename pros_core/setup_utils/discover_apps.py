@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import importlib
+from dataclasses import dataclass
+from functools import cache
+from types import ModuleType
+from typing import Optional
+
+from fastapi import APIRouter
+from pros_core.models import (
+    AbstractNode,
+    AbstractReification,
+    AbstractTrait,
+    BaseNode,
+    ChildNode,
+    OverriddenStructuredNode,
+)
+from pydantic import BaseSettings
+
+# Bases provided by pros_core for apps to subclass, rather than models themselves
+FRAMEWORK_BASE_CLASSES = frozenset(
+    {BaseNode, AbstractNode, AbstractReification, ChildNode, AbstractTrait}
+)
+
+
+@dataclass(frozen=True, slots=True)
+class DiscoveredApp:
+    app_name: str
+    # (class name, class) pairs, sorted by class name
+    nodes: tuple[tuple[str, type[BaseNode]], ...]
+    traits: tuple[tuple[str, type[AbstractTrait]], ...]
+    child_nodes: tuple[tuple[str, type[ChildNode]], ...]
+    reifications: tuple[tuple[str, type[AbstractReification]], ...]
+    router: Optional[APIRouter]
+
+
+@dataclass(frozen=True, slots=True)
+class DiscoveredApps:
+    apps: tuple[DiscoveredApp, ...]
+
+    def _collect(self, kind: str) -> list[tuple[str, str, type]]:
+        return [
+            (app.app_name, name, cls)
+            for app in self.apps
+            for name, cls in getattr(app, kind)
+        ]
+
+    @property
+    def models(self) -> list[tuple[str, str, type[BaseNode]]]:
+        """All nodes, including child nodes and reifications"""
+        return self._collect("nodes")
+
+    @property
+    def traits(self) -> list[tuple[str, str, type[AbstractTrait]]]:
+        return self._collect("traits")
+
+    @property
+    def child_nodes(self) -> list[tuple[str, str, type[ChildNode]]]:
+        return self._collect("child_nodes")
+
+    @property
+    def reifications(self) -> list[tuple[str, str, type[AbstractReification]]]:
+        return self._collect("reifications")
+
+    @property
+    def routers(self) -> list[APIRouter]:
+        return [app.router for app in self.apps if app.router is not None]
+
+
+def import_app_module(pros_app: str, module_name: str) -> Optional[ModuleType]:
+    """Import a module of an app, or None if the app doesn't have it. Errors raised
+    while importing a module that does exist are not caught."""
+
+    try:
+        return importlib.import_module(f"{pros_app}.{module_name}")
+    except ModuleNotFoundError as e:
+        # The module, or a package containing it within the app, doesn't exist
+        parts = f"{pros_app}.{module_name}".split(".")
+        app_depth = len(pros_app.split("."))
+        if e.name in {
+            ".".join(parts[:i]) for i in range(app_depth + 1, len(parts) + 1)
+        }:
+            return None
+        raise
+
+
+def discover_app(pros_app: str) -> DiscoveredApp:
+    """Classify the classes defined in an app's models module, and find its router,
+    in one pass over each module"""
+
+    nodes, traits, child_nodes, reifications = [], [], [], []
+
+    models_module = import_app_module(pros_app, "models")
+    if models_module is not None:
+        for name, obj in sorted(vars(models_module).items()):
+            if (
+                not isinstance(obj, type)
+                or not issubclass(obj, OverriddenStructuredNode)
+                # Only classes defined in this module, not imported into it
+                or obj.__module__ != models_module.__name__
+                or obj in FRAMEWORK_BASE_CLASSES
+            ):
+                continue
+            if issubclass(obj, BaseNode):
+                nodes.append((name, obj))
+                if issubclass(obj, ChildNode):
+                    child_nodes.append((name, obj))
+                elif issubclass(obj, AbstractReification):
+                    reifications.append((name, obj))
+            elif obj.__is_trait__:
+                traits.append((name, obj))
+
+    router = None
+    api_module = import_app_module(pros_app, "api.v1")
+    if api_module is not None:
+        router = next(
+            (
+                obj
+                for _, obj in sorted(vars(api_module).items())
+                if isinstance(obj, APIRouter)
+            ),
+            None,
+        )
+
+    return DiscoveredApp(
+        app_name=pros_app,
+        nodes=tuple(nodes),
+        traits=tuple(traits),
+        child_nodes=tuple(child_nodes),
+        reifications=tuple(reifications),
+        router=router,
+    )
+
+
+@cache
+def discover_installed_apps(installed_apps: tuple[str, ...]) -> DiscoveredApps:
+    return DiscoveredApps(tuple(discover_app(pros_app) for pros_app in installed_apps))
+
+
+def discover_apps(settings: BaseSettings) -> DiscoveredApps:
+    """Discover the models, traits and routers of the installed apps. The result
+    is cached for the life of the process."""
+    return discover_installed_apps(tuple(settings.INSTALLED_APPS))
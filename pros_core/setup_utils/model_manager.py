@@ -1,3 +1,6 @@
+from types import MappingProxyType
+from typing import Optional
+
 from camel_converter import to_pascal
 from pros_core.models import AbstractTrait, BaseNode
 from pros_core.setup_utils.build_app_model_definitions import (
@@ -6,6 +9,7 @@ from pros_core.setup_utils.build_app_model_definitions import (
     ModelManagerClass,
     ModelManagerException,
     build_child_nodes,
+    clear_interned_items,
     build_parent_classes_set,
     build_properties,
     build_related_reifications,
@@ -14,9 +18,8 @@ from pros_core.setup_utils.build_app_model_definitions import (
     build_subclasses_hierarchy,
     build_subclasses_set,
 )
-from pros_core.setup_utils.build_pydantic_return_models import (
-    build_pydantic_return_model,
-)
+from pros_core.setup_utils.class_hierarchy import ClassHierarchy
+from pros_core.setup_utils.startup_profiler import StartupProfiler
 
 
 def create_app_model(
@@ -42,7 +45,20 @@ def create_app_model(
 def setup_model_manager(
     pros_models: list[tuple[str, str, type[BaseNode]]],
     pros_traits: list[tuple[str, str, type[AbstractTrait]]],
+    lazy: bool = False,
 ) -> None:
+    """Build an AppModel for each model and trait and add it to the ModelManager.
+
+    With lazy=True, pydantic return models are only built when first accessed
+    (or by calling warm_up_pydantic_return_models)."""
+    clear_interned_items()
+
+    # Walk the class graph once, so that building each AppModel
+    # only has to look up its place in the hierarchy
+    ClassHierarchy.build(
+        [model for _, _, model in pros_models] + [trait for _, _, trait in pros_traits]
+    )
+
     for app_name, model_name, model in pros_models:
         # Check if it's a class defined in this model (not imported from somewhere)
         # and that it's a top-level node
@@ -70,11 +86,65 @@ def setup_model_manager(
 
         model._app_model: AppModel = app_model
 
-    for app_model in ModelManager.models:
-        pydantic_return_model = (
-            build_pydantic_return_model(neomodel_class=app_model.model_class),
+    ModelManager.build_type_index(ClassHierarchy)
+    link_app_models(ModelManager)
+
+    if not lazy:
+        warm_up_pydantic_return_models(ModelManager)
+
+
+def resolve_relationship_target(
+    model_manager: ModelManagerClass,
+    app_model: AppModel,
+    relationship_name: str,
+    target_model_name: str,
+) -> AppModel:
+    try:
+        return model_manager.get_model(target_model_name)
+    except ModelManagerException:
+        raise ModelManagerException(
+            f"{app_model.model_name}.{relationship_name} is a relationship to "
+            f"<{target_model_name}>, which is not an installed model."
         )
 
-        # TODO: heaven knows why this is a tuple not just the class... seems most improbable
-        # and can't find the error... attempt to figure that out!
-        app_model.pydantic_return_model = pydantic_return_model[0]
+
+def link_app_models(model_manager: ModelManagerClass) -> None:
+    """Resolve the target of every relationship, child node and reification
+    to a direct reference to its AppModel, so that walking relations does no
+    name lookups, and a relationship to a model that doesn't exist fails
+    at setup rather than at request time"""
+
+    # The AppModels themselves are frozen: the links are kept in a table of
+    # their own, replaced as a whole
+    links: dict[str, AppModel] = {}
+    for app_model in model_manager.models:
+        for relationship_name, target_model_name in [
+            *(
+                (name, relationship.target_model_name)
+                for name, relationship in app_model.relationships.items()
+            ),
+            *(
+                (name, child_node.child_model_name)
+                for name, child_node in app_model.child_nodes.items()
+            ),
+            *(
+                (name, reification.target_model_name)
+                for name, reification in app_model.related_reifications.items()
+            ),
+        ]:
+            if target_model_name not in links:
+                links[target_model_name] = resolve_relationship_target(
+                    model_manager, app_model, relationship_name, target_model_name
+                )
+    model_manager.links = MappingProxyType(links)
+
+
+def warm_up_pydantic_return_models(
+    model_manager: ModelManagerClass, profiler: Optional[StartupProfiler] = None
+) -> None:
+    """Build the pydantic return model of every AppModel now, rather than
+    on first access"""
+    profiler = profiler or StartupProfiler(enabled=False)
+    for app_model in model_manager.models:
+        with profiler.model("pydantic_return_models", app_model.model_name):
+            app_model.pydantic_return_model
@@ -0,0 +1,27 @@
+import gc
+import logging
+
+from fastapi import FastAPI
+from pros_core.setup_utils.build_app_model_definitions import ModelManagerClass
+from pros_core.setup_utils.model_manager import warm_up_pydantic_return_models
+
+logger = logging.getLogger(__name__)
+
+
+def preload_for_fork(_app: FastAPI, model_manager: ModelManagerClass) -> None:
+    """Finish building everything that would otherwise be built lazily in each
+    worker (pydantic return models, the OpenAPI schema), then move every object
+    that exists now into the GC's permanent generation.
+
+    Call this in the master process of a pre-forking server (e.g. gunicorn --preload),
+    after setup_app and before workers are forked. Frozen objects are never
+    traversed by the cyclic GC, so workers don't write to (and so copy) the pages
+    holding the schema metadata just by collecting garbage."""
+
+    warm_up_pydantic_return_models(model_manager)
+    _app.openapi()
+
+    # Collect first, so that garbage left over from setup isn't frozen with the rest
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded schema; froze %d objects", gc.get_freeze_count())
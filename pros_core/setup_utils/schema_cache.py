@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import importlib.util
+import logging
+import os
+import pickle
+import sys
+import tempfile
+from typing import Any, Literal, Optional, Union, get_args, get_origin
+
+import pydantic
+from fastapi_camelcase import CamelModel
+from neomodel import Property
+from pros_core.models import BaseNode
+from pros_core.setup_utils.build_app_model_definitions import (
+    AppModel,
+    ModelManagerClass,
+)
+from pros_core.setup_utils.build_pydantic_return_models import (
+    PydanticModelRegistry,
+    get_built_pydantic_return_model,
+)
+from pros_core.setup_utils.class_hierarchy import ClassHierarchy
+from pros_core.setup_utils.model_manager import link_app_models
+from pydantic import BaseModel, BaseSettings, conlist, create_model
+from pydantic.types import ConstrainedList
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the structure of AppModel (or anything pickled with it) changes,
+# so that caches written by an older version are discarded rather than misread
+SCHEMA_CACHE_VERSION = 5
+
+SCHEMA_CACHE_FILE_NAME = "pros_schema_cache.pickle"
+
+
+class SchemaCacheMiss(Exception):
+    pass
+
+
+@functools.cache
+def fingerprint_pros_core() -> str:
+    """Hash the source of pros_core itself, so that upgrading it discards caches
+    of schemas it may now build differently, whether or not SCHEMA_CACHE_VERSION
+    was bumped"""
+
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fingerprint = hashlib.sha256()
+    for directory, subdirectories, files in os.walk(package_dir):
+        subdirectories.sort()
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(directory, name)
+            fingerprint.update(os.path.relpath(path, package_dir).encode())
+            with open(path, "rb") as f:
+                fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+
+def fingerprint_installed_apps(settings: BaseSettings) -> str:
+    """Hash the models.py of every installed app, along with pros_core's source and
+    the versions of everything that determines the shape of the compiled schema"""
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(
+        f"{SCHEMA_CACHE_VERSION}:{fingerprint_pros_core()}:"
+        f"{sys.version}:{pydantic.VERSION}".encode()
+    )
+    for pros_app in settings.INSTALLED_APPS:
+        fingerprint.update(pros_app.encode())
+        spec = importlib.util.find_spec(f"{pros_app}.models")
+        if spec is None or spec.origin is None:
+            continue
+        with open(spec.origin, "rb") as f:
+            fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+
+def build_reference_table(
+    models: list[tuple[str, str, type[BaseNode]]]
+) -> dict[tuple, Any]:
+    """Build a table of symbolic references to every object in an AppModel that
+    cannot be pickled by value: node classes, their properties and relationship
+    definitions, and the dynamically created relationship models"""
+
+    references: dict[tuple, Any] = {}
+    for _, model_name, model in models:
+        references[("node", model_name)] = model
+        for property_name, property in model.__all_properties__:
+            references[("property", model_name, property_name)] = property
+        for relationship_name, relationship in model.__all_relationships__:
+            references[("relationship", model_name, relationship_name)] = relationship
+            relation_model = relationship.definition["model"]
+            references[
+                ("relation_model", model_name, relationship_name)
+            ] = relation_model
+            for property_name, property in vars(relation_model).items():
+                if isinstance(property, Property):
+                    references[
+                        (
+                            "relation_property",
+                            model_name,
+                            relationship_name,
+                            property_name,
+                        )
+                    ] = property
+    return references
+
+
+def collect_pydantic_models(app_models: list[AppModel]) -> list[type[BaseModel]]:
+    """Collect every pydantic model reachable from the AppModels' return models,
+    ordered so that each model comes after all the models it refers to"""
+
+    collected: dict[int, type[BaseModel]] = {}
+
+    def visit_type(t):
+        if isinstance(t, type) and issubclass(t, BaseModel):
+            visit_model(t)
+        elif isinstance(t, type) and issubclass(t, ConstrainedList):
+            visit_type(t.item_type)
+        else:
+            for arg in get_args(t):
+                visit_type(arg)
+
+    def visit_model(model: type[BaseModel]):
+        if id(model) in collected:
+            return
+        for field in model.__fields__.values():
+            visit_type(field.annotation)
+        collected[id(model)] = model
+
+    # Only models that have already been built: lazy models stay lazy
+    for app_model in app_models:
+        if model := get_built_pydantic_return_model(app_model.model_class):
+            visit_model(model)
+
+    return list(collected.values())
+
+
+def encode_type(t, model_ids: dict[int, int]):
+    if isinstance(t, type) and issubclass(t, BaseModel):
+        return ("model", model_ids[id(t)])
+    if isinstance(t, type) and issubclass(t, ConstrainedList):
+        return (
+            "conlist",
+            encode_type(t.item_type, model_ids),
+            {
+                "min_items": t.min_items,
+                "max_items": t.max_items,
+                "unique_items": t.unique_items,
+            },
+        )
+    origin = get_origin(t)
+    if origin is Literal:
+        return ("literal", get_args(t))
+    if origin is Union:
+        return ("union", tuple(encode_type(arg, model_ids) for arg in get_args(t)))
+    if origin is list:
+        return ("list", tuple(encode_type(arg, model_ids) for arg in get_args(t)))
+    return ("type", t)
+
+
+def decode_type(encoded, models: list[type[BaseModel]]):
+    kind = encoded[0]
+    if kind == "model":
+        return models[encoded[1]]
+    if kind == "conlist":
+        return conlist(decode_type(encoded[1], models), **encoded[2])
+    if kind == "literal":
+        return Literal[encoded[1]]
+    if kind == "union":
+        return Union[tuple(decode_type(arg, models) for arg in encoded[1])]
+    if kind == "list":
+        return list[tuple(decode_type(arg, models) for arg in encoded[1])]
+    return encoded[1]
+
+
+def dump_pydantic_model_definitions(
+    pydantic_models: list[type[BaseModel]],
+) -> list[tuple[str, dict[str, tuple]]]:
+    """Reduce generated pydantic models to the (name, fields) arguments of create_model"""
+
+    model_ids = {id(model): i for i, model in enumerate(pydantic_models)}
+    return [
+        (
+            model.__name__,
+            {
+                field_name: (
+                    encode_type(field.annotation, model_ids),
+                    ... if field.required else field.default,
+                )
+                for field_name, field in model.__fields__.items()
+            },
+        )
+        for model in pydantic_models
+    ]
+
+
+def load_pydantic_model_definitions(
+    definitions: list[tuple[str, dict[str, tuple]]]
+) -> list[type[BaseModel]]:
+    pydantic_models: list[type[BaseModel]] = []
+    for model_name, fields in definitions:
+        pydantic_models.append(
+            create_model(
+                model_name,
+                __base__=CamelModel,
+                **{
+                    field_name: (decode_type(encoded, pydantic_models), default)
+                    for field_name, (encoded, default) in fields.items()
+                },
+            )
+        )
+    return pydantic_models
+
+
+class SchemaPickler(pickle.Pickler):
+    def __init__(
+        self,
+        file,
+        references: dict[tuple, Any],
+        model_manager: ModelManagerClass,
+        pydantic_models: list[type[BaseModel]],
+    ):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._model_manager = model_manager
+        self._reference_ids: dict[int, tuple] = {}
+        for key, obj in references.items():
+            self._reference_ids.setdefault(id(obj), key)
+        for i, pydantic_model in enumerate(pydantic_models):
+            self._reference_ids[id(pydantic_model)] = ("pydantic_model", i)
+
+    def persistent_id(self, obj):
+        if obj is self._model_manager:
+            return ("model_manager",)
+        return self._reference_ids.get(id(obj))
+
+
+class SchemaUnpickler(pickle.Unpickler):
+    def __init__(
+        self,
+        file,
+        references: dict[tuple, Any],
+        model_manager: ModelManagerClass,
+        pydantic_models: list[type[BaseModel]],
+    ):
+        super().__init__(file)
+        self._references = references
+        self._model_manager = model_manager
+        self._pydantic_models = pydantic_models
+
+    def persistent_load(self, pid):
+        if pid[0] == "model_manager":
+            return self._model_manager
+        if pid[0] == "pydantic_model":
+            return self._pydantic_models[pid[1]]
+        try:
+            return self._references[pid]
+        except KeyError:
+            raise SchemaCacheMiss(f"Cached reference {pid} no longer exists")
+
+
+class SchemaCache:
+    """Persists the compiled ModelManager (AppModels and their generated pydantic
+    return models) to disk, so that subsequent processes can reload it rather than
+    introspecting the class graph again.
+
+    The cache is keyed on a fingerprint of the installed apps' models.py files, and
+    is discarded automatically when the fingerprint changes. Cache files are pickles:
+    the cache directory must only be writeable by the application."""
+
+    def __init__(self, cache_dir: str, fingerprint: str):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_settings(cls, settings: BaseSettings) -> Optional[SchemaCache]:
+        """Get a SchemaCache if SCHEMA_CACHE_DIR is set in the app settings"""
+        cache_dir = getattr(settings, "SCHEMA_CACHE_DIR", None)
+        if not cache_dir:
+            return None
+        return cls(cache_dir, fingerprint_installed_apps(settings))
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, SCHEMA_CACHE_FILE_NAME)
+
+    def load(
+        self,
+        pros_models: list[tuple[str, str, type[BaseNode]]],
+        model_manager: ModelManagerClass,
+    ) -> bool:
+        """Load AppModels from the cache into the model manager, returning False
+        (and leaving the model manager untouched) if there is no valid cache"""
+
+        try:
+            with open(self.path, "rb") as f:
+                if pickle.load(f) != self.fingerprint:
+                    logger.info("Schema cache fingerprint changed; rebuilding")
+                    return False
+                pydantic_models = load_pydantic_model_definitions(pickle.load(f))
+                registry_keys, app_models = SchemaUnpickler(
+                    f,
+                    build_reference_table(pros_models),
+                    model_manager,
+                    pydantic_models,
+                ).load()
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning("Could not load schema cache %s: %r", self.path, e)
+            return False
+
+        # Register the loaded pydantic models, so that building them again
+        # is a registry hit rather than a duplicate model
+        for registry_key, pydantic_model in zip(registry_keys, pydantic_models):
+            if registry_key is not None and registry_key not in PydanticModelRegistry:
+                PydanticModelRegistry.register(registry_key, pydantic_model)
+
+        for app_model in app_models:
+            model_manager.add_model(app_model)
+            app_model.model_class._app_model = app_model
+
+        ClassHierarchy.build([model for _, _, model in pros_models])
+        model_manager.build_type_index(ClassHierarchy)
+        link_app_models(model_manager)
+        return True
+
+    def save(
+        self,
+        pros_models: list[tuple[str, str, type[BaseNode]]],
+        model_manager: ModelManagerClass,
+    ) -> None:
+        """Write the contents of the model manager to the cache, atomically replacing
+        any existing cache file"""
+
+        app_models = model_manager.models
+        pydantic_models = collect_pydantic_models(app_models)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self.fingerprint, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(
+                    dump_pydantic_model_definitions(pydantic_models),
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+                SchemaPickler(
+                    f,
+                    build_reference_table(pros_models),
+                    model_manager,
+                    pydantic_models,
+                ).dump(
+                    (
+                        [PydanticModelRegistry.key_for(m) for m in pydantic_models],
+                        app_models,
+                    )
+                )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning("Could not write schema cache %s: %r", self.path, e)
+            os.unlink(tmp_path)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class PhaseProfile:
+    name: str
+    wall_time: float
+    # Net change in memory traced by tracemalloc, and the peak above the
+    # memory in use at the start of the phase, in bytes
+    allocated: int
+    peak_allocated: int
+    # Net change in the number of objects tracked by the GC
+    gc_objects: int
+
+
+@dataclass(slots=True)
+class ModelProfile:
+    phase: str
+    model_name: str
+    wall_time: float
+
+
+@dataclass
+class StartupProfiler:
+    """Records the wall time, allocations and GC object counts of each phase of
+    setup_app, and the time spent on each model within a phase.
+
+    A disabled profiler records nothing, so that setup_app can always
+    run its phases inside profiler.phase()."""
+
+    enabled: bool = True
+    phases: list[PhaseProfile] = field(default_factory=list)
+    models: list[ModelProfile] = field(default_factory=list)
+    _started_tracemalloc: bool = field(default=False, repr=False)
+
+    @classmethod
+    def from_settings(cls, settings) -> StartupProfiler:
+        """Get a StartupProfiler, enabled if PROFILE_STARTUP is set in the app settings"""
+        return cls(enabled=getattr(settings, "PROFILE_STARTUP", False))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        objects_before = len(gc.get_objects())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            memory_after, peak = tracemalloc.get_traced_memory()
+            self.phases.append(
+                PhaseProfile(
+                    name=name,
+                    wall_time=wall_time,
+                    allocated=memory_after - memory_before,
+                    peak_allocated=peak - memory_before,
+                    gc_objects=len(gc.get_objects()) - objects_before,
+                )
+            )
+
+    @contextmanager
+    def model(self, phase: str, model_name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.models.append(
+                ModelProfile(
+                    phase=phase,
+                    model_name=model_name,
+                    wall_time=time.perf_counter() - start,
+                )
+            )
+
+    def finish(self) -> None:
+        """Stop tracing allocations, if this profiler started it"""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @property
+    def total_wall_time(self) -> float:
+        return sum(phase.wall_time for phase in self.phases)
+
+    def slowest_models(self, n: int = 10) -> list[ModelProfile]:
+        """The n models that took longest in any single phase"""
+        return sorted(self.models, key=lambda m: m.wall_time, reverse=True)[:n]
+
+    def report(self, slowest: int = 10) -> dict:
+        return {
+            "total_wall_time": self.total_wall_time,
+            "phases": [asdict(phase) for phase in self.phases],
+            "slowest_models": [asdict(m) for m in self.slowest_models(slowest)],
+        }
+
+    def summary(self, slowest: int = 5) -> str:
+        """The report as a single line, for logging"""
+        phases = ", ".join(
+            f"{phase.name} {phase.wall_time:.3f}s/{phase.allocated / 1024:.0f}KiB"
+            for phase in self.phases
+        )
+        models = ", ".join(
+            f"{m.model_name} ({m.phase}) {m.wall_time:.3f}s"
+            for m in self.slowest_models(slowest)
+        )
+        return (
+            f"setup_app took {self.total_wall_time:.3f}s: {phases}; "
+            f"slowest models: {models or 'none'}"
+        )
+
+    def write_report(self, path: str, slowest: int = 10) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(slowest), f, indent=2)
+
+    def log_report(self, report_path: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        logger.info(self.summary())
+        if report_path:
+            self.write_report(report_path)
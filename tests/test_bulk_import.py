@@ -0,0 +1,257 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from pros_core.db import (
+    BulkImportError,
+    LabelIndex,
+    QueryExecutor,
+    bulk_import,
+    get_query_executor,
+    set_label_index,
+)
+from pros_core.db.bulk_import import build_rows, main
+from pros_core.setup_app import setup_app
+from testing_app.app.core.config import settings
+from tests.testing_app.app.main import app
+from tests.utils import LoggedInClient
+
+setup_app(app, settings)
+
+POTATO, CALENDAR, ALICE, BOB = (str(uuid.uuid4()) for _ in range(4))
+
+
+def items():
+    return [
+        {"realType": "potato", "uid": POTATO, "label": "Spud"},
+        {"realType": "calendar", "uid": CALENDAR, "label": "Julian", "type": "J"},
+        {
+            "realType": "person",
+            "uid": ALICE,
+            "label": "Alice",
+            "hasRootVegetable": [POTATO],
+            "dateOfBirth": [
+                {
+                    "realType": "dateprecise",
+                    "date": "1890",
+                    "calendarFormat": [CALENDAR],
+                }
+            ],
+        },
+        {
+            "realType": "person",
+            "uid": BOB,
+            "label": "Bob",
+            "hasRootVegetable": [POTATO],
+            "dateOfBirth": [{"realType": "dateimprecise", "date": "c. 1900"}],
+        },
+        {
+            "realType": "factoid",
+            "label": "Alice and Bob",
+            "concernsPerson": [
+                {
+                    "realType": "personidentification",
+                    "nameInText": "Al",
+                    "personsIdentified": [ALICE, BOB],
+                }
+            ],
+        },
+    ]
+
+
+@pytest.fixture
+def executor(mocker):
+    async def run_transaction(statements):
+        return [[{"written": len(params["rows"])}] for _, params in statements]
+
+    executor = mocker.Mock(spec=QueryExecutor)
+    executor.run_transaction = mocker.AsyncMock(side_effect=run_transaction)
+    return executor
+
+
+def test_build_rows():
+    nodes, relations, count = build_rows(items(), user="johndoe")
+
+    assert count == 5
+    [people] = [rows for query, rows in nodes.items() if "(n:`Person`" in query]
+    assert [row["uid"] for row in people] == [uuid.UUID(ALICE).hex, uuid.UUID(BOB).hex]
+    assert people[0]["properties"]["real_type"] == "Person"
+    assert people[0]["properties"]["is_male"] is True
+    # Who created a node and when is only set if it is new, and who modified it
+    # and when only if it is not
+    assert people[0]["created"]["created_by"] == "johndoe"
+    assert people[0]["modified"]["modified_by"] == "johndoe"
+    assert "created_when" not in people[0]["properties"]
+    [people_query] = [query for query in nodes if "(n:`Person`" in query]
+    assert "ON CREATE SET n += row.created ON MATCH SET n += row.modified" in (
+        people_query
+    )
+
+    # The relations of each item are grouped by class and relationship, and its
+    # child nodes and reifications by their class too, after the statement
+    # deleting those it had
+    alice, bob, factoid = relations
+    queries = list(alice)
+    assert [len(alice[query]) for query in queries] == [1, 1, 1]
+    assert "MERGE (a)-[r:`HAS_ROOT_VEGETABLE`]->(b)" in queries[0]
+    assert alice[queries[0]][0]["data"] == {
+        "reverse_name": "ROOT_VEGETABLE_BELONGS_TO_PERSON"
+    }
+    assert "OPTIONAL MATCH (p)-[:`DATE_OF_BIRTH`]->(old) DETACH DELETE old" in (
+        queries[1]
+    )
+    assert alice[queries[1]] == [{"parent": uuid.UUID(ALICE).hex}]
+    assert "(c:`DatePrecise`:`DateBase`)" in queries[2]
+    assert uuid.UUID(alice[queries[2]][0]["properties"]["uid"])
+    assert "CREATE (c)-[x:`CALENDAR_FORMAT`]->(t)" in queries[2]
+    assert "(c:`DateImprecise`:`DateBase`)" in list(bob)[2]
+    [_, concerns_person] = list(factoid)
+    assert "CREATE (p)-[r:`CONCERNS_PERSON`]->(c:`PersonIdentification`)" in (
+        concerns_person
+    )
+    assert [
+        related["to"]
+        for related in factoid[concerns_person][0]["relationships"][
+            "persons_identified"
+        ]
+    ] == [uuid.UUID(ALICE).hex, uuid.UUID(BOB).hex]
+
+
+def test_build_rows_reports_every_invalid_item():
+    with pytest.raises(BulkImportError) as e:
+        build_rows(
+            [
+                {"realType": "calendar", "type": "X"},
+                {"realType": "person"},
+                {"realType": "entity"},
+                {"realType": "rootvegetable"},
+                {"realType": "potato"},
+            ]
+        )
+
+    errors = e.value.errors
+    assert [(error["index"], error["errors"][0]["loc"]) for error in errors] == [
+        (0, ("type",)),
+        (1, ("hasRootVegetable",)),
+        (3, ("realType",)),
+    ]
+
+
+def test_bulk_import_writes_nodes_then_relations_in_batches(executor):
+    report = asyncio.run(
+        bulk_import(executor, items(), batch_size=1, transaction_size=2)
+    )
+
+    transactions = [call.args[0] for call in executor.run_transaction.call_args_list]
+    # 5 nodes of 4 classes, one row per statement and two statements per
+    # transaction; then the 8 rows of relations, child nodes and reifications of
+    # 3 items, each item's in one transaction, however many rows it has
+    assert [len(statements) for statements in transactions] == [2, 2, 1, 3, 3, 2]
+    assert all(query.startswith("UNWIND $rows") for query, _ in transactions[0])
+    assert "MERGE (n:" in transactions[2][0][0]
+    assert "MATCH (a:`Person`" in transactions[3][0][0]
+    assert "DETACH DELETE old" in transactions[3][1][0]
+    assert "(c:`DatePrecise`" in transactions[3][2][0]
+
+    phases = [batch.phase for batch in report.batches]
+    assert phases == ["nodes"] * 3 + ["relations"] * 3
+    assert report.items == 5
+    assert report.rows_written == 13
+    assert not report.failures
+
+
+def test_bulk_import_reports_failed_transactions(executor):
+    failed = []
+
+    async def run_transaction(statements):
+        if any(
+            row.get("parent") == uuid.UUID(BOB).hex
+            for _, params in statements
+            for row in params["rows"]
+        ):
+            failed.append(statements)
+            raise RuntimeError("Deadlock")
+        return [[{"written": len(params["rows"])}] for _, params in statements]
+
+    executor.run_transaction.side_effect = run_transaction
+
+    report = asyncio.run(
+        bulk_import(executor, items(), batch_size=10, transaction_size=2)
+    )
+
+    # The failed transaction is reported, and the import goes on
+    [failure] = report.failures
+    assert failure.phase == "relations"
+    assert failure.error == "RuntimeError: Deadlock"
+    # Bob's date of birth was to be deleted and created again in the transaction
+    # that failed, so the one he had is kept
+    [[_, delete, create]] = failed
+    assert "DETACH DELETE old" in delete[0] and "CREATE (p)" in create[0]
+    assert report.batches[-1].error is None
+    assert "failed: RuntimeError: Deadlock" in str(report)
+
+
+def test_bulk_import_endpoint(executor):
+    app.dependency_overrides[get_query_executor] = lambda: executor
+    client = TestClient(app)
+    response = client.post(
+        "/login/", data={"username": "johndoe", "password": "secret"}
+    )
+    client = LoggedInClient(app, access_token=response.json()["access_token"])
+    try:
+        response = client.post(
+            "/bulk-import/", params={"batchSize": 100}, json={"items": items()}
+        )
+        assert response.status_code == 200
+        assert response.json()["rowsWritten"] == 13
+        [nodes, *_] = executor.run_transaction.call_args_list[0].args[0]
+        assert nodes[1]["rows"][0]["created"]["created_by"] == "johndoe"
+
+        executor.run_transaction.reset_mock()
+        response = client.post(
+            "/bulk-import/", json={"items": [*items(), {"realType": "person"}]}
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["index"] == 5
+        executor.run_transaction.assert_not_called()
+    finally:
+        app.dependency_overrides.pop(get_query_executor)
+
+
+def test_bulk_import_command(mocker, tmp_path, capsys):
+    path = tmp_path / "items.json"
+    path.write_text(json.dumps({"items": items()}))
+    run_transaction = mocker.patch(
+        "pros_core.db.executor.ThreadpoolQueryExecutor.run_transaction_sync",
+        side_effect=lambda statements: [
+            [{"written": len(params["rows"])}] for _, params in statements
+        ],
+    )
+
+    main(["testing_app.app.core.config:settings", str(path), "--batch-size", "2"])
+
+    assert run_transaction.call_count == 2
+    assert "5 items: 13 rows written in 2 transactions" in capsys.readouterr().out
+
+
+def test_bulk_import_adds_nodes_to_label_index(executor):
+    async def run_transaction(statements):
+        if "(n:`Potato`" in statements[0][0]:
+            raise RuntimeError("Deadlock")
+        return [[{"written": len(params["rows"])}] for _, params in statements]
+
+    executor.run_transaction.side_effect = run_transaction
+    label_index = LabelIndex(["Person", "Potato"])
+    set_label_index(label_index)
+    try:
+        asyncio.run(bulk_import(executor, items(), batch_size=10, transaction_size=1))
+    finally:
+        set_label_index(None)
+
+    # Nodes of committed transactions only
+    assert len(label_index) == 2
+    [alice] = label_index.search("Ali", ["Person"], 10)
+    assert alice["uid"] == uuid.UUID(ALICE).hex
+    assert label_index.search("Spud", ["Potato"], 10) == []
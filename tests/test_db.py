@@ -0,0 +1,617 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from pros_core.db import (
+    MAX_PAGE_SIZE,
+    Cursor,
+    InvalidCursor,
+    LabelIndex,
+    QueryExecutor,
+    QueryTemplateRegistry,
+    build_search_string,
+    compile_projection,
+    fetch_node,
+    fetch_page,
+    get_query_executor,
+    set_label_index,
+    stream_batches,
+)
+from pros_core.db.label_index import MAX_INDEXED_LABEL_LENGTH
+from pros_core.setup_app import setup_app
+from pros_core.setup_utils import ModelManager
+from pros_core.setup_utils.build_pydantic_return_models import (
+    build_pydantic_return_model,
+)
+from testing_app.app.core.config import settings
+from tests.testing_app.app.main import app
+from tests.utils import LoggedInClient
+
+setup_app(app, settings)
+
+
+def person_item(label, uid):
+    return {"item": {"uid": uid, "label": label, "real_type": "person"}}
+
+
+@pytest.fixture
+def executor(mocker):
+    executor = mocker.Mock(spec=QueryExecutor)
+    executor.run = mocker.AsyncMock(return_value=[])
+    return executor
+
+
+@pytest.fixture
+def logged_in_client(executor) -> LoggedInClient:
+    app.dependency_overrides[get_query_executor] = lambda: executor
+    client = TestClient(app)
+    response = client.post(
+        "/login/", data={"username": "johndoe", "password": "secret"}
+    )
+    yield LoggedInClient(app, access_token=response.json()["access_token"])
+    app.dependency_overrides.pop(get_query_executor)
+
+
+def test_cursor_round_trip():
+    cursor = Cursor(label="Mister Gorilla", uid="a" * 32)
+    assert Cursor.decode(cursor.encode()) == cursor
+    assert Cursor.decode(Cursor(label=None, uid="b").encode()).label is None
+
+    for invalid in ["not a cursor", "", "W10", Cursor(label=1, uid="c").encode()]:
+        with pytest.raises(InvalidCursor):
+            Cursor.decode(invalid)
+
+
+def test_fetch_first_page(executor):
+    from test_app.models import Person
+
+    executor.run.return_value = [
+        person_item("Alice", "1"),
+        person_item("Bob", "2"),
+        person_item("Carol", "3"),
+    ]
+
+    page = asyncio.run(fetch_page(executor, ModelManager(Person), page_size=2))
+
+    assert [item["label"] for item in page["items"]] == ["Alice", "Bob"]
+    assert Cursor.decode(page["next_cursor"]) == Cursor(label="Bob", uid="2")
+
+    # Only labelled nodes needed: no query for unlabelled ones
+    executor.run.assert_called_once()
+    query, params = executor.run.call_args.args
+    assert query.startswith("MATCH (n:`Person`) WHERE")
+    assert "SKIP" not in query
+    assert "ORDER BY n.label, n.uid LIMIT $limit" in query
+    assert params == {"limit": 3}
+
+
+def test_fetch_page_after_cursor_continues_into_unlabelled_nodes(executor):
+    from test_app.models import Person
+
+    executor.run.side_effect = [
+        [person_item("Zoe", "9")],
+        [person_item(None, "4"), person_item(None, "5")],
+    ]
+    cursor = Cursor(label="Bob", uid="2").encode()
+
+    page = asyncio.run(
+        fetch_page(executor, ModelManager(Person), cursor=cursor, page_size=2)
+    )
+
+    assert [item["uid"] for item in page["items"]] == ["9", "4"]
+    assert Cursor.decode(page["next_cursor"]) == Cursor(label=None, uid="4")
+
+    (labelled_query, labelled_params), (unlabelled_query, unlabelled_params) = [
+        call.args for call in executor.run.call_args_list
+    ]
+    assert "n.label >= $after_label" in labelled_query
+    assert labelled_params == {"after_label": "Bob", "after_uid": "2", "limit": 3}
+    # Starts from the first unlabelled node, and only fetches what's left of the page
+    assert "n.label IS NULL" in unlabelled_query
+    assert unlabelled_params == {"limit": 2}
+
+
+def test_fetch_page_after_unlabelled_cursor(executor):
+    from test_app.models import Person
+
+    cursor = Cursor(label=None, uid="4").encode()
+    page = asyncio.run(fetch_page(executor, ModelManager(Person), cursor=cursor))
+
+    assert page == {"items": [], "next_cursor": None}
+    executor.run.assert_called_once()
+    query, params = executor.run.call_args.args
+    assert "n.label IS NULL AND n.uid > $after_uid" in query
+    assert params["after_uid"] == "4"
+
+
+ALICE_UID = "550e8400e29b41d4a716446655440000"
+
+
+def person_node():
+    """A Person as returned by its projection"""
+    return {
+        "uid": ALICE_UID,
+        "label": "Alice",
+        "real_type": "person",
+        "last_dependent_change": "2023-06-07T10:18:45.871Z",
+        "has_books": [],
+        "owns_pets": [
+            {
+                "uid": "6ba7b8109dad41d180b400c04fd430c8",
+                "label": "Rex",
+                "real_type": "pet",
+                "relation_data": {"purchased_when": "1900"},
+            }
+        ],
+        "owns_things": [],
+        "has_root_vegetable": [
+            {
+                "uid": "7c9e6679742540de944be07fc1f90ae7",
+                "label": "Spud",
+                "real_type": "potato",
+            }
+        ],
+        "date_of_birth": [
+            {
+                "uid": "9f8e7d6c5b4a4c3d8e2f1a0b9c8d7e6f",
+                "real_type": "dateprecise",
+                "date": "1890-01-01",
+                "calendar_format": [],
+            }
+        ],
+        "is_author_of": [],
+    }
+
+
+def test_projection_reads_node_with_relations_in_one_query():
+    from test_app.models import Person
+
+    projection = compile_projection(ModelManager(Person))
+
+    # Relations, child nodes and reverse relations are pattern comprehensions
+    # within the projection, not separate queries
+    assert projection.startswith("n {.uid, real_type: toLower(n.real_type)")
+    assert (
+        "`has_books`: [(n)-[:`HAS_BOOKS`]->(n_m:`Book`) "
+        "WHERE NOT coalesce(n_m.is_deleted, false) | "
+        "n_m {.uid, .label, real_type: toLower(n_m.real_type)}]"
+    ) in projection
+    # Relation data
+    assert (
+        "[(n)-[n_r:`OWNS_PETS`]->(n_m:`Pet`) "
+        "WHERE NOT coalesce(n_m.is_deleted, false) | "
+        "n_m {.uid, .label, real_type: toLower(n_m.real_type), "
+        "relation_data: n_r {.`purchased_when`}}]"
+    ) in projection
+    # Child nodes in full, including their own relations, told apart by label
+    assert (
+        "`date_of_birth`: [(n)-[:`DATE_OF_BIRTH`]->(n_c:`DateBase`) | "
+        "CASE WHEN n_c:`DateImprecise` THEN n_c {.uid, real_type: 'dateimprecise'"
+    ) in projection
+    assert "[(n_c)-[:`CALENDAR_FORMAT`]->(n_c_m:`Calendar`)" in projection
+    # Reverse relations
+    assert "`is_author_of`: [(n)<-[:`AUTHOR`]-(n_m:`Book`)" in projection
+
+    # Compiled once
+    assert compile_projection(ModelManager(Person)) is projection
+
+
+def test_projection_of_abstract_model_covers_subclasses():
+    from test_app.models import RootVegetable
+
+    projection = compile_projection(ModelManager(RootVegetable))
+
+    assert projection.startswith("CASE n.real_type WHEN 'Potato' THEN n {")
+    assert "WHEN 'Turnip' THEN n {" in projection
+
+
+def test_query_templates_are_built_once(executor):
+    from test_app.models import Person
+
+    # Warmed up by setup_app
+    for operation in ["projection", "detail", "list", "list_after"]:
+        assert (Person, operation, None) in QueryTemplateRegistry
+    stats = QueryTemplateRegistry.stats
+
+    cursor = Cursor(label="Bob", uid="2").encode()
+    for _ in range(2):
+        asyncio.run(fetch_page(executor, ModelManager(Person), cursor=cursor))
+        asyncio.run(fetch_node(executor, ModelManager(Person), ALICE_UID))
+
+    assert QueryTemplateRegistry.stats["misses"] == stats["misses"]
+    assert QueryTemplateRegistry.stats["hits"] > stats["hits"]
+    # The same query text for each request, with values only in parameters
+    (first_list, first_unlabelled, first_detail), second = (
+        executor.run.call_args_list[:3],
+        executor.run.call_args_list[3:],
+    )
+    assert [call.args[0] for call in second] == [
+        first_list.args[0],
+        first_unlabelled.args[0],
+        first_detail.args[0],
+    ]
+    assert "Bob" not in first_list.args[0]
+    assert ALICE_UID not in first_detail.args[0]
+
+
+def test_query_templates_for_field_selection(executor):
+    from test_app.models import Person
+
+    asyncio.run(
+        fetch_node(
+            executor, ModelManager(Person), ALICE_UID, fields=["name", "has_books"]
+        )
+    )
+    query = executor.run.call_args.args[0]
+    assert "`has_books`:" in query and ".`name`" in query
+    # Always projected
+    assert ".`label`" in query and "real_type:" in query
+    assert "`owns_pets`" not in query and "`is_male`" not in query
+
+    # The same selection in any order is the same query
+    misses = QueryTemplateRegistry.misses
+    asyncio.run(
+        fetch_node(
+            executor, ModelManager(Person), ALICE_UID, fields=["has_books", "name"]
+        )
+    )
+    assert QueryTemplateRegistry.misses == misses
+    assert executor.run.call_args.args[0] is query
+
+
+def test_list_endpoint(logged_in_client, executor):
+    executor.run.side_effect = [[{"item": person_node()}], []]
+
+    response = logged_in_client.get("/entities/person/", params={"pageSize": 10})
+
+    assert response.status_code == 200
+    page = response.json()
+    assert page["nextCursor"] is None
+    assert [item["label"] for item in page["items"]] == ["Alice"]
+    assert page["items"][0]["ownsPets"] == [
+        {
+            "uid": "6ba7b810-9dad-41d1-80b4-00c04fd430c8",
+            "label": "Rex",
+            "realType": "pet",
+            "relationData": {"purchasedWhen": "1900"},
+        }
+    ]
+    assert page["items"][0]["dateOfBirth"][0]["realType"] == "dateprecise"
+
+    query, params = executor.run.call_args_list[0].args
+    assert compile_projection(ModelManager("Person")) in query
+    assert params["limit"] == 11
+
+
+def test_no_list_or_detail_routes_for_child_nodes(logged_in_client, executor):
+    # Child nodes have no uid or label to page them by
+    for path in [
+        "/entities/dateprecise/",
+        "/entities/datebase/",
+        f"/entities/dateprecise/{ALICE_UID}/",
+        "/entities/personidentification/",
+    ]:
+        assert logged_in_client.get(path).status_code == 404
+    executor.run.assert_not_called()
+
+
+def test_list_endpoint_of_abstract_model(logged_in_client, executor, mocker):
+    from test_app.models import Potato, Turnip
+
+    def vegetable(real_type, label):
+        return {
+            "uid": str(uuid.uuid4()),
+            "real_type": real_type,
+            "label": label,
+            "last_dependent_change": "2023-06-07T10:18:45.871Z",
+        }
+
+    executor.run.side_effect = [
+        [{"item": vegetable("turnip", "Swede")}, {"item": vegetable("potato", "Spud")}],
+        [],
+    ]
+    potato_model = build_pydantic_return_model(Potato)
+    turnip_model = build_pydantic_return_model(Turnip)
+    validated_as_potato = mocker.spy(potato_model, "parse_obj")
+    validated_as_turnip = mocker.spy(turnip_model, "parse_obj")
+
+    response = logged_in_client.get("/entities/rootvegetable/")
+
+    assert response.status_code == 200
+    assert [item["realType"] for item in response.json()["items"]] == [
+        "turnip",
+        "potato",
+    ]
+    # Every subclass in one query on the label of the abstract model, and each row
+    # validated against the return model of its real_type only
+    query, _ = executor.run.call_args_list[0].args
+    assert query.startswith("MATCH (n:`RootVegetable`)")
+    assert validated_as_turnip.call_count == 1
+    assert validated_as_potato.call_count == 1
+
+
+def test_stream_batches(executor):
+    from test_app.models import Person
+
+    def items(*uids, label="Alice"):
+        return [person_item(label, uid) for uid in uids]
+
+    executor.run.side_effect = [
+        items("1", "2"),
+        items("3"),
+        items("4", label=None),
+        [],
+    ]
+
+    async def collect():
+        return [
+            batch
+            async for batch in stream_batches(
+                executor, ModelManager(Person), batch_size=2
+            )
+        ]
+
+    batches = asyncio.run(collect())
+
+    assert [[item["uid"] for item in batch] for batch in batches] == [
+        ["1", "2"],
+        ["3", "4"],
+    ]
+    # Each batch seeks to the end of the one before, going on from the labelled
+    # nodes into the unlabelled ones
+    params = [call.args[1] for call in executor.run.call_args_list]
+    assert params == [
+        {"limit": 2},
+        {"after_label": "Alice", "after_uid": "2", "limit": 2},
+        {"limit": 1},
+        {"after_uid": "4", "limit": 2},
+    ]
+
+
+def test_list_endpoint_streams_ndjson(logged_in_client, executor):
+    executor.run.side_effect = [[{"item": person_node()}], []]
+
+    response = logged_in_client.get(
+        "/entities/person/", headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert len(lines) == 1
+    # Each node as the list endpoint returns it
+    assert json.loads(lines[0])["ownsPets"][0]["relationData"] == {
+        "purchasedWhen": "1900"
+    }
+
+    for params in [{"q": "ali"}, {"cursor": "not a cursor"}]:
+        response = logged_in_client.get(
+            "/entities/person/",
+            params=params,
+            headers={"Accept": "application/x-ndjson"},
+        )
+        assert response.status_code == 400
+
+
+def test_detail_endpoint(logged_in_client, executor):
+    executor.run.return_value = [{"item": person_node()}]
+
+    response = logged_in_client.get(f"/entities/person/{ALICE_UID}/")
+
+    assert response.status_code == 200
+    assert response.json()["uid"] == "550e8400-e29b-41d4-a716-446655440000"
+    assert response.json()["hasRootVegetable"] == [
+        {
+            "uid": "7c9e6679-7425-40de-944b-e07fc1f90ae7",
+            "label": "Spud",
+            "realType": "potato",
+        }
+    ]
+    # A single query for the node and everything related to it
+    executor.run.assert_called_once()
+    query, params = executor.run.call_args.args
+    assert query.startswith("MATCH (n:`Person` {uid: $uid})")
+    assert params == {"uid": ALICE_UID}
+
+
+def test_detail_endpoint_not_found(logged_in_client, executor):
+    response = logged_in_client.get(f"/entities/person/{ALICE_UID}/")
+    assert response.status_code == 404
+
+
+def test_list_endpoint_rejects_bad_parameters(logged_in_client, executor):
+    response = logged_in_client.get("/entities/person/", params={"cursor": "nope"})
+    assert response.status_code == 400
+
+    response = logged_in_client.get(
+        "/entities/person/", params={"pageSize": MAX_PAGE_SIZE + 1}
+    )
+    assert response.status_code == 422
+    executor.run.assert_not_called()
+
+
+def test_build_search_string():
+    assert build_search_string("Mister Gor") == "+mister +(gor^2 gor*)"
+    assert build_search_string("gor") == "+(gor^2 gor*)"
+    # Lucene syntax is escaped
+    assert build_search_string("a:b (c)") == r"+a\:b +(\(c\)^2 \(c\)*)"
+    assert build_search_string("   ") is None
+
+
+def test_list_endpoint_autocomplete(logged_in_client, executor):
+    executor.run.return_value = [{"item": person_node()}]
+
+    response = logged_in_client.get(
+        "/entities/entity/", params={"q": "ali", "pageSize": 5}
+    )
+
+    assert response.status_code == 200
+    assert [item["label"] for item in response.json()["items"]] == ["Alice"]
+    assert response.json()["nextCursor"] is None
+
+    # One query on the fulltext index, for nodes with the label of the model,
+    # which subclasses' nodes also have
+    executor.run.assert_called_once()
+    query, params = executor.run.call_args.args
+    assert query.startswith(
+        "CALL db.index.fulltext.queryNodes($index, $search) YIELD node AS n "
+        "WHERE n:`Entity` AND"
+    )
+    assert "CONTAINS" not in query and "ORDER BY" not in query
+    assert params == {
+        "index": "pros_label_fulltext",
+        "search": "+(ali^2 ali*)",
+        "limit": 5,
+    }
+
+
+def test_list_endpoint_autocomplete_from_label_index(logged_in_client, executor):
+    index = LabelIndex.for_models(ModelManager, ["Entity"])
+    index.add(ALICE_UID, "Alice", "Person")
+    index.add("1" * 32, "Bob", "Person")
+    set_label_index(index)
+    executor.run.return_value = [{"item": person_node()}]
+    try:
+        response = logged_in_client.get("/entities/entity/", params={"q": "ali"})
+    finally:
+        set_label_index(None)
+
+    assert response.status_code == 200
+    assert [item["label"] for item in response.json()["items"]] == ["Alice"]
+    # The matches are found in the index, and only their nodes read in full
+    query, params = executor.run.call_args.args
+    assert query.startswith("UNWIND $uids AS uid MATCH (n:`Entity` {uid: uid})")
+    assert params == {"uids": [ALICE_UID]}
+
+
+def test_list_endpoint_autocomplete_parameters(logged_in_client, executor):
+    cursor = Cursor(label="Bob", uid="2").encode()
+    response = logged_in_client.get(
+        "/entities/person/", params={"q": "ali", "cursor": cursor}
+    )
+    assert response.status_code == 400
+    executor.run.assert_not_called()
+
+    # A blank q is no filter at all
+    response = logged_in_client.get("/entities/person/", params={"q": " "})
+    assert response.status_code == 200
+    assert executor.run.call_args_list[0].args[0].startswith("MATCH (n:`Person`)")
+
+
+def test_label_index_search():
+    index = LabelIndex(["Person", "Pet"])
+    index.add("1", "Alice Gorilla", "Person")
+    index.add("2", "Mister Gorilla", "Pet")
+    index.add("3", "Gorilla", "Person")
+    index.add("4", "Gorillaz Band", "Organisation")  # Not indexed
+    index.add("5", None, "Person")
+
+    assert len(index) == 3
+    # Labels starting with q first, then the shortest
+    assert [item["uid"] for item in index.search("gor", ["Person", "Pet"], 10)] == [
+        "3",
+        "1",
+        "2",
+    ]
+    assert index.search("mister g", ["Person", "Pet"], 10) == [
+        {"uid": "2", "label": "Mister Gorilla", "real_type": "pet"}
+    ]
+    # Words match at their start only, in any order
+    assert index.search("rilla", ["Person", "Pet"], 10) == []
+    assert [i["uid"] for i in index.search("g a", ["Person"], 10)] == ["1"]
+    assert [i["uid"] for i in index.search("g", ["Person", "Pet"], 2)] == ["3", "1"]
+    assert index.search("  ", ["Person"], 10) == []
+
+    # Only the start of a long label is kept
+    index.add("6", "Gorilla " * 100, "Pet")
+    [long_label] = index.search("gorilla gor", ["Pet"], 1)
+    assert len(long_label["label"]) == MAX_INDEXED_LABEL_LENGTH
+    index.remove("6")
+
+    # Updated, and removed
+    index.add("3", "Bonobo", "Person")
+    assert [i["uid"] for i in index.search("gor", ["Person"], 10)] == ["1"]
+    index.remove("1")
+    index.remove("1")
+    assert index.search("gor", ["Person"], 10) == []
+    assert index.stats["entries"] == 2
+
+
+def test_label_index_is_kept_up_to_date_on_save_and_delete():
+    from test_app.models import Person
+
+    index = LabelIndex.for_models(ModelManager, ["Entity"])
+    assert {"Entity", "Animal", "Pet", "Person", "Organisation"} <= index.real_types
+    set_label_index(index)
+    try:
+        person = Person(uid="a" * 32, label="Alice", real_type="Person")
+        person.post_save()
+        assert index.search("ali", ["Person"], 10)[0]["uid"] == "a" * 32
+
+        person.is_deleted = True
+        person.post_save()
+        assert len(index) == 0
+
+        person.is_deleted = False
+        person.post_save()
+        person.post_delete()
+        assert len(index) == 0
+    finally:
+        set_label_index(None)
+
+
+def test_label_index_load(executor):
+    batches = [
+        [{"uid": "1", "label": "Alice", "real_type": "Person"}] * 2,
+        [{"uid": "2", "label": "Rex", "real_type": "Pet"}],
+    ]
+    executor.run.side_effect = batches
+
+    index = LabelIndex.for_models(ModelManager, ["Entity"])
+    asyncio.run(index.load(executor, ModelManager, batch_size=2))
+
+    assert len(index) == 2
+    # Subclasses' nodes have the label of Entity, so only it is read, in batches
+    # in uid order
+    queries = [call.args for call in executor.run.call_args_list]
+    assert [params for _, params in queries] == [
+        {"after": "", "limit": 2},
+        {"after": "1", "limit": 2},
+    ]
+    assert queries[0][0].startswith("MATCH (n:`Entity`) WHERE n.uid > $after")
+
+
+def test_autocomplete_endpoint(logged_in_client, executor):
+    alice, pet, organisation = (uuid.uuid4() for _ in range(3))
+    index = LabelIndex.for_models(ModelManager, ["Entity"])
+    index.add(alice.hex, "Alice", "Person")
+    index.add(pet.hex, "Alice Pet", "Pet")
+    index.add(organisation.hex, "Alice Organisation", "Organisation")
+    set_label_index(index)
+    try:
+        response = logged_in_client.get(
+            "/entities/animal/autocomplete/", params={"q": "ali"}
+        )
+    finally:
+        set_label_index(None)
+
+    # From the index, for the model and its subclasses
+    assert response.status_code == 200
+    assert response.json() == [
+        {"realType": "person", "uid": str(alice), "label": "Alice"},
+        {"realType": "pet", "uid": str(pet), "label": "Alice Pet"},
+    ]
+    executor.run.assert_not_called()
+
+    # Without an index of the model's nodes, from the fulltext index
+    executor.run.return_value = [person_item("Alice", alice.hex)]
+    response = logged_in_client.get(
+        "/entities/person/autocomplete/", params={"q": "ali", "limit": 3}
+    )
+    assert response.status_code == 200
+    assert response.json()[0]["label"] == "Alice"
+    query, params = executor.run.call_args.args
+    assert query.startswith("CALL db.index.fulltext.queryNodes")
+    assert params["limit"] == 3
@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pros_core.db import (
+    AsyncDriverQueryExecutor,
+    SyncCallTimeout,
+    SyncExecutor,
+    SyncExecutorBusy,
+    SyncExecutorDependency,
+    setup_sync_executor,
+)
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for record in self.records:
+            yield record
+
+
+class FakeTransaction:
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, query, params):
+        self.session.queries.append((self.session.mode, query, params))
+        await asyncio.sleep(0.01)
+        return FakeResult([{"n": params.get("n", 0)}, {"n": params.get("n", 0) + 1}])
+
+
+class FakeSession:
+    def __init__(self, driver, **config):
+        self.driver = driver
+        self.config = config
+        self.queries = driver.queries
+        self.mode = None
+
+    async def __aenter__(self):
+        self.driver.open_sessions += 1
+        self.driver.most_open_sessions = max(
+            self.driver.most_open_sessions, self.driver.open_sessions
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.driver.open_sessions -= 1
+
+    async def execute_read(self, work, *args):
+        self.mode = "read"
+        return await work(FakeTransaction(self), *args)
+
+    async def execute_write(self, work, *args):
+        self.mode = "write"
+        return await work(FakeTransaction(self), *args)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.queries = []
+        self.sessions = []
+        self.open_sessions = 0
+        self.most_open_sessions = 0
+
+    def session(self, **config):
+        session = FakeSession(self, **config)
+        self.sessions.append(session)
+        return session
+
+
+def test_async_driver_executor_runs_reads_and_writes():
+    driver = FakeDriver()
+    executor = AsyncDriverQueryExecutor(driver, database="pros", fetch_size=500)
+
+    rows = asyncio.run(executor.run("RETURN $n AS n", {"n": 1}))
+    results = asyncio.run(
+        executor.run_transaction([("CREATE (a)", {"n": 5}), ("CREATE (b)", {})])
+    )
+
+    assert rows == [{"n": 1}, {"n": 2}]
+    assert results == [[{"n": 5}, {"n": 6}], [{"n": 0}, {"n": 1}]]
+    # Reads and writes are each run in one managed transaction, of the right kind
+    assert driver.queries == [
+        ("read", "RETURN $n AS n", {"n": 1}),
+        ("write", "CREATE (a)", {"n": 5}),
+        ("write", "CREATE (b)", {}),
+    ]
+    assert [session.config for session in driver.sessions] == [
+        {"database": "pros", "fetch_size": 500}
+    ] * 2
+    assert driver.open_sessions == 0
+
+
+def test_async_driver_executor_runs_queries_concurrently():
+    driver = FakeDriver()
+    executor = AsyncDriverQueryExecutor(driver)
+
+    async def run_all():
+        return await asyncio.gather(
+            *(executor.run("RETURN $n AS n", {"n": n}) for n in range(10))
+        )
+
+    results = asyncio.run(run_all())
+
+    assert [rows[0]["n"] for rows in results] == list(range(10))
+    # Each query waits for the database in its own session, without blocking the
+    # others
+    assert driver.most_open_sessions == 10
+
+
+def test_sync_executor_runs_calls_in_its_pool():
+    executor = SyncExecutor(max_workers=2)
+    request_id = contextvars.ContextVar("request_id")
+
+    def call(a, b=0):
+        return threading.current_thread().name, request_id.get(), a + b
+
+    async def run():
+        request_id.set("r1")
+        return await executor.run(call, 1, b=2)
+
+    thread, value, result = asyncio.run(run())
+
+    # In a thread of its own pool, with the caller's context
+    assert thread.startswith("pros-sync")
+    assert (value, result) == ("r1", 3)
+    metrics = executor.metrics
+    assert (metrics.submitted, metrics.completed, metrics.running) == (1, 1, 0)
+    executor.shutdown()
+
+
+def test_sync_executor_rejects_calls_beyond_its_queue():
+    executor = SyncExecutor(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def run():
+        first = asyncio.ensure_future(executor.run(release.wait))
+        second = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        metrics = executor.metrics
+        with pytest.raises(SyncExecutorBusy):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(first, second)
+        return metrics
+
+    metrics = asyncio.run(run())
+
+    assert (metrics.running, metrics.queued, metrics.max_queued) == (1, 1, 1)
+    metrics = executor.metrics
+    assert (metrics.completed, metrics.rejected, metrics.queued) == (2, 1, 0)
+    executor.shutdown()
+
+
+def test_sync_executor_timeouts():
+    executor = SyncExecutor(max_workers=1, timeout=0.05)
+    release = threading.Event()
+    queued_call = []
+
+    async def run():
+        with pytest.raises(SyncCallTimeout):
+            await executor.run(release.wait)
+        # Queued behind the call still running, and never started
+        with pytest.raises(SyncCallTimeout):
+            await executor.run(queued_call.append, 1)
+        release.set()
+        return await executor.run(sum, [1, 2], timeout=None)
+
+    assert asyncio.run(run()) == 3
+    executor.shutdown()
+    assert queued_call == []
+    metrics = executor.metrics
+    assert (metrics.timed_out, metrics.completed, metrics.queued) == (2, 2, 0)
+
+
+def test_sync_executor_errors_are_responses():
+    app = FastAPI()
+    setup_sync_executor(app, SimpleNamespace(SYNC_EXECUTOR_TIMEOUT=0.01))
+    release = threading.Event()
+
+    @app.get("/slow/")
+    async def slow(sync_executor: SyncExecutor = SyncExecutorDependency):
+        await sync_executor.run(release.wait)
+
+    @app.get("/busy/")
+    async def busy():
+        raise SyncExecutorBusy("8 calls running and 64 queued")
+
+    with TestClient(app) as client:
+        assert client.get("/slow/").status_code == 504
+        release.set()
+        response = client.get("/busy/")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
@@ -20,6 +20,37 @@ def test_build_pydantic_return_child_nodes():
     assert types["date_of_birth"][0].min_items == 1
 
 
+def test_pydantic_model_registry_builds_each_model_once():
+    from pros_core.setup_utils.build_pydantic_return_models import (
+        PydanticModelRegistry,
+        build_pydantic_return_model,
+        build_relation_return_model,
+    )
+    from test_app.models import Book, Person
+
+    PydanticPerson = build_pydantic_return_model(Person)
+    assert PydanticModelRegistry.get(("model", Person, None, None)) is PydanticPerson
+    assert PydanticModelRegistry.key_for(PydanticPerson) == (
+        "model",
+        Person,
+        None,
+        None,
+    )
+
+    hits, misses = PydanticModelRegistry.hits, PydanticModelRegistry.misses
+    assert build_pydantic_return_model(Person) is PydanticPerson
+    assert (
+        build_relation_return_model(
+            relationship_from_neomodel_class=Person,
+            relationship_name="has_books",
+            relationship_to_neomodel_class=Book,
+        )
+        is PydanticPerson.__fields__["has_books"].type_.__args__[0]
+    )
+    assert PydanticModelRegistry.hits == hits + 2
+    assert PydanticModelRegistry.misses == misses
+
+
 def test_build_pydantic_model_for_person():
     from pros_core.setup_utils.build_pydantic_return_models import (
         build_pydantic_return_model,
@@ -998,3 +1029,24 @@ def test_build_pydantic_model_for_person():
         },
     },
 }
+
+
+def test_build_pydantic_model_with_reverse_relation_from_unapplied_trait():
+    from pros_core.models import AbstractNode, AbstractTrait, RelationshipTo
+    from pros_core.setup_utils.build_pydantic_return_models import (
+        build_pydantic_model,
+    )
+
+    class UnappliedTrait(AbstractTrait):
+        relates_to = RelationshipTo(
+            "UnappliedTraitTarget", "is_related_from_unapplied_trait"
+        )
+
+    class UnappliedTraitTarget(AbstractNode):
+        pass
+
+    model = build_pydantic_model(UnappliedTraitTarget)
+    assert (
+        get_type_hints(model)["is_related_from_unapplied_trait"]
+        == Union[list, None]
+    )
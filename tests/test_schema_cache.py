@@ -0,0 +1,96 @@
+import pytest
+from pros_core.setup_app import setup_app
+from pros_core.setup_utils import import_models, import_traits
+from pros_core.setup_utils.model_manager import ModelManager, ModelManagerClass
+from pros_core.setup_utils.schema_cache import SchemaCache, fingerprint_installed_apps
+from testing_app.app.core.config import settings
+from testing_app.app.main import app
+
+setup_app(app, settings)
+
+
+@pytest.fixture
+def pros_models(monkeypatch):
+    models = import_models(settings) + import_traits(settings)
+
+    # Loading a cache re-injects the loaded AppModels into the model classes,
+    # so put back the ones from the global ModelManager afterwards
+    for _, _, model in models:
+        monkeypatch.setattr(
+            model, "_app_model", getattr(model, "_app_model", None), raising=False
+        )
+    return models
+
+
+def test_fingerprint_is_stable():
+    assert fingerprint_installed_apps(settings) == fingerprint_installed_apps(settings)
+
+
+def test_fingerprint_covers_pros_core_source(monkeypatch):
+    from pros_core.setup_utils import schema_cache
+
+    fingerprint = fingerprint_installed_apps(settings)
+    monkeypatch.setattr(schema_cache, "fingerprint_pros_core", lambda: "upgraded")
+    assert fingerprint_installed_apps(settings) != fingerprint
+
+
+def test_schema_cache_round_trip(tmp_path, pros_models):
+    from test_app.models import Book, Entity, Person
+
+    SchemaCache(str(tmp_path), "fingerprint").save(pros_models, ModelManager)
+
+    MM = ModelManagerClass()
+    assert SchemaCache(str(tmp_path), "fingerprint").load(pros_models, MM)
+
+    assert len(MM.models) == len(ModelManager.models)
+
+    person = MM.get_model(Person)
+    original_person = ModelManager.get_model(Person)
+    assert person is not original_person
+    assert person._mm is MM
+    assert person.model_class is Person
+    assert Person._app_model is person
+    assert MM.is_subclass(Person, Entity)
+
+    # Neomodel properties and relationship models are the originals, not copies
+    assert person.properties == original_person.properties
+    assert person.properties["label"] is Person.label
+    assert (
+        person.relationships["has_books"].relation_model
+        is original_person.relationships["has_books"].relation_model
+    )
+    assert person.relationships["has_books"].target_model is Book
+    assert person.subclasses == original_person.subclasses
+    assert person.parent_classes == original_person.parent_classes
+    assert person.reverse_relationships == original_person.reverse_relationships
+    assert person.child_nodes.keys() == original_person.child_nodes.keys()
+
+    assert (
+        person.pydantic_return_model.schema()
+        == original_person.pydantic_return_model.schema()
+    )
+
+
+def test_schema_cache_invalidated_by_fingerprint(tmp_path, pros_models):
+    SchemaCache(str(tmp_path), "fingerprint").save(pros_models, ModelManager)
+
+    MM = ModelManagerClass()
+    assert not SchemaCache(str(tmp_path), "changed").load(pros_models, MM)
+    assert MM.models == []
+
+
+def test_schema_cache_missing(tmp_path, pros_models):
+    assert not SchemaCache(str(tmp_path), "fingerprint").load(
+        pros_models, ModelManagerClass()
+    )
+
+
+def test_schema_cache_from_settings(tmp_path):
+    assert SchemaCache.from_settings(settings) is None
+
+    class CacheSettings(type(settings)):
+        SCHEMA_CACHE_DIR: str = str(tmp_path)
+
+    schema_cache = SchemaCache.from_settings(CacheSettings())
+    assert schema_cache.cache_dir == str(tmp_path)
+    assert schema_cache.fingerprint == fingerprint_installed_apps(settings)
@@ -0,0 +1,157 @@
+from pros_core.db import (
+    SchemaItem,
+    build_required_schema,
+    plan_schema_sync,
+    sync_schema,
+)
+from pros_core.db.schema_sync import LABEL_FULLTEXT_INDEX, main, parse_existing_item
+from pros_core.setup_app import setup_app
+from pros_core.setup_utils import ModelManager
+from testing_app.app.core.config import settings
+from tests.testing_app.app.main import app
+
+setup_app(app, settings)
+
+
+def test_required_schema():
+    required = {item.name: item for item in build_required_schema(ModelManager)}
+
+    # Concrete and abstract models, which lists are queried by
+    for label in ["Person", "Entity", "RootVegetable"]:
+        assert required[f"pros_{label}_uid"] == SchemaItem(
+            "unique", f"pros_{label}_uid", (label,), ("uid",)
+        )
+        assert required[f"pros_{label}_label"].properties == ("label",)
+        assert required[f"pros_{label}_real_type"].properties == ("real_type",)
+
+    # A trait's label is on the nodes of classes it is applied to
+    assert "pros_Ownable_uid" in required
+
+    # Child nodes have no uid or label
+    assert "pros_DatePrecise_uid" not in required
+    assert "pros_DatePrecise_label" not in required
+
+    fulltext = required[LABEL_FULLTEXT_INDEX]
+    assert fulltext.kind == "fulltext"
+    assert {"Person", "Entity", "Pet"} <= set(fulltext.labels)
+    assert "DatePrecise" not in fulltext.labels
+
+
+def test_plan_creates_only_missing_items():
+    required = [
+        SchemaItem("unique", "pros_Person_uid", ("Person",), ("uid",)),
+        SchemaItem("range", "pros_Person_label", ("Person",), ("label",)),
+        SchemaItem("range", "pros_Pet_label", ("Pet",), ("label",)),
+        SchemaItem("fulltext", LABEL_FULLTEXT_INDEX, ("Person", "Pet"), ("label",)),
+    ]
+    existing = [
+        # Same definition, under another name
+        SchemaItem("unique", "person_uid", ("Person",), ("uid",)),
+        SchemaItem("range", "pros_Person_label", ("Person",), ("label",)),
+        # Created before Pet was added
+        SchemaItem("fulltext", LABEL_FULLTEXT_INDEX, ("Person",), ("label",)),
+    ]
+
+    plan = plan_schema_sync(required, existing)
+
+    assert plan.drop == (existing[2],)
+    assert plan.create == (required[2], required[3])
+    assert plan.statements == [
+        f"DROP INDEX `{LABEL_FULLTEXT_INDEX}` IF EXISTS",
+        "CREATE INDEX `pros_Pet_label` IF NOT EXISTS FOR (n:`Pet`) ON (n.`label`)",
+        f"CREATE FULLTEXT INDEX `{LABEL_FULLTEXT_INDEX}` IF NOT EXISTS "
+        "FOR (n:`Person`|`Pet`) ON EACH [n.`label`]",
+    ]
+
+    assert not plan_schema_sync(required, required)
+    assert str(plan_schema_sync(required, required)) == "Database schema is up to date"
+
+
+def test_parse_existing_items():
+    # Neo4j 4.4
+    assert parse_existing_item(
+        {
+            "name": "constraint_1",
+            "type": "UNIQUENESS",
+            "entityType": "NODE",
+            "labelsOrTypes": ["Person"],
+            "properties": ["uid"],
+        },
+        is_constraint=True,
+    ) == SchemaItem("unique", "constraint_1", ("Person",), ("uid",))
+    assert (
+        parse_existing_item(
+            {
+                "name": "constraint_1",
+                "type": "BTREE",
+                "uniqueness": "UNIQUE",
+                "entityType": "NODE",
+                "labelsOrTypes": ["Person"],
+                "properties": ["uid"],
+            },
+            is_constraint=False,
+        )
+        is None
+    )
+    # Neo4j 5
+    assert parse_existing_item(
+        {
+            "name": "index_1",
+            "type": "RANGE",
+            "entityType": "NODE",
+            "labelsOrTypes": ["Person"],
+            "properties": ["label"],
+            "owningConstraint": None,
+        },
+        is_constraint=False,
+    ) == SchemaItem("range", "index_1", ("Person",), ("label",))
+    assert (
+        parse_existing_item(
+            {"name": "index_2", "type": "LOOKUP", "entityType": "NODE"},
+            is_constraint=False,
+        )
+        is None
+    )
+
+
+def test_sync_schema(mocker):
+    existing_constraints = [
+        {
+            "name": "pros_Person_uid",
+            "type": "UNIQUENESS",
+            "entityType": "NODE",
+            "labelsOrTypes": ["Person"],
+            "properties": ["uid"],
+        }
+    ]
+    run = mocker.Mock(
+        side_effect=lambda query, params: {
+            "SHOW CONSTRAINTS": existing_constraints,
+            "SHOW INDEXES": [],
+        }.get(query, [])
+    )
+
+    plan = sync_schema(ModelManager, run=run, dry_run=True)
+    assert [call.args[0] for call in run.call_args_list] == [
+        "SHOW CONSTRAINTS",
+        "SHOW INDEXES",
+    ]
+    assert "pros_Person_uid" not in {item.name for item in plan.create}
+    assert "pros_Person_label" in {item.name for item in plan.create}
+
+    run.reset_mock()
+    plan = sync_schema(ModelManager, run=run)
+    assert [call.args[0] for call in run.call_args_list[2:]] == plan.statements
+    assert plan.statements[0].startswith("CREATE CONSTRAINT")
+
+
+def test_schema_sync_command_dry_run(mocker, capsys):
+    sync = mocker.patch(
+        "pros_core.db.schema_sync.sync_schema",
+        return_value=plan_schema_sync(build_required_schema(ModelManager), []),
+    )
+
+    main(["testing_app.app.core.config:settings", "--dry-run"])
+
+    sync.assert_called_once_with(ModelManager, dry_run=True)
+    assert "CREATE CONSTRAINT `pros_Person_uid`" in capsys.readouterr().out
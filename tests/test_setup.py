@@ -593,3 +593,382 @@ def test_model_manager_has_pydantic_return_class():
         repr(ModelManager("person").pydantic_return_model)
         == "<class 'pydantic.main.Person'>"
     )
+
+
+def test_class_hierarchy_index():
+    from pros_core.setup_utils.class_hierarchy import ClassHierarchy
+    from test_app.models import (
+        Animal,
+        Book,
+        DefinitelyNonOwnableBook,
+        Entity,
+        NonOwnableBook,
+        Organisation,
+        Ownable,
+        Person,
+        Pet,
+    )
+
+    assert ClassHierarchy[Entity].descendants == (Animal, Pet, Person, Organisation)
+    assert ClassHierarchy[Entity].direct_subclasses == (Animal, Organisation)
+    assert ClassHierarchy[Person].ancestors == (Animal, Entity)
+    assert ClassHierarchy[Person].lineage == (Person, Animal, Entity)
+    assert ClassHierarchy[Entity].depth == 0
+    assert ClassHierarchy[Person].depth == 2
+
+    assert ClassHierarchy[Book].traits == {Ownable}
+    assert ClassHierarchy[NonOwnableBook].traits == set()
+    assert set(ClassHierarchy[Ownable].classes_with_trait) == {Book, Pet}
+    assert DefinitelyNonOwnableBook in ClassHierarchy[Book].descendants
+
+    class NotIndexed(AbstractNode):
+        pass
+
+    assert NotIndexed not in ClassHierarchy
+
+
+def test_model_manager_subtype_and_trait_checks():
+    from test_app.models import (
+        Animal,
+        Book,
+        DateBase,
+        DateImprecise,
+        DatePrecise,
+        Entity,
+        NonOwnableBook,
+        Ownable,
+        Person,
+        Pet,
+        Potato,
+        RootVegetable,
+        Turnip,
+    )
+
+    assert ModelManager.is_subclass(Person, Entity)
+    assert ModelManager.is_subclass(Person, Person)
+    assert ModelManager.is_subclass("person", "TestApp.Animal")
+    assert not ModelManager.is_subclass(Entity, Person)
+    assert not ModelManager.is_subclass(Book, Entity)
+
+    # Traits apply only to the class they are applied to, not subclasses
+    assert ModelManager.has_trait(Book, Ownable)
+    assert ModelManager.has_trait("pet", "ownable")
+    assert not ModelManager.has_trait(NonOwnableBook, Ownable)
+    assert not ModelManager.has_trait(Person, Ownable)
+    assert set(ModelManager.classes_with_trait(Ownable)) == {Book, Pet}
+
+    assert ModelManager.concrete_descendants(Animal) == (Animal, Pet, Person)
+    assert ModelManager.concrete_descendants(RootVegetable) == (Potato, Turnip)
+    assert ModelManager.concrete_descendants(DateBase) == (DateImprecise, DatePrecise)
+    assert not ModelManager.is_concrete(RootVegetable)
+    assert not ModelManager.is_concrete(Ownable)
+    # Only the model __abstract__ is set on is left out, though is_abstract is
+    # inherited by its subclasses
+    assert ModelManager.is_concrete(Potato)
+    assert Potato.is_abstract
+
+    with pytest.raises(ModelManagerException):
+        ModelManager.is_subclass("NotAModel", Entity)
+
+
+def test_lazy_pydantic_return_model():
+    from pros_core.setup_utils.build_pydantic_return_models import (
+        build_pydantic_return_model,
+        get_built_pydantic_return_model,
+    )
+    from pros_core.setup_utils.model_manager import (
+        create_app_model,
+        warm_up_pydantic_return_models,
+    )
+
+    class LazyReturnModelNode(AbstractNode):
+        pass
+
+    class OtherLazyReturnModelNode(AbstractNode):
+        pass
+
+    MM = ModelManagerClass()
+    lazy = create_app_model("test_app", LazyReturnModelNode, "LazyReturnModelNode", MM)
+    other = create_app_model(
+        "test_app", OtherLazyReturnModelNode, "OtherLazyReturnModelNode", MM
+    )
+    MM.add_model(lazy)
+    MM.add_model(other)
+
+    assert get_built_pydantic_return_model(LazyReturnModelNode) is None
+    assert lazy.pydantic_return_model is build_pydantic_return_model(
+        LazyReturnModelNode
+    )
+    assert lazy.pydantic_return_model is lazy.pydantic_return_model
+
+    assert get_built_pydantic_return_model(OtherLazyReturnModelNode) is None
+    warm_up_pydantic_return_models(MM)
+    assert get_built_pydantic_return_model(
+        OtherLazyReturnModelNode
+    ) is build_pydantic_return_model(OtherLazyReturnModelNode)
+
+
+def test_reflection_results_cached_per_class():
+    from pros_core.models import REFLECTION_CACHE
+    from test_app.models import Book, Ownable
+
+    assert Book.inherited_labels() == ["Book", "Ownable"]
+    assert REFLECTION_CACHE[(Book, "inherited_labels")] == ("Book", "Ownable")
+    assert Book.traits_as_direct_base() == {Ownable}
+    assert (Book, "traits_as_direct_base") in REFLECTION_CACHE
+
+    # Callers get a copy, so can't corrupt the cached value
+    Book.defined_properties(aliases=False, rels=False).clear()
+    assert "ownership_type" in Book.defined_properties(aliases=False, rels=False)
+
+    # Defining a new class invalidates the cache
+    class CacheInvalidatingNode(AbstractNode):
+        pass
+
+    assert (Book, "inherited_labels") not in REFLECTION_CACHE
+    assert CacheInvalidatingNode.inherited_labels() == ["CacheInvalidatingNode"]
+
+
+def test_trait_keeps_own_label():
+    from pros_core.models import AbstractTrait
+    from test_app.models import Book, Ownable
+
+    assert Ownable.inherited_labels() == ["Ownable"]
+    assert Book.inherited_labels() == ["Book", "Ownable"]
+
+    # neomodel requires distinct labels per class, so a second trait can
+    # only be defined if each trait has its own
+    class FirstLabelledTrait(AbstractTrait):
+        pass
+
+    class SecondLabelledTrait(AbstractTrait):
+        pass
+
+    assert FirstLabelledTrait.inherited_labels() == ["FirstLabelledTrait"]
+    assert SecondLabelledTrait.inherited_labels() == ["SecondLabelledTrait"]
+
+
+def test_class_hierarchy_index_discarded_when_indexed_class_subclassed():
+    from pros_core.setup_utils.class_hierarchy import ClassHierarchyIndex
+    from test_app.models import Entity
+
+    class IndexedNode(AbstractNode):
+        pass
+
+    index = ClassHierarchyIndex()
+    index.build([Entity, IndexedNode])
+    assert IndexedNode in index
+
+    class IndexedNodeSubclass(IndexedNode):
+        pass
+
+    assert IndexedNode not in index
+    assert Entity not in index
+
+
+def test_class_hierarchy_index_not_kept_alive_by_hooks():
+    import gc
+    import weakref
+
+    from pros_core.models import CLASS_DEFINITION_HOOKS
+    from pros_core.setup_utils.class_hierarchy import ClassHierarchyIndex
+
+    hooks = len(CLASS_DEFINITION_HOOKS)
+    index = ClassHierarchyIndex()
+    index_ref = weakref.ref(index)
+    assert len(CLASS_DEFINITION_HOOKS) == hooks
+
+    del index
+    gc.collect()
+    assert index_ref() is None
+
+
+def test_model_manager_alias_lookups():
+    from test_app.models import Book, NonOwnableBook
+
+    non_ownable_book = ModelManager.get_model(NonOwnableBook)
+    for identifier in [
+        "NonOwnableBook",
+        "nonownablebook",
+        "non_ownable_book",
+        "nonOwnableBook",
+        "TestApp.NonOwnableBook",
+        "test_app.non_ownable_book",
+        "testapp.nonownablebook",
+    ]:
+        assert identifier in ModelManager.aliases
+        assert ModelManager.get_model(identifier) is non_ownable_book
+
+    # Spellings not in the alias table still resolve by normalizing
+    assert ModelManager.get_model("NONOWNABLEBOOK") is non_ownable_book
+
+    assert "NonOwnableBook" in ModelManager(Book).subclasses
+    assert "non_ownable_book" in ModelManager(Book).subclasses
+
+
+def test_relationship_targets_linked_at_setup():
+    from test_app.models import Book, DateBase, Person
+
+    person = ModelManager.get_model(Person)
+    assert ModelManager.links["Book"] is ModelManager(Book)
+    assert person.relationships["has_books"].target_model is Book
+    assert ModelManager.links["DateBase"] is ModelManager(DateBase)
+    assert person.child_nodes["date_of_birth"].child_app_model is ModelManager(
+        DateBase
+    )
+
+
+def test_link_app_models_fails_on_dangling_target():
+    from dataclasses import replace
+
+    from pros_core.setup_utils.model_manager import link_app_models
+    from test_app.models import Person
+
+    person = ModelManager.get_model(Person)
+    MM = ModelManagerClass()
+    MM.add_model(
+        replace(
+            person,
+            relationships={"has_books": person.relationships["has_books"]},
+            child_nodes={},
+            related_reifications={},
+        )
+    )
+
+    with pytest.raises(ModelManagerException, match="Person.has_books"):
+        link_app_models(MM)
+
+
+def test_app_model_metadata_is_immutable_and_shared():
+    from dataclasses import FrozenInstanceError
+
+    from test_app.models import Animal, Entity, Person
+
+    person = ModelManager.get_model(Person)
+    with pytest.raises(FrozenInstanceError):
+        person.model_name = "Human"
+    with pytest.raises(FrozenInstanceError):
+        person.relationships["has_books"].target_model_name = "Person"
+    with pytest.raises(TypeError):
+        ModelManager.links["Book"] = person
+    with pytest.raises(AttributeError):
+        person.properties.label = None
+    assert person.properties.label is person.properties["label"]
+    assert not hasattr(person, "__dict__")
+
+    # Items for a class are shared between all the AppModels that refer to it
+    entity_subclasses = ModelManager(Entity).subclasses
+    animal_subclasses = ModelManager(Animal).subclasses
+    assert (
+        entity_subclasses.items[entity_subclasses.index("Person")]
+        is animal_subclasses.items[animal_subclasses.index("Person")]
+    )
+    assert (
+        ModelManager(Animal).reverse_relationships["is_involved_in_happening"]
+        is ModelManager(Entity).reverse_relationships["is_involved_in_happening"]
+    )
+
+
+def test_preload_for_fork():
+    import gc
+
+    from fastapi import FastAPI
+    from pros_core.setup_utils import build_routes, preload_for_fork
+    from pros_core.setup_utils.build_pydantic_return_models import (
+        get_built_pydantic_return_model,
+    )
+    from test_app.models import Person
+
+    MM = ModelManagerClass()
+    MM.add_model(ModelManager.get_model(Person))
+    preloaded_app = FastAPI()
+    build_routes(preloaded_app, [], MM)
+    try:
+        preload_for_fork(preloaded_app, MM)
+        assert gc.get_freeze_count() > 0
+        assert "/entities/person/" in preloaded_app.openapi_schema["paths"]
+        assert get_built_pydantic_return_model(Person) is not None
+    finally:
+        gc.unfreeze()
+
+
+def test_startup_profile_report(tmp_path, caplog):
+    import json
+    import logging
+
+    from fastapi import FastAPI
+
+    report_path = tmp_path / "startup_profile.json"
+
+    class ProfiledSettings(type(settings)):
+        PROFILE_STARTUP: bool = True
+        STARTUP_PROFILE_PATH: str = str(report_path)
+
+    with caplog.at_level(logging.INFO):
+        setup_app(FastAPI(), ProfiledSettings())
+
+    report = json.loads(report_path.read_text())
+    assert [phase["name"] for phase in report["phases"]] == [
+        "discover_apps",
+        "import_routers",
+        "setup_model_manager",
+        "pydantic_return_models",
+        "query_templates",
+        "build_routes",
+        "build_auth",
+    ]
+    assert all(phase["wall_time"] >= 0 for phase in report["phases"])
+    assert {m["phase"] for m in report["slowest_models"]} <= {
+        "pydantic_return_models",
+        "query_templates",
+        "build_routes",
+    }
+    assert "setup_app took" in caplog.text
+
+
+def test_discover_apps():
+    from pros_core.setup_utils import discover_apps
+    from test_app.models import DateBase, DatePrecise, Ownable, PersonIdentification
+
+    installed_apps = discover_apps(settings)
+    assert discover_apps(settings) is installed_apps
+
+    assert ("test_app", "Ownable", Ownable) in installed_apps.traits
+    assert ("test_app", "DatePrecise", DatePrecise) in installed_apps.child_nodes
+    assert ("test_app", "DateBase", DateBase) in installed_apps.child_nodes
+    assert (
+        "test_app",
+        "PersonIdentification",
+        PersonIdentification,
+    ) in installed_apps.reifications
+    # Classes imported from pros_core are not models of either app
+    assert not any(
+        model.__module__ == "pros_core.models" for _, _, model in installed_apps.models
+    )
+    assert len(installed_apps.routers) == 2
+
+
+def test_discover_app_skips_reexported_classes(tmp_path, monkeypatch):
+    from pros_core.setup_utils.discover_apps import discover_app
+
+    app_dir = tmp_path / "reexporting_app"
+    (app_dir / "api").mkdir(parents=True)
+    (app_dir / "__init__.py").write_text("")
+    (app_dir / "api" / "__init__.py").write_text("")
+    (app_dir / "models.py").write_text(
+        "from pros_core.models import AbstractNode\n"
+        "from test_app.models import Person\n\n\n"
+        "class ReexportingAppNode(AbstractNode):\n"
+        "    pass\n"
+    )
+    (app_dir / "api" / "v1.py").write_text("import a_module_that_does_not_exist\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    # A missing dependency of the api module is an error, not a missing api module
+    with pytest.raises(ModuleNotFoundError):
+        discover_app("reexporting_app")
+
+    (app_dir / "api" / "v1.py").unlink()
+    discovered = discover_app("reexporting_app")
+    assert [name for name, _ in discovered.nodes] == ["ReexportingAppNode"]
+    assert discovered.router is None
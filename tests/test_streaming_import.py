@@ -0,0 +1,237 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from pros_core.db import QueryExecutor
+from pros_core.db.streaming_import import (
+    ImportState,
+    StreamingImportError,
+    import_file,
+    main,
+)
+from pros_core.setup_app import setup_app
+from testing_app.app.core.config import settings
+from tests.testing_app.app.main import app
+
+setup_app(app, settings)
+
+ALICE = str(uuid.uuid4())
+
+
+def rows():
+    return [
+        {"realType": "potato", "externalId": "p1", "label": "Spud"},
+        {"realType": "calendar", "externalId": "c1", "label": "Julian", "type": "J"},
+        {
+            "realType": "person",
+            "externalId": "alice",
+            "uid": ALICE,
+            "label": "Alice",
+            "hasRootVegetable": ["p1"],
+            "dateOfBirth": [
+                {
+                    "realType": "dateprecise",
+                    "date": "1890",
+                    "calendarFormat": ["c1"],
+                }
+            ],
+        },
+        {
+            "realType": "person",
+            "externalId": "bob",
+            "label": "Bob",
+            "hasRootVegetable": ["p1"],
+            "dateOfBirth": [{"realType": "dateimprecise", "date": "c. 1900"}],
+        },
+        {
+            "realType": "factoid",
+            "label": "Alice and Bob",
+            "concernsPerson": [
+                {
+                    "realType": "personidentification",
+                    "personsIdentified": ["alice", "bob"],
+                }
+            ],
+        },
+    ]
+
+
+def write_jsonl(path, items):
+    path.write_text("\n".join(json.dumps(item) for item in items) + "\n")
+
+
+def all_rows(executor, match):
+    return [
+        row
+        for call in executor.run_transaction.call_args_list
+        for query, params in call.args[0]
+        if match in query
+        for row in params["rows"]
+    ]
+
+
+@pytest.fixture
+def executor(mocker):
+    async def run_transaction(statements):
+        return [[{"written": len(params["rows"])}] for _, params in statements]
+
+    executor = mocker.Mock(spec=QueryExecutor)
+    executor.run_transaction = mocker.AsyncMock(side_effect=run_transaction)
+    return executor
+
+
+def test_import_file_resolves_external_ids(executor, tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_jsonl(path, rows())
+
+    report = asyncio.run(import_file(executor, path, chunk_size=2))
+
+    state = ImportState(tmp_path / "items.jsonl.import-state")
+    uids = state.uids_by_external_id(["p1", "c1", "alice", "bob"])
+    assert uids["alice"] == ALICE
+    assert state.checkpoint("relations") == (5, True)
+    state.close()
+
+    # Nodes are written with the uids given to their rows, and references to
+    # other rows resolved to those uids
+    [potato] = all_rows(executor, "(n:`Potato`")
+    assert potato["uid"] == uuid.UUID(uids["p1"]).hex
+    [factoid] = all_rows(executor, "(c:`PersonIdentification`")
+    assert [
+        related["to"]
+        for related in factoid["relationships"]["persons_identified"]
+    ] == [uuid.UUID(ALICE).hex, uuid.UUID(uids["bob"]).hex]
+    [date] = all_rows(executor, "(c:`DatePrecise`")
+    [calendar] = date["relationships"]["calendar_format"]
+    assert calendar["to"] == uuid.UUID(uids["c1"]).hex
+
+    assert report.items == 5
+    assert [batch.phase for batch in report.batches][0] == "nodes"
+    assert report.rows_written == 13
+    assert not report.failures
+
+    # Importing again has nothing left to do
+    executor.run_transaction.reset_mock()
+    asyncio.run(import_file(executor, path, chunk_size=2))
+    executor.run_transaction.assert_not_called()
+
+
+def test_import_file_resumes_from_checkpoint(executor, tmp_path):
+    path = tmp_path / "items.jsonl"
+    state_path = tmp_path / "state"
+    write_jsonl(path, rows())
+
+    async def run_transaction(statements):
+        if any("(p:`Factoid`" in query for query, _ in statements):
+            raise KeyboardInterrupt
+        return [[{"written": len(params["rows"])}] for _, params in statements]
+
+    executor.run_transaction.side_effect = run_transaction
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(import_file(executor, path, state_path=state_path, chunk_size=2))
+    first_uids = {row["uid"] for row in all_rows(executor, "MERGE (n:")}
+
+    executor.run_transaction.reset_mock()
+    executor.run_transaction.side_effect = None
+    executor.run_transaction.return_value = []
+    asyncio.run(import_file(executor, path, state_path=state_path, chunk_size=2))
+
+    # Only the relations of the last chunk are written again: in one transaction
+    # that replaces the reification the stopped import may have created, of the
+    # node with the uid it had
+    assert executor.run_transaction.call_count == 1
+    assert not all_rows(executor, "MERGE (n:")
+    [delete] = all_rows(executor, "DETACH DELETE old")
+    assert delete["parent"] in first_uids
+    assert len(all_rows(executor, "(c:`PersonIdentification`")) == 1
+    assert not all_rows(executor, "(a:`Person`")
+
+
+def test_import_file_stops_at_failed_transaction(executor, tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_jsonl(path, rows())
+
+    async def run_transaction(statements):
+        if any("(p:`Factoid`" in query for query, _ in statements):
+            raise RuntimeError("Deadlock")
+        return [[{"written": len(params["rows"])}] for _, params in statements]
+
+    executor.run_transaction.side_effect = run_transaction
+    with pytest.raises(StreamingImportError, match="Deadlock"):
+        asyncio.run(import_file(executor, path, chunk_size=2))
+
+    # The checkpoint is left before the chunk that failed, which is written again
+    # when the import is resumed
+    state = ImportState(tmp_path / "items.jsonl.import-state")
+    assert state.checkpoint("relations") == (4, False)
+    state.close()
+    executor.run_transaction.reset_mock()
+    executor.run_transaction.side_effect = None
+    executor.run_transaction.return_value = []
+    asyncio.run(import_file(executor, path, chunk_size=2))
+    assert len(all_rows(executor, "(c:`PersonIdentification`")) == 1
+
+
+def test_import_file_reports_invalid_rows(executor, tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_jsonl(
+        path, [*rows(), {"realType": "person"}, {"realType": "rootvegetable"}]
+    )
+
+    with pytest.raises(StreamingImportError) as e:
+        asyncio.run(import_file(executor, path, chunk_size=4))
+
+    # Rows are numbered from the start of the file, and the chunks before theirs
+    # have been imported
+    assert [error["row"] for error in e.value.errors] == [5, 6]
+    assert len(all_rows(executor, "MERGE (n:")) == 4
+    state = ImportState(tmp_path / "items.jsonl.import-state")
+    assert state.checkpoint("nodes") == (4, False)
+    state.close()
+
+
+def test_import_file_duplicate_external_id(executor, tmp_path):
+    path = tmp_path / "items.jsonl"
+    write_jsonl(path, [*rows(), {"realType": "potato", "externalId": "p1"}])
+
+    with pytest.raises(StreamingImportError, match="Duplicate externalId"):
+        asyncio.run(import_file(executor, path))
+    executor.run_transaction.assert_not_called()
+
+
+def test_import_csv_command(mocker, tmp_path, capsys):
+    path = tmp_path / "items.csv"
+    path.write_text(
+        "realType,externalId,name,involvesEntity\n"
+        "pet,rex,Rex,\n"
+        "pet,tiddles,Tiddles,\n"
+        "happening,h1,,rex|tiddles\n"
+    )
+    run_transaction = mocker.patch(
+        "pros_core.db.executor.ThreadpoolQueryExecutor.run_transaction_sync",
+        side_effect=lambda statements: [
+            [{"written": len(params["rows"])}] for _, params in statements
+        ],
+    )
+
+    main(["testing_app.app.core.config:settings", str(path), "--chunk-size", "2"])
+
+    [rex, tiddles] = [
+        row["uid"]
+        for call in run_transaction.call_args_list
+        for query, params in call.args[0]
+        if "MERGE (n:`Pet`" in query
+        for row in params["rows"]
+    ]
+    involves = [
+        row["to"]
+        for call in run_transaction.call_args_list
+        for query, params in call.args[0]
+        if "(a:`Happening`" in query
+        for row in params["rows"]
+    ]
+    assert involves == [rex, tiddles]
+    output = capsys.readouterr().out
+    assert "relations: 3 rows done" in output
+    assert "3 items: 5 rows written" in output
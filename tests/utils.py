@@ -10,52 +10,52 @@ class LoggedInClient(TestClient):
         super().__init__(app, *args, **kwargs)
         self._access_token = access_token
 
-    def get(self, *args, **kwargs) -> HttpxResponse:
+    def get(self, *args, headers=None, **kwargs) -> HttpxResponse:
         return super().get(
             *args,
             **kwargs,
             headers={
                 "Authorization": f"Bearer {self._access_token}",
-                **kwargs.get("headers", {}),
+                **(headers or {}),
             },
         )
 
-    def post(self, *args, **kwargs) -> HttpxResponse:
+    def post(self, *args, headers=None, **kwargs) -> HttpxResponse:
         return super().post(
             *args,
             **kwargs,
             headers={
                 "Authorization": f"Bearer {self._access_token}",
-                **kwargs.get("headers", {}),
+                **(headers or {}),
             },
         )
 
-    def put(self, *args, **kwargs) -> HttpxResponse:
+    def put(self, *args, headers=None, **kwargs) -> HttpxResponse:
         return super().put(
             *args,
             **kwargs,
             headers={
                 "Authorization": f"Bearer {self._access_token}",
-                **kwargs.get("headers", {}),
+                **(headers or {}),
             },
         )
 
-    def patch(self, *args, **kwargs) -> HttpxResponse:
+    def patch(self, *args, headers=None, **kwargs) -> HttpxResponse:
         return super().patch(
             *args,
             **kwargs,
             headers={
                 "Authorization": f"Bearer {self._access_token}",
-                **kwargs.get("headers", {}),
+                **(headers or {}),
             },
         )
 
-    def delete(self, *args, **kwargs) -> HttpxResponse:
+    def delete(self, *args, headers=None, **kwargs) -> HttpxResponse:
         return super().delete(
             *args,
             **kwargs,
             headers={
                 "Authorization": f"Bearer {self._access_token}",
-                **kwargs.get("headers", {}),
+                **(headers or {}),
             },
         )